@@ -0,0 +1,144 @@
+"""
+BATCH PROVING
+
+Proves every expression of a corpus file (e.g. experiments.txt) and appends one JSON record per
+expression to a results file:
+
+    {"id": "19", "expr": ..., "proved": true, "reduced": "(1)", "steps": [...], "laws": [...],
+     "depth": 3, "expansions": 12, "llm_calls": 40, "prompt_tokens": ..., "completion_tokens": ...,
+     "cost": 0.0012, "wall_time": 1.8, "llm_seconds": 1.5, "engine_seconds": 0.3, "error": null}
+
+Expressions run in parallel worker processes (--jobs). Records are written as each proof finishes,
+so a crashed run resumes by skipping the ids already in the results file. Records that failed with an
+error (an api outage, a timeout) are proved again and the new record is appended after the old one,
+except for expressions that don't parse. Calls, tokens and cost come
+from the proof's llm metrics (metrics.py): api usage when it is reported, otherwise estimated at 4
+characters per token.
+
+python3 guide/batch.py --file experiments.txt --out results.jsonl --jobs 4 --value heuristic
+"""
+
+import os
+import io
+import re
+import json
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import proof_engine as engine
+
+def read_corpus(path):
+    """
+    (id, expr) of every expression in a corpus file. Lines may be labelled like experiments.txt
+    ("19: expr" or "1. expr"), otherwise the line number is the id. Blank lines and # comments are skipped.
+    JSON lines ({"id": ..., "expr": ...}, e.g. a symbolic_mirror.py corpus) are read too.
+    """
+    corpus = []
+    with open(path) as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"): continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                corpus.append((str(record.get("id", line_number)), record["expr"]))
+                continue
+            match = re.match(r"^(\d+)[:.]\s*(.+)$", line)
+            corpus.append((match.group(1), match.group(2)) if match else (str(line_number), line))
+    return corpus
+
+def completed_ids(path):
+    """ ids already in the results file, without the ones whose proof failed (they are retried) """
+    if not os.path.exists(path): return set()
+    ids = set()
+    with open(path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+                error = record.get("error")
+                if not error or error.startswith("ParseError"): # a bad expression fails the same way again
+                    ids.add(record["id"])
+            except (json.JSONDecodeError, KeyError): # partial last line after a crash
+                pass
+    return ids
+
+def init_worker(args):
+    """ configure the engine once per worker process """
+    engine.configure(args)
+
+def best_proof(proofs):
+    """ a proof ending in (1) if there is one, then the shortest """
+    return min(proofs, key=lambda proof: (proof.expr != "(1)", proof.depth), default=None)
+
+def prove(expr_id, expr, log_dir=None):
+    """ run the proof engine on one expression and return its record """
+    start = time.perf_counter()
+    error = None
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            engine.proof_engine(expr=expr, T=engine.T, B=engine.B, K=engine.K)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall_time = time.perf_counter() - start
+
+    if log_dir:
+        with open(os.path.join(log_dir, f"{expr_id}.log"), "w") as file:
+            file.write(output.getvalue())
+
+    proof = best_proof(engine.run.get("proofs", [])) if error is None else None
+    run_metrics = engine.run.get("metrics", {})
+    total = run_metrics.get("total", {})
+    return {
+        "id": expr_id,
+        "expr": expr,
+        "proved": proof is not None and proof.expr == "(1)",
+        "reduced": proof.expr if proof else None,
+        "steps": proof.expr_history if proof else [],
+        "laws": proof.law_history if proof else [],
+        "depth": engine.run.get("depth", 0),
+        "expansions": engine.run.get("expansions", 0),
+        "llm_calls": total.get("calls", 0),
+        "prompt_tokens": total.get("prompt_tokens", 0),
+        "completion_tokens": total.get("completion_tokens", 0),
+        "cost": round(total.get("cost", 0), 6),
+        "wall_time": round(wall_time, 3),
+        "llm_seconds": round(run_metrics.get("llm_seconds", 0), 3),
+        "engine_seconds": round(run_metrics.get("engine_seconds", 0), 3),
+        "error": error,
+    }
+
+def run_batch(args):
+    corpus = read_corpus(args.file)
+    done = completed_ids(args.out)
+    todo = [(expr_id, expr) for expr_id, expr in corpus if expr_id not in done]
+    print(f"BATCH: {len(corpus)} expressions, {len(corpus) - len(todo)} already in {args.out}, {len(todo)} to prove")
+    if args.log_dir: os.makedirs(args.log_dir, exist_ok=True)
+    args.ckpt, args.ckpt_file = False, None # proofs run side by side, the batch resumes per expression instead
+
+    with open(args.out, "a") as out:
+        def write(record):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            status = "ERROR" if record["error"] else ("PROVED" if record["proved"] else "NOT PROVED")
+            print(f"[{record['id']}] {status} steps={len(record['laws'])} llm_calls={record['llm_calls']} {record['wall_time']}s {record['expr']}")
+
+        if args.jobs <= 1:
+            init_worker(args)
+            for expr_id, expr in todo:
+                write(prove(expr_id, expr, args.log_dir))
+        else:
+            with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker, initargs=(args,)) as pool:
+                futures = [pool.submit(prove, expr_id, expr, args.log_dir) for expr_id, expr in todo]
+                for future in as_completed(futures):
+                    write(future.result())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Batch proof engine CLI args")
+    parser.add_argument("--file", type=str, default="experiments.txt", help="Corpus of expressions, one per line")
+    parser.add_argument("--out", type=str, default="results.jsonl", help="JSONL results file, appended to and used to resume")
+    parser.add_argument("--jobs", type=int, default=1, help="Expressions proved in parallel")
+    parser.add_argument("--log_dir", type=str, default=None, help="Save each proof's engine output to <log_dir>/<id>.log")
+    engine.add_engine_args(parser)
+    run_batch(parser.parse_args())
@@ -0,0 +1,188 @@
+"""
+BENCHMARKS
+
+Times the symbolic hot paths and a full proof_engine run with the offline mock llm:
+
+    parse            booleanTree(expr): parse + render
+    symbolic_deduce  every law at every position
+    simplify         simplification fixpoint
+    is_reduced
+    mirror           symbolic_mirror expansion (50 steps from 1, seeded)
+    proof_engine     full search on the tautologies of the corpus, --model mock (mock_llm.py)
+
+Each benchmark runs rounds over the whole corpus for --seconds and reports the median time per
+operation, its spread and ops/sec, then one more round under tracemalloc for the peak and retained
+memory. Caches are cleared before every round (expression caches on the DAG nodes, the parse and
+feature caches, the deduction LRU and compiled truth tables) unless --warm, so the numbers are for
+expressions the engine has never seen.
+
+Scaling curves time the symbolic benchmarks on generated tautologies of increasing size (mirror
+expansions of 4 to 64 steps); "slope" is the exponent of a power law fit, ~1 for linear time.
+
+python3 guide/benchmark.py --save baseline.json
+python3 guide/benchmark.py --compare baseline.json   # exits 1 if a benchmark got slower than --tolerance
+"""
+
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import tracemalloc
+import contextlib
+import numpy as np
+
+from dag import Expr, parse
+from utils import booleanTree
+from symbolic import symbolic_deduce, simplify, is_reduced
+from symbolic_mirror import mirror_expand, generate_corpus, mirror_laws
+from heuristic import features, literal_distance, negation_depth
+from truth_table import classify, compile_expr
+from batch import read_corpus
+import proof_engine as engine
+
+def clear_caches():
+    """ forget everything cached about expressions, as if none had been seen """
+    for node in list(Expr.table.values()):
+        for slot in ("_text", "_rewrites", "_normal", "_canonical"):
+            object.__setattr__(node, slot, None)
+    for cache in (parse, features, literal_distance, negation_depth, mirror_laws, compile_expr):
+        cache.cache_clear()
+    if engine.deduction_cache is not None: engine.deduction_cache.clear()
+
+def configure_engine():
+    parser = argparse.ArgumentParser()
+    engine.add_engine_args(parser)
+    args = parser.parse_args(["--T", "4", "--B", "2", "--K", "3", "--model", "mock"])
+    args.ckpt_file = None
+    engine.configure(args)
+
+def simplify_expr(expr):
+    simplify(expr=expr, item_history=("", [], []))
+
+def mirror(seed):
+    mirror_expand(parse("1"), 50, random.Random(seed))
+
+def prove(expr):
+    engine.proof_engine(expr=expr, T=engine.T, B=engine.B, K=engine.K)
+
+def benchmarks(exprs):
+    """ name -> (function, inputs) """
+    tautologies = [expr for expr in exprs if classify(expr) == "tautology"]
+    return {
+        "parse": (booleanTree, exprs),
+        "symbolic_deduce": (symbolic_deduce, exprs),
+        "simplify": (simplify_expr, exprs),
+        "is_reduced": (is_reduced, exprs),
+        "mirror": (mirror, range(20)),
+        "proof_engine": (prove, tautologies),
+    }
+
+def run_round(function, inputs, warm):
+    """ seconds to call function on every input once """
+    if not warm: clear_caches()
+    start = time.perf_counter()
+    for item in inputs:
+        function(item)
+    return time.perf_counter() - start
+
+def measure(function, inputs, seconds, warm=False):
+    """ ops/sec, median and stddev of the time per op (us), memory of one round under tracemalloc """
+    inputs = list(inputs)
+    rounds, spent = [], 0.0
+    with contextlib.redirect_stdout(io.StringIO()): # the engine and is_reduced print
+        run_round(function, inputs, warm) # warm up imports and lazily built tables
+        while spent < seconds or len(rounds) < 3:
+            elapsed = run_round(function, inputs, warm)
+            rounds.append(elapsed / len(inputs) * 1e6)
+            spent += elapsed
+
+        if not warm: clear_caches()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for item in inputs:
+            function(item)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    median = statistics.median(rounds)
+    return {"ops_per_sec": round(1e6 / median, 1), "us_per_op": round(median, 2),
+            "stddev_us": round(statistics.stdev(rounds), 2), "rounds": len(rounds),
+            "peak_kib": round((peak - before) / 1024, 1), "retained_kib": round((current - before) / 1024, 1)}
+
+def scaling(names, seconds, warm=False, steps=(4, 8, 16, 32, 64), per_size=20):
+    """ name -> {"curve": [{"size": mean nodes, "us_per_op": ...}], "slope": power law exponent} """
+    corpora = {n: [record["expr"] for record in generate_corpus(per_size, seed=n, steps=(n, n))] for n in steps}
+    sizes = {n: statistics.mean(parse(expr).size for expr in corpus) for n, corpus in corpora.items()}
+    curves = {}
+    for name in names:
+        function = dict(benchmarks([]))[name][0]
+        curve = [{"size": round(sizes[n], 1), "us_per_op": measure(function, corpus, seconds, warm)["us_per_op"]} for n, corpus in corpora.items()]
+        slope = np.polyfit(np.log([point["size"] for point in curve]), np.log([point["us_per_op"] for point in curve]), 1)[0]
+        curves[name] = {"curve": curve, "slope": round(float(slope), 2)}
+    return curves
+
+def compare(results, baseline, tolerance):
+    """ print the change of every benchmark against a baseline, returns the names that got slower """
+    regressions = []
+    print(f"\n{'benchmark':<18} {'baseline us':>12} {'now us':>10} {'change':>8}")
+    for name, result in results["results"].items():
+        if name not in baseline["results"]: continue
+        old, new = baseline["results"][name]["us_per_op"], result["us_per_op"]
+        ratio = new / old
+        flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+        if flag: regressions.append(name)
+        print(f"{name:<18} {old:>12,.2f} {new:>10,.2f} {ratio:>7.2f}x{flag}")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark CLI args")
+    parser.add_argument("--file", type=str, default="experiments.txt", help="Corpus of expressions (see batch.py)")
+    parser.add_argument("--seconds", type=float, default=1.0, help="Time spent on each benchmark")
+    parser.add_argument("--only", type=str, nargs="+", default=None, help="Benchmarks to run (default: all)")
+    parser.add_argument("--warm", action="store_true", help="Keep caches between rounds")
+    parser.add_argument("--no_scaling", action="store_true", help="Skip the scaling curves")
+    parser.add_argument("--save", type=str, default=None, help="Write the results as a baseline json")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline json to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Slowdown over the baseline reported as a regression")
+    args = parser.parse_args()
+
+    exprs = []
+    for _, expr in read_corpus(args.file):
+        try:
+            classify(expr)
+            exprs.append(expr)
+        except (SyntaxError, ValueError): # unparsable lines of the corpus
+            pass
+    configure_engine()
+    suite = {name: bench for name, bench in benchmarks(exprs).items() if not args.only or name in args.only}
+
+    results = {"meta": {"python": platform.python_version(), "machine": platform.machine(), "corpus": args.file,
+                        "expressions": len(exprs), "warm": args.warm, "date": time.strftime("%Y-%m-%d %H:%M:%S")},
+               "results": {}}
+    print(f"BENCHMARK: {len(exprs)} expressions from {args.file}, {'warm' if args.warm else 'cold'} caches\n")
+    print(f"{'benchmark':<18} {'ops/s':>10} {'us/op':>10} {'stddev':>9} {'rounds':>6} {'peak KiB':>9} {'kept KiB':>9}")
+    for name, (function, inputs) in suite.items():
+        result = results["results"][name] = measure(function, inputs, args.seconds, args.warm)
+        print(f"{name:<18} {result['ops_per_sec']:>10,.1f} {result['us_per_op']:>10,.2f} {result['stddev_us']:>9,.2f} "
+              f"{result['rounds']:>6} {result['peak_kib']:>9,.1f} {result['retained_kib']:>9,.1f}")
+
+    if not args.no_scaling:
+        names = [name for name in ("parse", "symbolic_deduce", "simplify", "is_reduced") if name in suite]
+        results["scaling"] = scaling(names, args.seconds / 5, args.warm)
+        print("\nSCALING (us/op by mean expression size)")
+        for name, scaling_result in results["scaling"].items():
+            points = "  ".join(f"{point['size']:>5}:{point['us_per_op']:>8,.1f}" for point in scaling_result["curve"])
+            print(f"{name:<18} {points}   slope {scaling_result['slope']}")
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nbaseline saved to {args.save}")
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions: sys.exit(1)
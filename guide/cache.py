@@ -0,0 +1,219 @@
+"""
+LLM RESPONSE CACHE
+
+SQLite store of llm responses keyed on (model, system, message, temperature), so repeated runs over the
+same expressions don't pay for identical prompts again. The least recently used entries are evicted
+once the cache holds more than max_entries responses.
+
+proof_engine sends the same proposal prompt B times per node and relies on sampling for different
+answers, so the key also holds a sample index: the n-th time a prompt is asked in a run reads the n-th
+recorded response. Within an llm.llm_batch the n-th is counted by position in the batch, not by which
+worker thread gets there first, so identical prompts sent together replay in the recorded order.
+
+Replay mode is read-only: hits are served as usual and a miss raises LookupError instead of calling the
+api, so a proof_engine run over a recorded cache is offline and deterministic.
+
+DeductionCache memoizes symbolic_deduce: an in-process LRU of expression -> deductions, optionally backed
+by a SQLite store that every worker process reads first and adds its misses to.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import contextvars
+from collections import Counter, OrderedDict, defaultdict
+from dag import parse, to_source
+from symbolic import symbolic_deduce
+
+# set by llm.llm_gather around each call: (reservations of the batch, occurrence of the message in
+# the batch, occurrences of the message in the batch)
+batch_slot = contextvars.ContextVar("batch_slot", default=None)
+
+def take_sample(samples, key):
+    """ next sample index of key, counted in the samples Counter (see batch_slot), call it under a lock """
+    slot = batch_slot.get()
+    if slot is None:
+        samples[key] += 1
+        return samples[key] - 1
+    reservations, occurrence, occurrences = slot
+    if key not in reservations:
+        reservations[key] = samples[key]
+        samples[key] += occurrences
+    return reservations[key] + occurrence
+
+class LLMCache:
+    def __init__(self, path="guide/llm_cache.sqlite", max_entries=100_000, replay=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.samples = Counter() # prompt key -> times asked this run
+        self.lock = threading.Lock() # llm calls are sent from worker threads (llm.llm_batch)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, response TEXT, last_used INTEGER)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS lru ON responses (last_used)")
+        self.db.commit()
+        self.entries = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] # kept up to date by put
+
+    @staticmethod
+    def key(model, system, message, temperature, sample=0):
+        """ content address of a prompt """
+        return hashlib.sha256(json.dumps([model, system, message, temperature, sample]).encode()).hexdigest()
+
+    def next_sample(self, model, system, message, temperature=None):
+        """
+        sample index of the next time this prompt is asked. In a batch the first call of a prompt
+        reserves the indices of all its occurrences and each call takes the one of its position
+        """
+        key = self.key(model, system, message, temperature)
+        with self.lock:
+            return take_sample(self.samples, key)
+
+    def get(self, model, system, message, temperature=None, sample=0):
+        """ cached response or None, raises LookupError on a miss in replay mode """
+        key = self.key(model, system, message, temperature, sample)
+        with self.lock:
+            row = self.db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                if self.replay:
+                    raise LookupError(f"ERROR: no cached response for {model=} in replay mode, {message[:80]=}")
+                return None
+            self.hits += 1
+            if not self.replay:
+                self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time_ns(), key))
+                self.db.commit()
+            return row[0]
+
+    def put(self, model, system, message, response, temperature=None, sample=0):
+        """ store a response and evict the least recently used entries past max_entries """
+        if self.replay: return
+        key = self.key(model, system, message, temperature, sample)
+        with self.lock:
+            now = time.time_ns()
+            if self.db.execute("INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?)", (key, model, response, now)).rowcount:
+                self.entries += 1
+            else:
+                self.db.execute("UPDATE responses SET response = ?, last_used = ? WHERE key = ?", (response, now, key))
+            excess = self.entries - self.max_entries
+            if excess > 0:
+                self.entries -= self.db.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)", (excess,)).rowcount
+            self.db.commit()
+
+    def __len__(self):
+        return self.entries
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0, "entries": len(self)}
+
+    def close(self):
+        self.db.close()
+
+class DeductionCache:
+    """
+    Bounded LRU of symbolic_deduce results keyed by the expression's rendering (to_source of the parsed
+    tree), so the same expression written with other spacing or parentheses is a hit. Commutative
+    variants are separate entries since their deductions are written in a different order.
+
+    With a store path the misses of every process are shared: lookups fall back to the SQLite store
+    before running the symbolic engine, and computed deductions are added to it. The object pickles to
+    its settings only, each process opens its own connection and starts with an empty LRU (forked pool
+    workers inherit a copy of the parent's, parallel.init_worker resets it).
+    """
+    def __init__(self, max_entries=50_000, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict() # key -> {law: [expressions]}, least recently used first
+        self.hits = 0        # answered from the LRU
+        self.shared_hits = 0 # answered from the store
+        self.misses = 0      # computed by the symbolic engine
+        self.lock = threading.Lock()
+        self.db, self.pid = None, None
+
+    def __getstate__(self):
+        return {"max_entries": self.max_entries, "path": self.path}
+
+    def clear(self):
+        """ empty the LRU and reset the counters, the shared store is kept """
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def store(self):
+        """ this process's connection to the shared store, or None """
+        if self.path is None: return None
+        if self.db is None or self.pid != os.getpid():
+            self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL") # readers don't block the writer
+            self.db.execute("CREATE TABLE IF NOT EXISTS deductions (key TEXT PRIMARY KEY, deductions TEXT)")
+            self.db.commit()
+            self.pid = os.getpid()
+        return self.db
+
+    @staticmethod
+    def key(expr):
+        if isinstance(expr, str) and expr and expr[0] != "(" and expr[-1] != ")": expr = "(" + expr + ")"
+        return to_source(parse(expr) if isinstance(expr, str) else expr) # "" raises ParseError
+
+    def lookup(self, key, verbose=False):
+        """
+        deductions of a key and where they came from ("hit", "shared_hit" or "miss")
+        the result is not copied, callers must not change it
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key], "hit"
+
+        deductions, kind = None, "miss"
+        if (db := self.store()) is not None:
+            row = db.execute("SELECT deductions FROM deductions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                deductions, kind = json.loads(row[0]), "shared_hit"
+        if deductions is None:
+            deductions = dict(symbolic_deduce(key, verbose))
+            if db is not None:
+                db.execute("INSERT OR IGNORE INTO deductions VALUES (?, ?)", (key, json.dumps(deductions)))
+                db.commit()
+
+        with self.lock:
+            self.record(kind)
+            self.entries[key] = deductions
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return deductions, kind
+
+    def record(self, kind):
+        """ count a lookup (also used for lookups answered in worker processes) """
+        match kind:
+            case "hit": self.hits += 1
+            case "shared_hit": self.shared_hits += 1
+            case "miss": self.misses += 1
+
+    def deduce(self, expr, verbose=False):
+        """ symbolic_deduce(expr, verbose) through the cache """
+        deductions, kind = self.lookup(self.key(expr), verbose)
+        if verbose and kind != "miss": print(f"[SYMBOLIC ENGINE OUTPUT] ({kind.replace('_', ' ')}):", deductions)
+        return defaultdict(list, {law: list(expressions) for law, expressions in deductions.items()})
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        lookups = self.hits + self.shared_hits + self.misses
+        return {"hits": self.hits, "shared_hits": self.shared_hits, "misses": self.misses,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0, "entries": len(self)}
+
+    def close(self):
+        if self.db is not None and self.pid == os.getpid():
+            self.db.close()
+        self.db = None
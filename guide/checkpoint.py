@@ -0,0 +1,170 @@
+"""
+CHECKPOINTS
+
+Append-only JSONL log of a proof search. Every proof state is a node of a trie: the expression, its
+parent node and the law that led to it, so a state's full history is the path to the root and each
+level only appends the nodes it created:
+
+    {"law": 0, "name": "Distributive Law AND"}              new law id
+    {"node": 7, "parent": 3, "law": 0, "expr": "(...)"}     new trie node
+    {"visit": "&(a,b)", "depth": 2}                         new transposition table entry
+    {"level": 3, "frontier": [7, 9], "proofs": [4], "counters": {...}}
+
+Every `snapshot_every` levels a snapshot record holds everything needed to resume on its own (nodes
+still reachable from the frontier and proofs, laws and the transposition table). Its byte offset is
+appended to <path>.idx, so resuming seeks straight to the last snapshot and only replays the records
+after it. No record is eval'd.
+"""
+
+import os
+import json
+from proof_state import ProofState
+
+class Checkpoint:
+    def __init__(self, path="guide/ckpt.jsonl", snapshot_every=5):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.snapshot_every = snapshot_every
+        self.reset()
+
+    def reset(self):
+        self.nodes = {}   # id -> (parent id, law id, expr)
+        self.ids = {}     # (parent id, law id, expr) -> id
+        self.laws = []    # law id -> name
+        self.law_ids = {} # name -> law id
+        self.visits = []  # (key, depth) table entries not yet written
+        self.pending = [] # records not yet written
+        self.next_id = 0
+
+    def start(self):
+        """ truncate the log for a new search """
+        self.reset()
+        for path in (self.path, self.index_path):
+            with open(path, "w"):
+                pass
+
+    # ---------- trie ----------
+
+    def law_id(self, law):
+        if law not in self.law_ids:
+            self.law_ids[law] = len(self.laws)
+            self.laws.append(law)
+            self.pending.append({"law": self.law_ids[law], "name": law})
+        return self.law_ids[law]
+
+    def add_node(self, parent, law, expr):
+        key = (parent, law, expr)
+        if key not in self.ids:
+            self.ids[key] = self.next_id
+            self.nodes[self.next_id] = key
+            self.pending.append({"node": self.next_id, "parent": parent, "law": law, "expr": expr})
+            self.next_id += 1
+        return self.ids[key]
+
+    def node_id(self, state):
+        """ trie node of a ProofState """
+        node = None
+        for step in state.path():
+            node = self.add_node(node, None if step.law is None else self.law_id(step.law), step.expr)
+        return node
+
+    def state(self, node, states):
+        """ ProofState of a trie node, sharing ancestors through the states cache (node id -> state) """
+        if node not in states:
+            parent, law, expr = self.nodes[node]
+            states[node] = ProofState(expr) if parent is None else self.state(parent, states).child(expr, self.laws[law])
+        return states[node]
+
+    def reachable(self, roots):
+        """ ids of the roots and all their ancestors """
+        seen = set()
+        for node in roots:
+            while node is not None and node not in seen:
+                seen.add(node)
+                node = self.nodes[node][0]
+        return sorted(seen)
+
+    # ---------- writing ----------
+
+    def visit(self, key, depth):
+        """ log a new transposition table entry (key is a string) """
+        self.visits.append((key, depth))
+
+    def save_level(self, level, q, proofs, visited, counters):
+        """
+        append the nodes created on this level and the level's frontier, proofs and counters
+        visited: every transposition table entry as (key string, depth), only used for snapshots
+        """
+        frontier = [self.node_id(item) for item in q]
+        proof_ids = [self.node_id(item) for item in proofs]
+        records = self.pending + [{"visit": key, "depth": depth} for key, depth in self.visits]
+        records.append({"level": level, "frontier": frontier, "proofs": proof_ids, "counters": counters})
+        self.pending, self.visits = [], []
+
+        with open(self.path, "a") as file:
+            file.write("".join(json.dumps(record) + "\n" for record in records))
+            if level % self.snapshot_every == 0:
+                self.snapshot(file, level, frontier, proof_ids, visited, counters)
+
+    def snapshot(self, file, level, frontier, proof_ids, visited, counters):
+        """ write a self-contained snapshot and drop unreachable nodes from memory """
+        live = self.reachable(frontier + proof_ids)
+        self.nodes = {node: self.nodes[node] for node in live}
+        self.ids = {key: node for node, key in self.nodes.items()}
+        record = {"snapshot": level, "next_id": self.next_id, "laws": self.laws,
+                  "nodes": [[node, *self.nodes[node]] for node in live], "visited": visited,
+                  "frontier": frontier, "proofs": proof_ids, "counters": counters}
+        file.flush()
+        offset = file.tell()
+        file.write(json.dumps(record) + "\n")
+        file.flush()
+        with open(self.index_path, "a") as index:
+            index.write(f"{offset}\n")
+
+    # ---------- resuming ----------
+
+    def last_snapshot_offset(self):
+        if not os.path.exists(self.index_path): return 0
+        with open(self.index_path) as index:
+            offsets = index.read().split()
+        return int(offsets[-1]) if offsets else 0
+
+    def load(self):
+        """
+        Restore the state after the last complete level
+        Output: dict(level, q, proofs, visited, counters), or None if nothing was saved
+        """
+        self.reset()
+        state, visited, level_visits = None, [], []
+        with open(self.path) as file:
+            file.seek(self.last_snapshot_offset())
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError: # partial last line after a crash
+                    break
+                if "snapshot" in record:
+                    self.laws = record["laws"]
+                    self.law_ids = {law: i for i, law in enumerate(self.laws)}
+                    self.nodes = {node: (parent, law, expr) for node, parent, law, expr in record["nodes"]}
+                    self.next_id = record["next_id"]
+                    visited, level_visits = [tuple(entry) for entry in record["visited"]], []
+                    state = {"level": record["snapshot"], "frontier": record["frontier"], "proofs": record["proofs"], "counters": record["counters"]}
+                elif "law" in record and "name" in record:
+                    self.law_ids[record["name"]] = record["law"]
+                    self.laws.append(record["name"])
+                elif "node" in record:
+                    self.nodes[record["node"]] = (record["parent"], record["law"], record["expr"])
+                    self.next_id = max(self.next_id, record["node"] + 1)
+                elif "visit" in record:
+                    level_visits.append((record["visit"], record["depth"]))
+                elif "level" in record: # a level only counts once its level record is written
+                    state = record
+                    visited += level_visits
+                    level_visits = []
+        if state is None: return None
+
+        self.ids = {key: node for node, key in self.nodes.items()}
+        states = {}
+        return {"level": state["level"], "q": [self.state(node, states) for node in state["frontier"]],
+                "proofs": [self.state(node, states) for node in state["proofs"]], "visited": visited, "counters": state["counters"]}
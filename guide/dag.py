@@ -0,0 +1,368 @@
+"""
+EXPRESSION DAG
+
+Immutable, hash-consed boolean expressions. Every structurally distinct expression exists once
+(per process), so two subtrees are equal exactly when they are the same object and a rewrite only
+rebuilds the spine from the root to the rewritten node, sharing everything else.
+
+    Var("a")              a
+    Const(1) / Const(0)   1 / 0
+    Not(a)                not a
+    And(a, b, ...)        a and b ...
+    Or(a, b, ...)         a or b ...
+    Imp(a, b)             a > b   (implication)
+
+Nodes support structural pattern matching like the ast classes they replace:
+
+    match node:
+        case Or([a, Not(b)]) if a is b: ...
+"""
+
+import re
+import threading
+from functools import lru_cache
+from weakref import WeakValueDictionary
+
+# astor operator precedences (astor.op_util.Precedence), so rendering matches astor.to_source
+PREC_OR, PREC_AND, PREC_NOT, PREC_IMP, PREC_CONST, PREC_HIGHEST = 31, 33, 35, 37, 61, 63
+
+class Expr:
+    """
+    Base class of all expression nodes
+
+    args:  children for operators, (name,) for Var and (value,) for Const
+    hash:  structural hash, computed once at construction
+    size:  number of nodes in the tree (shared subtrees counted every time they appear)
+    depth: height of the tree
+    """
+    __slots__ = ("args", "hash", "size", "depth", "_text", "_rewrites", "_normal", "_canonical", "__weakref__")
+    table = WeakValueDictionary() # (class, args) -> node
+    table_lock = threading.Lock() # get-or-create is one step, so threads interning the same tree share one node
+
+    def __new__(cls, *args):
+        key = (cls, args)
+        node = Expr.table.get(key)
+        if node is not None: return node
+        with Expr.table_lock:
+            node = Expr.table.get(key)
+            if node is not None: return node
+            node = object.__new__(cls)
+            setattr_ = object.__setattr__
+            setattr_(node, "args", args)
+            if cls in (Var, Const):
+                setattr_(node, "hash", hash((cls.__name__, args)))
+                setattr_(node, "size", 1)
+                setattr_(node, "depth", 1)
+            else:
+                setattr_(node, "hash", hash((cls.__name__, tuple(arg.hash for arg in args))))
+                setattr_(node, "size", 1 + sum(arg.size for arg in args))
+                setattr_(node, "depth", 1 + max(arg.depth for arg in args))
+            setattr_(node, "_text", None)
+            setattr_(node, "_rewrites", None)
+            setattr_(node, "_normal", None)
+            setattr_(node, "_canonical", None)
+            Expr.table[key] = node
+            return node
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} nodes are immutable")
+
+    def __hash__(self):
+        return self.hash
+
+    def __reduce__(self):
+        return (type(self), self.args) # re-interned on unpickle
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(map(repr, self.args))})"
+
+    def __str__(self):
+        return to_source(self)
+
+    @property
+    def children(self):
+        return self.args
+
+    def with_child(self, i, child):
+        """ copy of this node with child i swapped for `child` """
+        args = self.args
+        return type(self)(*args[:i], child, *args[i + 1:])
+
+class Var(Expr):
+    __slots__ = ()
+    __match_args__ = ("name",)
+    children = ()
+
+    def __new__(cls, name):
+        return super().__new__(cls, name)
+
+    @property
+    def name(self):
+        return self.args[0]
+
+class Const(Expr):
+    __slots__ = ()
+    __match_args__ = ("value",)
+    children = ()
+
+    def __new__(cls, value):
+        return super().__new__(cls, int(value))
+
+    @property
+    def value(self):
+        return self.args[0]
+
+class Not(Expr):
+    __slots__ = ()
+    __match_args__ = ("operand",)
+
+    def __new__(cls, operand):
+        return super().__new__(cls, operand)
+
+    @property
+    def operand(self):
+        return self.args[0]
+
+class And(Expr):
+    __slots__ = ()
+    __match_args__ = ("args",)
+
+class Or(Expr):
+    __slots__ = ()
+    __match_args__ = ("args",)
+
+class Imp(Expr):
+    __slots__ = ()
+    __match_args__ = ("args",)
+
+# ----------PARSER-----------
+# Linear tokenizer + precedence climbing. Binary operators, loosest first, and whether a chain builds
+# one n-ary node (`a and b and c`, like python's BoolOp and Compare) or nests to the right
+# (`a -> b -> c`). `not` binds tighter than and/or but looser than `>`, as in python, and
+# `p <-> q` is desugared to `(p and q) or (not p and not q)` as it is parsed.
+
+BINARY = {"<->": (1, False), "->": (2, False), "or": (3, True), "and": (4, True), ">": (6, True)}
+PREC_NOT_OPERAND = 5
+KEYWORDS = {"and", "or", "not"}
+CONSTANTS = {"0": 0, "1": 1, "False": 0, "True": 1}
+
+TOKEN = re.compile(r"(<->|->|>|\(|\))|([A-Za-z_]\w*)|(\d+)|(\S)")
+
+class ParseError(SyntaxError):
+    """ syntax error in a boolean expression, `position` is the offending character's index """
+    def __init__(self, message, expr, position):
+        super().__init__(f"{message} at position {position}\n    {expr}\n    {' ' * position}^")
+        self.expr, self.position = expr, position
+
+def tokenize(expr):
+    """
+    Output: list of (kind, text, position) ending with ("end", "", len(expr)), kind is "op" for
+            operators, parentheses and keywords, "name" or "const"
+    """
+    tokens = []
+    for match in TOKEN.finditer(expr):
+        op, name, number, other = match.groups()
+        position = match.start()
+        if op or name in KEYWORDS:
+            tokens.append(("op", op or name, position))
+        elif name in CONSTANTS or number in CONSTANTS:
+            tokens.append(("const", name or number, position))
+        elif name:
+            tokens.append(("name", name, position))
+        elif number:
+            raise ParseError(f"only 0 and 1 are constants, found {number!r}", expr, position)
+        else:
+            raise ParseError(f"unexpected character {other!r}", expr, position)
+    tokens.append(("end", "", len(expr)))
+    return tokens
+
+def combine(op, operands):
+    """ node of a chain of one binary operator, desugaring <-> """
+    match op:
+        case "and": return And(*operands)
+        case "or": return Or(*operands)
+        case ">": return Imp(*operands)
+    node = operands[-1]
+    for p in reversed(operands[:-1]): # right associative
+        node = Imp(p, node) if op == "->" else Or(And(p, node), And(Not(p), Not(node)))
+    return node
+
+class Parser:
+    def __init__(self, expr):
+        self.expr = expr
+        self.tokens = tokenize(expr)
+        self.i = 0
+
+    def peek(self):
+        kind, text, _ = self.tokens[self.i]
+        return text if kind == "op" else kind
+
+    def error(self, message):
+        _, text, position = self.tokens[self.i]
+        found = f"{text!r}" if text else "end of expression"
+        raise ParseError(f"{message}, found {found}", self.expr, position)
+
+    def parse(self):
+        node = self.expression()
+        if self.peek() != "end": self.error("expected an operator or the end of the expression")
+        return node
+
+    def expression(self, min_prec=0):
+        node = self.unary()
+        while (op := self.peek()) in BINARY and BINARY[op][0] >= min_prec:
+            prec = BINARY[op][0]
+            operands = [node]
+            while self.peek() == op:
+                self.i += 1
+                operands.append(self.expression(prec + 1))
+            node = combine(op, operands)
+        return node
+
+    def unary(self):
+        kind, text, position = self.tokens[self.i]
+        self.i += 1
+        match kind, text:
+            case "op", "not":
+                return Not(self.expression(PREC_NOT_OPERAND))
+            case "op", "(":
+                node = self.expression()
+                if self.peek() != ")":
+                    self.error(f"expected ')' to close the '(' at position {position}")
+                self.i += 1
+                return node
+            case "name", _:
+                return Var(text)
+            case "const", _:
+                return Const(CONSTANTS[text])
+        self.i -= 1
+        self.error("expected a variable, 0, 1, 'not' or '('")
+
+@lru_cache(maxsize=8192)
+def parse(expr):
+    """ parse a boolean expression string into its (interned) DAG, raises ParseError """
+    return Parser(expr).parse()
+
+def render(node, pp):
+    """ source of `node` when its parent has precedence `pp` (cached per node) """
+    text = node._text
+    if text is None:
+        text = {}
+        object.__setattr__(node, "_text", text)
+    elif pp in text:
+        return text[pp]
+
+    match node:
+        case Var(name):
+            source = name
+        case Const(value):
+            source = str(value) if PREC_CONST >= pp else f"({value})"
+        case Not(operand):
+            source = "not " + render(operand, PREC_NOT)
+            if PREC_NOT < pp: source = f"({source})"
+        case And(args) | Or(args) | Imp(args):
+            p, symbol = {And: (PREC_AND, " and "), Or: (PREC_OR, " or "), Imp: (PREC_IMP, " > ")}[type(node)]
+            source = symbol.join(render(arg, p + 1) for arg in args)
+            if p < pp: source = f"({source})"
+
+    text[pp] = source
+    return source
+
+def to_source(node):
+    """ render an expression the way astor.to_source renders the equivalent ast """
+    return render(node, PREC_HIGHEST)
+
+def canonical(node):
+    """
+    Whitespace-free key that is identical for expressions equal up to commutativity, e.g.
+    "(b or not a) and c" and "c and (not a or b)" both give "&(c,|(b,~a))" (cached per node)
+    """
+    key = node._canonical
+    if key is None:
+        match node:
+            case Var(name):
+                key = name
+            case Const(value):
+                key = str(value)
+            case Not(operand):
+                key = "~" + canonical(operand)
+            case And(args):
+                key = "&(" + ",".join(sorted(map(canonical, args))) + ")"
+            case Or(args):
+                key = "|(" + ",".join(sorted(map(canonical, args))) + ")"
+            case Imp(args):
+                key = ">(" + ",".join(map(canonical, args)) + ")"
+        object.__setattr__(node, "_canonical", key)
+    return key
+
+def walk(tree):
+    """
+    Breadth first walk over every position in the tree (same order as ast.walk)
+
+    Output: list of (node, parent position, child index); the root's parent is -1
+    """
+    sites = [(tree, -1, 0)]
+    i = 0
+    while i < len(sites):
+        node = sites[i][0]
+        for j, child in enumerate(node.children):
+            sites.append((child, i, j))
+        i += 1
+    return sites
+
+def replace_site(sites, i, new_node):
+    """ rebuild the tree from `walk` with the node at position i swapped for `new_node` """
+    while True:
+        _, parent, index = sites[i]
+        if parent == -1:
+            return new_node
+        new_node = sites[parent][0].with_child(index, new_node)
+        i = parent
+
+def variables(node):
+    """ names of every variable occurrence, in walk order """
+    return [site[0].name for site in walk(node) if isinstance(site[0], Var)]
+
+def node_at(tree, path):
+    """ node at a path of child indices """
+    for i in path:
+        tree = tree.children[i]
+    return tree
+
+def replace_path(tree, path, new_node):
+    """ rebuild the tree with the node at `path` swapped for `new_node` """
+    if not path:
+        return new_node
+    i = path[0]
+    return tree.with_child(i, replace_path(tree.children[i], path[1:], new_node))
+
+if __name__ == '__main__':
+    # parse throughput: python3 guide/dag.py --file experiments.txt
+    import time
+    import argparse
+    arg_parser = argparse.ArgumentParser(description="Parser throughput benchmark")
+    arg_parser.add_argument("--file", type=str, default="experiments.txt", help="Corpus of expressions, one per line")
+    arg_parser.add_argument("--seconds", type=float, default=1.0, help="Time spent on each measurement")
+    args = arg_parser.parse_args()
+
+    def throughput(exprs):
+        """ (parses/s, characters/s) parsing exprs over and over, bypassing the parse cache """
+        n, chars, start = 0, 0, time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < args.seconds:
+            for expr in exprs:
+                Parser(expr).parse()
+            n, chars = n + len(exprs), chars + sum(map(len, exprs))
+        return n / elapsed, chars / elapsed
+
+    with open(args.file) as file:
+        corpus = [re.sub(r"^\d+[:.]\s*", "", line.strip()) for line in file if line.strip() and not line.startswith("#")]
+    per_second, chars_per_second = throughput(corpus)
+    print(f"{args.file}: {len(corpus)} expressions, {per_second:,.0f} parses/s, {chars_per_second:,.0f} chars/s")
+
+    # nested biconditionals and flat chains: characters/s stays flat when parsing is linear
+    for n in (4, 16, 64, 256):
+        nested = "x0"
+        for i in range(1, n): nested = f"(x{i} <-> {nested})"
+        chain = " and ".join(f"(x{i} or not y{i} -> z{i})" for i in range(n))
+        for name, expr in (("nested <->", nested), ("chain", chain)):
+            per_second, chars_per_second = throughput([expr])
+            print(f"{name:<11} n={n:<4} {len(expr):>6} chars {per_second:>10,.0f} parses/s {chars_per_second:>12,.0f} chars/s")
@@ -0,0 +1,64 @@
+"""
+HEURISTIC VALUE FUNCTION
+
+Scores expressions on the same 1-10 scale as the llm value prompt (higher = closer to a finished proof)
+from structural features of their DAG, without any llm call:
+
+    size        number of nodes
+    depth       height of the tree
+    negations   deepest nesting of not
+    duplicates  variable occurrences beyond the first of each variable
+    constants   number of 0/1 leaves (each one can be simplified away)
+    distance    operator nodes left above the literals (0 for a, not a, 0 and 1)
+
+Features are computed once per interned node, and the recursive ones (negations, distance) reuse the
+values of the children, so scoring a frontier only visits its new nodes. A frontier is scored in one
+matrix product.
+"""
+
+import numpy as np
+from functools import lru_cache
+from dag import Var, Const, Not, parse, walk
+
+FEATURES = ("size", "depth", "negations", "duplicates", "constants", "distance")
+WEIGHTS = np.array([0.25, 0.3, 0.5, 0.75, 0.75, 0.25])
+SCALE = 8.0 # cost at which the score has dropped by a factor of e
+
+def is_literal(node):
+    return isinstance(node, (Var, Const)) or (isinstance(node, Not) and isinstance(node.operand, Var))
+
+@lru_cache(maxsize=65536)
+def literal_distance(node):
+    """ operator nodes above the literals """
+    if is_literal(node): return 0
+    return 1 + sum(map(literal_distance, node.children))
+
+@lru_cache(maxsize=65536)
+def negation_depth(node):
+    depth = max(map(negation_depth, node.children), default=0)
+    return depth + 1 if isinstance(node, Not) else depth
+
+@lru_cache(maxsize=65536)
+def features(tree):
+    """ feature vector of an expression tree, in FEATURES order """
+    nodes = [site[0] for site in walk(tree)]
+    names = [node.name for node in nodes if isinstance(node, Var)]
+    constants = sum(isinstance(node, Const) for node in nodes) if tree.size > 1 else 0 # (1) and (0) are finished
+    return (tree.size, tree.depth, negation_depth(tree), len(names) - len(set(names)), constants, literal_distance(tree))
+
+def feature_matrix(exprs):
+    """ (len(exprs), len(FEATURES)) matrix of expression strings or trees """
+    return np.array([features(parse(expr) if isinstance(expr, str) else expr) for expr in exprs], dtype=float).reshape(-1, len(FEATURES))
+
+def heuristic_costs(exprs, weights=WEIGHTS):
+    """ weighted feature cost of every expression, 0 for a literal """
+    matrix = feature_matrix(exprs)
+    return np.where(matrix[:, FEATURES.index("distance")] == 0, 0, matrix @ weights)
+
+def heuristic_values(exprs, weights=WEIGHTS):
+    """ 1-10 score of every expression, 10 for a literal """
+    return 1 + 9 * np.exp(-heuristic_costs(exprs, weights) / SCALE)
+
+def blend_values(llm_values, heuristic, weight):
+    """ weight * heuristic + (1 - weight) * llm """
+    return weight * np.asarray(heuristic, dtype=float) + (1 - weight) * np.asarray(llm_values, dtype=float)
@@ -1,55 +1,269 @@
 import os
+import json
 import time
+import random
+import asyncio
+import inspect
+import threading
+import http.client
+from queue import LifoQueue, Empty, Full
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from metrics import report
+from mock_llm import MockLLM
+from cache import batch_slot
 
-def llm_api_call(message, system="", model="gpt-4o-mini"):
+# ----------API CLIENTS-----------
+# One Client per model, shared by every thread: a pool of keep-alive https connections, a token
+# bucket limiting the request rate and jittered exponential backoff on retryable errors only.
+# The apis are called over plain http (no sdk), so ANTHROPIC_BASE_URL / OPENAI_BASE_URL can point
+# them at a local stub, or the mock models answer offline (see BACKENDS).
+
+MODELS = { # model -> (provider, api model name)
+    "claude-3-haiku": ("anthropic", "claude-3-haiku-20240307"),
+    "gpt-3.5-turbo": ("openai", "gpt-3.5-turbo"),
+    "gpt-4o-mini": ("openai", "gpt-4o-mini"),
+}
+BASE_URLS = {"anthropic": "https://api.anthropic.com", "openai": "https://api.openai.com/v1"}
+API_KEYS = {"anthropic": "ANTHROPIC_API_KEY", "openai": "OPENAI_API_KEY"}
+RETRYABLE = {408, 409, 429, 500, 502, 503, 504, 529} # rate limits, timeouts, overloaded and server errors
+
+class APIError(Exception):
+    """ http error from an llm api, `retry_after` is the delay the server asked for (seconds) or None """
+    def __init__(self, status, body, retry_after=None):
+        super().__init__(f"HTTP {status}: {body[:200]}")
+        self.status, self.retry_after = status, retry_after
+
+    @property
+    def retryable(self):
+        return self.status in RETRYABLE
+
+def retry_after(headers):
+    """ seconds to wait from the retry-after-ms / retry-after headers (delta seconds or an http date) """
+    if (ms := headers.get("retry-after-ms")) is not None:
+        try: return max(0.0, float(ms) / 1000)
+        except ValueError: pass
+    value = headers.get("retry-after")
+    if value is None: return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try: return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError): return None
+
+class TokenBucket:
+    """ allows `rate` requests per second on average and bursts of `capacity` """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """ take a token, sleeping until it is available, returns the seconds waited """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1 # reserve it now so waiting threads queue up in order
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait: time.sleep(wait)
+        return wait
+
+class Client:
+    """
+    http client of one llm api
+
+    rate:        max requests per second (token bucket), None for no limit
+    max_retries: retries of a retryable error before giving up
+    base_delay:  backoff before retry i is uniform in [0, min(max_delay, base_delay * 2**i)] (full
+                 jitter), unless the server sent Retry-After (honored up to max_delay)
+    """
+    def __init__(self, provider, base_url, api_key, rate=None, max_retries=8, base_delay=1.0, max_delay=60.0, timeout=60.0, pool_size=16):
+        self.provider = provider
+        url = urlsplit(base_url)
+        self.https = url.scheme == "https"
+        self.host, self.port, self.prefix = url.hostname, url.port, url.path.rstrip("/")
+        self.headers = {"content-type": "application/json"}
+        if provider == "anthropic": self.headers.update({"x-api-key": api_key, "anthropic-version": "2023-06-01"})
+        else: self.headers["authorization"] = f"Bearer {api_key}"
+        self.bucket = TokenBucket(rate) if rate else None
+        self.max_retries, self.base_delay, self.max_delay, self.timeout = max_retries, base_delay, max_delay, timeout
+        self.pool = LifoQueue(maxsize=pool_size) # idle connections, most recently used first
+
+    def connect(self):
+        try:
+            return self.pool.get_nowait()
+        except Empty:
+            connection = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            return connection(self.host, self.port, timeout=self.timeout)
+
+    def release(self, connection):
+        try:
+            self.pool.put_nowait(connection)
+        except Full:
+            connection.close()
+
+    def post(self, path, body):
+        """ one request, raises APIError or a connection error (OSError / http.client.HTTPException) """
+        if self.bucket: self.bucket.acquire()
+        connection = self.connect()
+        try:
+            connection.request("POST", self.prefix + path, json.dumps(body), self.headers)
+            response = connection.getresponse()
+            data = response.read().decode()
+        except (OSError, http.client.HTTPException):
+            connection.close() # e.g. a keep-alive connection the server already closed
+            raise
+        if response.will_close: connection.close()
+        else: self.release(connection)
+        if response.status != 200:
+            raise APIError(response.status, data, retry_after(response.headers))
+        return json.loads(data)
+
+    def backoff(self, attempt, error):
+        """ seconds to sleep before retry `attempt` (0 based) """
+        if isinstance(error, APIError) and error.retry_after is not None:
+            return min(error.retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def complete(self, model, system, message, temperature=None):
+        """
+        Output: the response text, None once every retry failed
+        non-retryable api errors (bad request, authentication, ...) are raised
+        """
+        if self.provider == "anthropic":
+            path = "/v1/messages"
+            body = {"model": model, "max_tokens": 1000, "temperature": 0.7 if temperature is None else temperature,
+                    "system": system, "messages": [{"role": "user", "content": message}]}
+        else:
+            path = "/chat/completions"
+            body = {"model": model, "messages": [{"role": "system", "content": system}, {"role": "user", "content": message}]}
+            if temperature is not None: body["temperature"] = temperature
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                res = self.post(path, body)
+            except (APIError, OSError, http.client.HTTPException) as e:
+                if isinstance(e, APIError) and not e.retryable: raise
+                if attempt == self.max_retries:
+                    print(f"ERROR: {model} failed after {attempt + 1} attempts: {e}")
+                    return None
+                delay = self.backoff(attempt, e)
+                print(f"{type(e).__name__}: {e}, retrying in {delay:.1f} seconds...")
+                report(backoff=delay)
+                time.sleep(delay)
+                continue
+            if self.provider == "anthropic":
+                report(usage=(res["usage"]["input_tokens"], res["usage"]["output_tokens"]))
+                return res["content"][0]["text"].strip()
+            report(usage=(res["usage"]["prompt_tokens"], res["usage"]["completion_tokens"]))
+            return res["choices"][0]["message"]["content"]
+
+# ----------BACKENDS-----------
+# provider -> factory(provider, **options) building the shared client of its models: an object with
+# complete(model, system, message, temperature) taking the api model name. MODELS maps every model
+# to its provider, register_backend adds both.
+
+MOCK_OPTIONS = ("latency", "jitter", "seed")
+
+def api_client(provider, **options):
+    """ http Client of an api, keys and base urls are read from the environment / .env (mock options are ignored) """
+    load_dotenv()
+    api_key = os.getenv(API_KEYS[provider])
+    if not api_key:
+        print(f"ERR: {API_KEYS[provider]} is not set")
+        exit(0)
+    base_url = os.getenv(f"{provider.upper()}_BASE_URL") or BASE_URLS[provider]
+    return Client(provider, base_url, api_key, **{name: value for name, value in options.items() if name not in MOCK_OPTIONS})
+
+def mock_client(provider, latency=0.0, jitter=0.0, seed=0, **options):
+    """ offline deterministic MockLLM, see mock_llm.py (api options are ignored) """
+    return MockLLM(latency=latency, jitter=jitter, seed=seed)
+
+BACKENDS = {"anthropic": api_client, "openai": api_client}
+clients, clients_lock = {}, threading.Lock()
+client_options = {} # client keyword arguments, see set_client_options
+
+def register_backend(provider, factory, models):
+    """ models: {model: api model name} served by the provider """
+    with clients_lock:
+        BACKENDS[provider] = factory
+        MODELS.update({model: (provider, name) for model, name in models.items()})
+
+register_backend("mock", mock_client, {"mock": "shortest", "mock-shortest": "shortest", "mock-random": "random", "mock-heuristic": "heuristic"})
+
+def set_client_options(**options):
+    """ e.g. rate=5, max_retries=4 (api clients), latency=0.2, seed=1 (mock), drops the existing clients """
+    global clients
+    with clients_lock:
+        client_options.clear()
+        client_options.update(options)
+        clients = {}
+
+def get_client(model):
+    """ the shared client of a model """
+    with clients_lock:
+        if model not in clients:
+            provider = MODELS[model][0]
+            clients[model] = BACKENDS[provider](provider, **client_options)
+        return clients[model]
+
+def llm_api_call(message, system="", model="gpt-4o-mini", temperature=None, cache=None):
     """
     llm api call
-    make set up your API keys in a .env file
+    make set up your API keys in a .env file (the mock models run offline, see BACKENDS)
+
+    temperature: sampling temperature, None uses the default (0.7 for claude, the api default for gpt)
+    cache:       optional cache.LLMCache, responses are looked up before and stored after the api call
+
+    Cache hits, token usage and backoff sleeps are reported to metrics.py.
     """
     assert message != "", "ERROR: llm_api_call() 'message' param should not be null"
-    if model == "claude-3-haiku":
-        import anthropic
-        load_dotenv()
-        api_key = os.getenv('ANTHROPIC_API_KEY') 
-        client = anthropic.Anthropic(api_key=api_key)
-        for _ in range(10):
-            try: 
-                res = client.messages.create(
-                    model="claude-3-haiku-20240307",
-                    max_tokens=1000,
-                    temperature=0.7,
-                    system=system,
-                    messages=[
-                        {"role": "user", "content": message}
-                    ]
-                )
-                res = res.content[0].text.strip()
-                return res
-            except:
-                print("Sleeping for 10 seconds...")
-                time.sleep(10)
-    elif model in ["gpt-3.5-turbo", "gpt-4o-mini"]: 
-        import openai
-        load_dotenv()
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key != "": openai.api_key = api_key
-        else: 
-            print("ERR: OPENAI_API_KEY is not set")
-            exit(0)
-        
-        for i in range(20): # to get around rate limit
-            try: 
-                completion = openai.ChatCompletion.create(model=model, messages=[{"role": "system", "content": system},{"role": "user", "content": message}])
-                res = completion.choices[0].message.content
-                return res
-            except:
-                print(f"Sleeping for {(5*i) + 2 // 2} seconds...")
-                time.sleep((5 * i) + 2 // 2)
-
-    else:
-        print("ERROR: Unsupported model. Pick 'gpt-4o-mini', 'gpt-3.5-turbo' or 'claude-3-haiku'")
-        exit(0)
+    if cache is not None:
+        sample = cache.next_sample(model, system, message, temperature)
+        res = cache.get(model, system, message, temperature, sample)
+        if res is not None: report(cached=True)
+        if res is None:
+            res = llm_api_call(message, system=system, model=model, temperature=temperature)
+            if res is not None: cache.put(model, system, message, res, temperature, sample)
+        return res
+
+    if model not in MODELS:
+        raise ValueError(f"ERROR: Unsupported model {model!r}. Pick one of {', '.join(MODELS)}")
+    return get_client(model).complete(MODELS[model][1], system, message, temperature)
+
+async def llm_gather(messages, llm, concurrency=8):
+    """
+    send every message to the llm concurrently, with at most `concurrency` calls in flight
+    llm can be a blocking callable (run in worker threads, like llm_api_call) or an async one
+    Output: responses in the same order as messages
+    Repeated messages get LLMCache sample indices by position in `messages` (see cache.batch_slot)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    occurrences, seen, reservations, slots = Counter(messages), Counter(), {}, []
+    for message in messages:
+        slots.append((reservations, seen[message], occurrences[message]))
+        seen[message] += 1
+
+    async def call(message, slot):
+        batch_slot.set(slot) # each task runs in its own context, copied into its worker thread
+        async with semaphore:
+            if inspect.iscoroutinefunction(llm):
+                return await llm(message=message)
+            return await asyncio.to_thread(llm, message=message)
+
+    return await asyncio.gather(*map(call, messages, slots))
+
+def llm_batch(messages, llm, concurrency=8):
+    """ blocking wrapper around llm_gather """
+    if not messages: return []
+    return asyncio.run(llm_gather(messages, llm, concurrency))
 
 if __name__ == '__main__':
     import argparse
@@ -57,5 +271,5 @@ if __name__ == '__main__':
     parser.add_argument("--gpt", action='store_true', help="Use OpenAI GPT-3.5-turbo instead of Claude 3 Haiku")
     args = parser.parse_args()
 
-    res = llm_api_call(message="((not(x or y) and z) or True) <-> z", claude=not args.gpt)
+    res = llm_api_call(message="((not(x or y) and z) or True) <-> z", model="gpt-3.5-turbo" if args.gpt else "claude-3-haiku")
     print(res) 
\ No newline at end of file
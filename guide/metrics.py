@@ -0,0 +1,173 @@
+"""
+LLM METRICS
+
+Per-run accounting of every llm call, by call site:
+
+    propose   proposal prompts (choose the next law)
+    value     value prompts (grade a node)
+    retry     re-asks after a response without a valid choice / grade
+    deduce    --pure_llm deduction prompts
+
+For each site: calls, cache hits, errors, prompt / completion tokens (reported by the api when it
+returns usage, otherwise estimated at 4 characters per token), wall-clock latency (histogram and
+percentiles), backoff sleeps inside llm_api_call and an estimated cost. Cache hits cost nothing.
+The run's wall time is split into llm_seconds (at least one call in flight) and engine_seconds (the
+rest: symbolic engine, pruning, prompts), which the offline mock models make easy to profile.
+
+`current` is the Metrics of the running proof. Wrap an llm callable with metered(llm, site) to record
+its calls; llm_api_call reports cache hits, api usage and backoff through report(), which attributes
+them to the call running in the same thread.
+"""
+
+import json
+import time
+import inspect
+import threading
+from collections import defaultdict
+from utils import approx_tokens
+
+# $ per million (prompt, completion) tokens
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "claude-3-haiku": (0.25, 1.25),
+}
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30) # upper bounds in seconds, the last bucket is open
+SITES = ("propose", "value", "retry", "deduce")
+COUNTERS = ("calls", "cached", "errors", "prompt_tokens", "completion_tokens", "backoffs", "backoff_seconds", "latency_total", "cost")
+
+local = threading.local() # what llm_api_call reports about the call running in this thread
+
+def report(**events):
+    """
+    called by llm_api_call: cached=True, usage=(prompt_tokens, completion_tokens), backoff=seconds slept
+    """
+    if not hasattr(local, "events"): return
+    for name, value in events.items():
+        if name == "backoff":
+            local.events["backoffs"] += 1
+            local.events["backoff_seconds"] += value
+        else:
+            local.events[name] = value
+
+class Metrics:
+    def __init__(self, model=None):
+        self.model = model
+        self.lock = threading.Lock()
+        self.sites = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        self.latencies = defaultdict(list) # site -> latency of every call
+        self.last_level = {}               # site -> counters at the previous level record
+        self.started = time.perf_counter()
+        self.in_flight, self.busy, self.busy_since = 0, 0.0, None # calls running, seconds with a call running
+
+    def begin(self):
+        with self.lock:
+            if not self.in_flight: self.busy_since = time.perf_counter()
+            self.in_flight += 1
+
+    def end(self):
+        with self.lock:
+            self.in_flight -= 1
+            if not self.in_flight: self.busy += time.perf_counter() - self.busy_since
+
+    def timing(self):
+        """ wall seconds since the start, split into llm and engine time """
+        now = time.perf_counter()
+        llm_seconds = self.busy + (now - self.busy_since if self.in_flight else 0)
+        return {"seconds": now - self.started, "llm_seconds": llm_seconds, "engine_seconds": now - self.started - llm_seconds}
+
+    def cost(self, prompt_tokens, completion_tokens):
+        prompt_price, completion_price = PRICES.get(self.model, (0, 0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+    def record(self, site, message, response, latency, events, error=False):
+        cached = events.get("cached", False)
+        prompt_tokens, completion_tokens = events.get("usage") or (approx_tokens(message), approx_tokens(response or ""))
+        with self.lock:
+            counters = self.sites[site]
+            counters["calls"] += 1
+            counters["cached"] += cached
+            counters["errors"] += error
+            counters["prompt_tokens"] += prompt_tokens
+            counters["completion_tokens"] += completion_tokens
+            counters["backoffs"] += events["backoffs"]
+            counters["backoff_seconds"] += events["backoff_seconds"]
+            counters["latency_total"] += latency
+            if not cached and not error: counters["cost"] += self.cost(prompt_tokens, completion_tokens)
+            self.latencies[site].append(latency)
+
+    def histogram(self, latencies):
+        counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        for latency in latencies:
+            counts[next((i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound), len(LATENCY_BUCKETS))] += 1
+        labels = [f"<={bound}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        return dict(zip(labels, counts))
+
+    def latency_stats(self, latencies):
+        if not latencies: return {}
+        ordered = sorted(latencies)
+        percentile = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+        return {"mean": sum(ordered) / len(ordered), "p50": percentile(0.5), "p90": percentile(0.9), "max": ordered[-1],
+                "histogram": self.histogram(ordered)}
+
+    def summary(self):
+        """ counters and latency stats per site and in total, as a json-serializable dict """
+        with self.lock:
+            sites = {site: dict(counters, latency=self.latency_stats(self.latencies[site]))
+                     for site, counters in sorted(self.sites.items(), key=lambda item: SITES.index(item[0]) if item[0] in SITES else len(SITES))}
+            total = {name: sum(self.sites[site][name] for site in self.sites) for name in COUNTERS}
+            total["latency"] = self.latency_stats([latency for latencies in self.latencies.values() for latency in latencies])
+            timing = self.timing()
+        return {"model": self.model, **timing, "total": total, "sites": sites}
+
+    def level_record(self, level):
+        """ counters added since the previous level record, per site """
+        with self.lock:
+            record = {"level": level, "sites": {}}
+            for site, counters in self.sites.items():
+                last = self.last_level.get(site, dict.fromkeys(COUNTERS, 0))
+                delta = {name: counters[name] - last[name] for name in COUNTERS}
+                if delta["calls"]: record["sites"][site] = delta
+                self.last_level[site] = dict(counters)
+        return record
+
+    def write_level(self, path, level, **extra):
+        """ append this level's record to a jsonl stream """
+        with open(path, "a") as file:
+            file.write(json.dumps({**self.level_record(level), **extra}) + "\n")
+
+current = Metrics()
+
+def metered(llm, site):
+    """ llm callable recording every call in `current` under `site` """
+    def finish(metrics, started, events, message, res, error):
+        metrics.end()
+        metrics.record(site, message, res, time.perf_counter() - started, events, error)
+
+    if inspect.iscoroutinefunction(llm):
+        async def call(message, **kwargs):
+            # coroutines share the event loop's thread, so an async llm's own events are not reported
+            metrics, events = current, {"backoffs": 0, "backoff_seconds": 0}
+            metrics.begin()
+            started, res, error = time.perf_counter(), None, True
+            try:
+                res = await llm(message=message, **kwargs)
+                error = False
+                return res
+            finally:
+                finish(metrics, started, events, message, res, error)
+        return call
+
+    def call(message, **kwargs):
+        local.events = events = {"backoffs": 0, "backoff_seconds": 0}
+        metrics = current
+        metrics.begin()
+        started, res, error = time.perf_counter(), None, True
+        try:
+            res = llm(message=message, **kwargs)
+            error = False
+            return res
+        finally:
+            del local.events
+            finish(metrics, started, events, message, res, error)
+    return call
@@ -0,0 +1,90 @@
+"""
+MOCK LLM
+
+Offline, deterministic stand-in for the llm apis, registered in llm.py as the "mock" models:
+
+    mock / mock-shortest   choose the shortest expression, grade by expression size
+    mock-random            seeded random choice and grade
+    mock-heuristic         choose and grade with heuristic.py's value function
+
+It answers the engine's prompts in the format they ask for (LLM CHOICE: #n. / LLM GRADE: n /
+LLM DICT: {...} from the symbolic engine for --pure_llm), after an artificial latency, so searches
+and concurrency changes can be profiled without the network. Like a sampled llm, the n-th time a
+prompt is asked gets the n-th answer: shortest and heuristic choose their n-th best choice, random
+draws from a rng seeded with n. Inside an llm.llm_batch n is the position in the batch (cache.batch_slot),
+so answers only depend on the prompt, the seed and the call order of the run, whatever the thread
+interleaving.
+
+python3 guide/proof_engine.py --model mock-heuristic --mock_latency 0.2
+"""
+
+import re
+import json
+import time
+import random
+import threading
+from collections import Counter
+from cache import take_sample
+from dag import parse
+from heuristic import heuristic_costs, heuristic_values
+from symbolic import symbolic_deduce
+
+STRATEGIES = ("shortest", "random", "heuristic")
+CHOICE = re.compile(r"#(\d+)\. (?:'.*?', ')?([^'\\\n]+)") # "#3. 'law', 'expr'" (quoted listing) or "#3. expr" (compact)
+GRADE = re.compile(r"Expression to grade: (.*)")
+DEDUCE = re.compile(r"ORIGINAL INPUT EXPRESSION: (.*)")
+
+class MockLLM:
+    """
+    latency: seconds slept per call, jitter: +- fraction of it drawn per call
+    seed:    varies the random strategy (and the jitter)
+    """
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        self.latency, self.jitter, self.seed = latency, jitter, seed
+        self.samples = Counter() # (strategy, message) -> times asked
+        self.lock = threading.Lock()
+
+    def choose(self, strategy, choices, rng, sample=0):
+        """ choice number of (number, expression) choices, the sample-th best one """
+        match strategy:
+            case "shortest":
+                ranked = sorted(choices, key=lambda choice: len(choice[1]))
+            case "random":
+                return rng.choice(choices)[0]
+            case "heuristic":
+                costs = heuristic_costs([expression for _, expression in choices])
+                ranked = [choices[i] for i in costs.argsort(kind="stable")]
+        return ranked[sample % len(ranked)][0]
+
+    def grade(self, strategy, expr, rng):
+        match strategy:
+            case "shortest":
+                return max(1, min(10, 11 - parse(expr).size // 2))
+            case "random":
+                return rng.randint(1, 10)
+            case "heuristic":
+                return round(float(heuristic_values([expr])[0]))
+
+    def answer(self, strategy, message, rng, sample=0):
+        if "LLM CHOICE" in message:
+            choices = [(number, expression.strip()) for number, expression in CHOICE.findall(message)]
+            return f"LLM CHOICE: #{self.choose(strategy, choices, rng, sample)}." if choices else "LLM CHOICE: #0."
+        if "LLM GRADE" in message and (expr := GRADE.search(message)):
+            try:
+                return f"LLM GRADE: {self.grade(strategy, expr.group(1).strip(), rng)}"
+            except SyntaxError:
+                return "LLM GRADE: 5"
+        if "LLM DICT" in message and (expr := DEDUCE.search(message)):
+            # apostrophes escaped, the engine swaps ' for " before decoding
+            return "LLM DICT: " + json.dumps(symbolic_deduce(expr.group(1).strip())).replace("'", "\\u0027")
+        return ""
+
+    def complete(self, model, system, message, temperature=None):
+        """ model is the strategy (the api model name of the mock models) """
+        if model not in STRATEGIES: raise ValueError(f"ERROR: unknown mock strategy {model!r}, pick one of {STRATEGIES}")
+        with self.lock:
+            sample = take_sample(self.samples, (model, message))
+        rng = random.Random(f"{self.seed}:{sample}:{message}")
+        delay = self.latency * (1 + self.jitter * rng.uniform(-1, 1))
+        if delay > 0: time.sleep(delay)
+        return self.answer(model, message, rng, sample)
@@ -0,0 +1,232 @@
+"""
+PROOF LENGTH ORACLE
+
+Shortest proof of a tautology over the symbolic engine's rewrite graph, as a reference for the
+proofs proof_engine finds. A step is one deduction law or simplification rule applied at one
+position, the same steps the engine records. States are hashed modulo commutativity: every state
+is kept in a commutative normal form (operands of and/or sorted by their canonical key), so
+reordering operands is free and equal states share one interned tree.
+
+Meet in the middle: a breadth first search forward from the expression and one backward from (1)
+with the symbolic_mirror laws (inverse laws, introducing the expression's variables). Every
+backward edge is checked against the forward rules, so each step is an engine law applied to some
+operand order of the state. The proof leaves out the Commutative Law steps the engine would need to
+reach that order, so lengths count the non-commutative steps only, and efficiency() compares them
+with the engine proof's non-commutative steps. The smaller frontier is expanded first and the search
+stops once no shorter proof can exist.
+
+The backward side only contains the predecessors the mirror laws generate, so it can miss the
+end of a shorter proof. Once the sides meet, the forward search alone continues until it has
+searched every state closer than the proof found (the last, largest layer is never needed) and the
+length is "exact": no shorter proof exists among states of at most max_size nodes. If the memory cap
+stops it first, the length is an upper bound.
+
+python3 guide/oracle.py --file experiments.txt --max_states 200000
+python3 guide/oracle.py --file experiments.txt --results results.jsonl   # score batch.py proofs
+"""
+
+import json
+import time
+import argparse
+import itertools
+from functools import lru_cache
+from dag import Const, And, Or, parse, to_source, canonical, variables, Var, walk, replace_site
+from symbolic import DEDUCTION_LAWS, COMMUTATIVE_LAWS, simplification
+from symbolic_mirror import MIRROR_LAWS, LAWS_BY_TYPE, FRESH_LAWS
+from truth_table import classify
+
+GOAL = Const(1)
+
+@lru_cache(maxsize=1 << 16)
+def normal(node):
+    """ commutative normal form: and/or operands sorted by canonical key, recursively """
+    if not node.children: return node
+    args = [normal(child) for child in node.args]
+    if isinstance(node, (And, Or)): args.sort(key=canonical)
+    return type(node)(*args)
+
+def swaps(node):
+    return (node, type(node)(node.args[1], node.args[0])) if isinstance(node, (And, Or)) and len(node.args) == 2 else (node,)
+
+@lru_cache(maxsize=1 << 16)
+def variants(node):
+    """
+    the node with its own and its children's binary and/or operands in every order, enough for every
+    rule to see any commutative reordering since no pattern looks deeper than the grandchildren
+    """
+    found = {}
+    for top in swaps(node):
+        for children in itertools.product(*map(swaps, top.children)):
+            found[type(top)(*children) if children else top] = None
+    return tuple(found)
+
+def rewrites(node):
+    """ (law, replacement) of every forward rule matching the node """
+    for law, rule in DEDUCTION_LAWS:
+        if (new_node := rule(node)) is not None:
+            yield law, new_node
+    if (rule := simplification(node)) is not None:
+        yield rule
+
+@lru_cache(maxsize=1 << 16)
+def local_successors(node):
+    """ normal form -> law of every subtree one rule at the root of `node` turns it into """
+    found = {}
+    for variant in variants(node):
+        for law, new_node in rewrites(variant):
+            found.setdefault(normal(new_node), law)
+    return found
+
+@lru_cache(maxsize=1 << 16)
+def local_predecessors(node, fresh):
+    """
+    normal form -> law of every subtree one mirror law at the root of `node` grows it into, kept only
+    if a forward rule turns it back into `node` (the law is that forward rule)
+    """
+    found = {}
+    for variant in variants(node):
+        for mirror_law in LAWS_BY_TYPE[type(variant)]:
+            rule = MIRROR_LAWS[mirror_law]
+            for new_node in [rule(variant, term) for term in fresh] if mirror_law in FRESH_LAWS else [rule(variant)]:
+                if new_node is None: continue
+                new_node = normal(new_node)
+                if new_node not in found and (law := local_successors(new_node).get(node)) is not None:
+                    found[new_node] = law
+    return found
+
+def neighbours(tree, local):
+    """ normal form -> law of every state `local` rewrites one position of the tree into """
+    found = {}
+    sites = walk(tree)
+    for i, (node, _, _) in enumerate(sites):
+        for new_node, law in local(node).items():
+            state = normal(replace_site(sites, i, new_node))
+            if state is not tree: found.setdefault(state, law)
+    return found
+
+def path(parents, state):
+    """ [(state, law that led to it)] from the search's root to `state` """
+    steps = []
+    while state is not None:
+        parent, law, _ = parents[state]
+        steps.append((state, law))
+        state = parent
+    return steps[::-1]
+
+def shortest_proof(expr, max_states=100_000, max_size=None, bidirectional=True, certify=True):
+    """
+    Output: dict with
+        length          steps of the shortest proof found (reorderings not counted), None if none was found
+        proof           [(expr, law)] from expr to (1), law None for the first step, states in
+                        commutative normal form with the reorderings between them left out
+        exact           no shorter proof exists (see the module docstring)
+        capped          the search stopped at max_states
+        forward_states / backward_states / seconds
+
+    max_states: states kept by both searches together (the memory cap)
+    max_size:   states with more nodes are not explored (default: twice the expression's size + 4)
+    certify:    once the sides meet, keep searching forward until the proof is known to be the shortest
+    """
+    start_time = time.perf_counter()
+    start = normal(parse(expr))
+    max_size = max_size or 2 * start.size + 4
+    fresh = tuple(Var(name) for name in sorted(set(variables(start)))) or (Var("a"),)
+    backward_step = lambda node: local_predecessors(node, fresh)
+
+    forward = {start: (None, None, 0)} # state -> (parent, law from the parent, depth)
+    backward = {GOAL: (None, None, 0)} # state -> (next state towards (1), law to it, steps to (1))
+    frontiers = {"forward": [start], "backward": [GOAL] if bidirectional else []}
+    depths = {"forward": 0, "backward": 0} # layers searched by each side
+    best, meet, capped, complete = None, None, False, 0 # complete: forward layers searched in full
+
+    def met(state, length):
+        nonlocal best, meet
+        if best is None or length < best:
+            best, meet = length, state
+
+    if start is GOAL: met(start, 0)
+    while best is None or best > complete + 1: # until every shorter proof is ruled out
+        if best is None or best > depths["forward"] + depths["backward"] + 1:
+            sides = [side for side in ("forward", "backward") if frontiers[side]]
+        else: # the sides met, only the forward search can rule out a shorter proof the backward one missed
+            sides = ["forward"] if certify and frontiers["forward"] else []
+        if not sides: break
+        side = min(sides, key=lambda side: len(frontiers[side]))
+        seen, other = (forward, backward) if side == "forward" else (backward, forward)
+        next_frontier = []
+        for state in frontiers[side]:
+            for neighbour, law in neighbours(state, local_successors if side == "forward" else backward_step).items():
+                if neighbour in seen or neighbour.size > max_size: continue
+                seen[neighbour] = (state, law, depths[side] + 1)
+                next_frontier.append(neighbour)
+                if neighbour in other:
+                    met(neighbour, depths[side] + 1 + other[neighbour][2])
+            if len(forward) + len(backward) > max_states:
+                capped = True
+                break
+        frontiers[side] = next_frontier
+        depths[side] += 1
+        if capped: break
+        if side == "forward": complete += 1
+
+    proof = None
+    if meet is not None:
+        to_goal = path(backward, meet)[::-1] # meet ... (1), each with the law leading to the next state
+        proof = [(to_source(state), law) for state, law in path(forward, meet)]
+        proof += [(to_source(state), law) for (_, law), (state, _) in zip(to_goal, to_goal[1:])]
+    return {"expr": expr, "length": best, "proof": proof, "exact": best is not None and best <= complete + 1,
+            "capped": capped, "forward_states": len(forward), "backward_states": len(backward),
+            "seconds": round(time.perf_counter() - start_time, 3)}
+
+def engine_steps(laws):
+    """ steps of an engine proof the oracle counts: Commutative Law reorderings are free in its states """
+    commutative = {law for law, _ in COMMUTATIVE_LAWS}
+    return sum(law not in commutative for law in laws)
+
+def efficiency(steps, oracle_length):
+    """ oracle length / engine_steps(laws): 1 for a shortest proof, lower for longer detours """
+    if not steps or oracle_length is None: return None
+    return round(oracle_length / steps, 3)
+
+if __name__ == '__main__':
+    from batch import read_corpus
+    parser = argparse.ArgumentParser(description="Shortest proof oracle CLI args")
+    parser.add_argument("--expr", type=str, default=None, help="Expression to prove")
+    parser.add_argument("--file", type=str, default=None, help="Corpus of expressions (see batch.py)")
+    parser.add_argument("--results", type=str, default=None, help="batch.py results to score against the oracle")
+    parser.add_argument("--out", type=str, default=None, help="Append one json record per expression")
+    parser.add_argument("--max_states", type=int, default=100_000, help="States kept in memory per expression")
+    parser.add_argument("--max_size", type=int, default=None, help="Largest state explored (default: 2 * size + 4)")
+    parser.add_argument("--one_sided", action="store_true", help="Forward search only")
+    parser.add_argument("--upper_bound", action="store_true", help="Stop when the sides meet, without proving the length is minimal")
+    parser.add_argument("--verbose", action="store_true", help="Print every proof")
+    args = parser.parse_args()
+
+    corpus = [("expr", args.expr)] if args.expr else read_corpus(args.file or "experiments.txt")
+    engine = {}
+    if args.results:
+        with open(args.results) as file:
+            engine = {record["id"]: record for record in map(json.loads, file) if record.get("proved")}
+
+    out = open(args.out, "a") if args.out else None
+    for expr_id, expr in corpus:
+        try:
+            kind = classify(expr)
+        except (SyntaxError, ValueError) as e:
+            print(f"[{expr_id}] SKIPPED {type(e).__name__}: {e}")
+            continue
+        if kind != "tautology":
+            print(f"[{expr_id}] NOT A TAUTOLOGY {expr}")
+            continue
+        record = {"id": expr_id, **shortest_proof(expr, args.max_states, args.max_size, not args.one_sided, not args.upper_bound)}
+        status = ("CAPPED" if record["capped"] else "NOT FOUND") if record["length"] is None else f"length={record['length']}{'' if record['exact'] else ' (upper bound)'}"
+        if expr_id in engine:
+            steps = engine_steps(engine[expr_id]["laws"])
+            record["engine_steps"], record["efficiency"] = steps, efficiency(steps, record["length"])
+            status += f" engine={steps} efficiency={record['efficiency']}"
+        print(f"[{expr_id}] {status} states={record['forward_states']}+{record['backward_states']} {record['seconds']}s {expr}")
+        if args.verbose and record["proof"]:
+            for step, law in record["proof"]: print(f"    {step:40} {law or ''}")
+        if out:
+            out.write(json.dumps(record) + "\n")
+            out.flush()
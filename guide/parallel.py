@@ -0,0 +1,85 @@
+"""
+PARALLEL EXPANSION
+
+symbolic_deduce, simplify and is_reduced are CPU bound pure python, so a wide level is spread over a
+process pool. The pool is created once and reused for every level (and every proof in the process),
+so the spawn cost and each worker's parse / DAG caches are paid once.
+
+Expressions go out as strings and deductions come back as plain dicts of strings. With workers <= 1
+everything runs in this process.
+
+Deductions go through the DeductionCache set with set_deduction_cache. Each worker gets its own copy
+when the pool starts (same shared store, separate LRU) and reports whether it hit, so the cache's
+stats in this process count every lookup.
+"""
+
+import atexit
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from symbolic import symbolic_deduce, simplify, is_reduced
+
+pool = None # persistent ProcessPoolExecutor
+pool_workers = 0
+deductions = None # DeductionCache of this process, or None to always run the symbolic engine
+
+def set_deduction_cache(cache):
+    """ use `cache` here and in the workers (restarts the pool) """
+    global deductions
+    deductions = cache
+    shutdown()
+
+def init_worker(cache):
+    """ forked workers get a copy of the parent's cache, filled LRU and locks included: start it afresh """
+    global deductions
+    if cache is not None: cache.__setstate__(cache.__getstate__())
+    deductions = cache
+
+def get_pool(workers):
+    """ the shared pool, (re)started if the number of workers changed """
+    global pool, pool_workers
+    if pool is None or pool_workers != workers:
+        shutdown()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(deductions,))
+        pool_workers = workers
+    return pool
+
+def shutdown():
+    global pool, pool_workers
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+        pool, pool_workers = None, 0
+
+atexit.register(shutdown)
+
+def pool_map(fn, args, workers):
+    """ map fn over args in the pool, results in order """
+    args = list(args)
+    if workers <= 1 or len(args) <= 1:
+        return list(map(fn, args))
+    chunksize = max(1, len(args) // (workers * 4))
+    return list(get_pool(workers).map(fn, args, chunksize=chunksize))
+
+def deduce(expr, verbose=False):
+    """ (deductions, lookup kind) of expr, the kind is None without a cache """
+    if deductions is None: return dict(symbolic_deduce(expr, verbose)), None
+    result, kind = deductions.lookup(deductions.key(expr), verbose)
+    return {law: list(expressions) for law, expressions in result.items()}, kind
+
+def settle(expr, verbose=False):
+    """
+    simplify a new node and check whether it is fully reduced
+    Output: (simplified, reduced) where simplified is (final_expr, new exprs, new laws) or None
+    """
+    simplified = simplify(expr=expr, item_history=("", [], []), verbose=verbose)
+    return simplified, is_reduced(simplified[0] if simplified else expr)
+
+def deduce_many(exprs, workers, verbose=False):
+    """ symbolic_deduce of every expression """
+    results = pool_map(partial(deduce, verbose=verbose), exprs, workers)
+    if deductions is not None and workers > 1 and len(results) > 1: # looked up in the workers
+        for _, kind in results: deductions.record(kind)
+    return [result for result, _ in results]
+
+def settle_many(exprs, workers, verbose=False):
+    """ settle every expression """
+    return pool_map(partial(settle, verbose=verbose), exprs, workers)
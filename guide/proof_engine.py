@@ -1,38 +1,128 @@
 import json
 import argparse
 from functools import partial
+import heapq
 import random
-
-from llm import llm_api_call
-from symbolic import symbolic_deduce, simplify, apply_bi_imp, is_reduced
+import itertools
+from collections import defaultdict
+
+import metrics
+from metrics import Metrics, metered
+from llm import llm_api_call, llm_batch, set_client_options
+from cache import LLMCache, DeductionCache
+from checkpoint import Checkpoint
+from proof_state import ProofState
+from symbolic import symbolic_deduce, simplify, apply_bi_imp, is_reduced, iter_rewrites, LAWS, REDUCING_LAWS
+from dag import Expr, parse, canonical, to_source
+from truth_table import classify, equivalent
+from parallel import deduce_many, settle_many, set_deduction_cache
+from heuristic import heuristic_values, heuristic_costs, blend_values
 from prompts import value_prompt, deduction_prompt
 from utils import create_propose_prompt, get_llm_choice, get_llm_value, get_greedy_choice
-    
-def get_value(expr, expr_history):
-    prompt = value_prompt.format(expr=expr, expr_history=expr_history)
-    llm_res = llm(message=prompt)
-    value = get_llm_value(llm_res, prompt, llm)
-    return value
 
+run = {} # stats of the last proof_engine call: proofs found, levels searched (depth) and nodes expanded
+deduction_cache = None # DeductionCache memoizing the symbolic engine, set by configure
+    
 def evaluate_tree(q):
+    """
+    value every node on the level with llm grades (all prompts sent together), heuristic scores
+    or a blend of both, depending on --value
+    """
+    states = {} # expr -> its first state on the level
+    for state in q:
+        states.setdefault(state.expr, state)
+
+    if value_fn != "heuristic":
+        prompts = [value_prompt.format(expr=expr, expr_history=state.expr_history) for expr, state in states.items()]
+        responses = llm_batch(prompts, metered(llm, "value"), concurrency)
+        scores = [get_llm_value(llm_res, prompt, metered(llm, "retry")) for prompt, llm_res in zip(prompts, responses)]
+    if value_fn == "heuristic":
+        scores = heuristic_values(list(states))
+    elif value_fn == "blend":
+        scores = blend_values(scores, heuristic_values(list(states)), value_weight)
+    local_value_cache = dict(zip(states, scores))
+
     values = []
-    local_value_cache = {}
-    for (expr, expr_history, law_history) in q:
-        if expr in local_value_cache:  # avoid duplicate candidates
-            value = 0
+    seen = set()
+    for state in q:
+        expr = state.expr
+        if expr in seen:  # avoid duplicate candidates
+            values.append(0)
         else:
-            value = get_value(expr, expr_history)
-            local_value_cache[expr] = value
-        values.append(value)
+            values.append(local_value_cache[expr])
+            seen.add(expr)
     return values
 
-def prune_tree(values, q, K):
-    # NOTE: Prunes ENTIRE tree, leaves K remaining nodes. Should this be per node?
+def level_parents(new_q, q):
+    """ index in q of the state each new state was expanded from (None if it has no ancestor in q) """
+    index = {id(item): i for i, item in enumerate(q)}
+    parents = []
+    for state in new_q:
+        while state is not None and id(state) not in index:
+            state = state.parent
+        parents.append(None if state is None else index[id(state)])
+    return parents
+
+def top_k(values, indices, k):
+    """ the k indices with the highest values, best first, ties in index order (O(n log k)) """
+    return heapq.nlargest(k, indices, key=lambda i: values[i])
+
+def prune_per_parent(values, parents, K, k=None):
+    """
+    top k children of every parent (k defaults to K split evenly between the parents), topped up with
+    the best of the rest if that leaves fewer than K, then the best K of those
+    """
+    groups = defaultdict(list)
+    for i, parent in enumerate(parents):
+        groups[parent].append(i)
+    k = k or -(-K // len(groups))
+    kept = sorted(i for members in groups.values() for i in top_k(values, members, k))
+    if len(kept) < K:
+        chosen = set(kept)
+        kept = sorted(kept + top_k(values, [i for i in range(len(values)) if i not in chosen], K - len(kept)))
+    return top_k(values, kept, K)
+
+def prune_diverse(values, q, parents, K, diversity):
+    """
+    Diverse beam: take the best node, then the best after penalties, and so on. Every node already
+    kept with the same canonical form (a commutative reordering) costs `diversity`, every kept sibling
+    costs diversity / 2. Penalties only grow, so a lazy max-heap re-scores a popped node and pushes it
+    back if its score went down instead of re-sorting the level.
+    """
+    keys = [canonical(parse(item.expr)) for item in q]
+    same_key, same_parent = defaultdict(int), defaultdict(int)
+    score = lambda i: values[i] - diversity * (same_key[keys[i]] + same_parent[parents[i]] / 2)
+    heap = [(-values[i], i, values[i]) for i in range(len(q))]
+    heapq.heapify(heap)
+    kept = []
+    while heap and len(kept) < K:
+        _, i, stale = heapq.heappop(heap)
+        current = score(i)
+        if current < stale: # penalized since it was pushed
+            heapq.heappush(heap, (-current, i, current))
+            continue
+        kept.append(i)
+        same_key[keys[i]] += 1
+        same_parent[parents[i]] += 1
+    return kept
+
+def prune_tree(values, q, K, parents=None):
+    """
+    keep K nodes of the level, best first, with the --prune strategy:
+    global:  the K best values
+    parent:  the best --per_parent children of each parent (parents[i] is node i's parent)
+    diverse: the K best after penalizing near-duplicates and siblings (--diversity)
+    """
     len_q = len(q)
     if len_q <= K: return q
     print(f"pruning {len_q-K} leaves...{K} nodes remain")
-    sorted_q = [node[1] for node in sorted(zip(values, q), key=lambda x: x[0], reverse=True)][:K]
-    return sorted_q
+    if parents is None or prune == "global":
+        kept = top_k(values, range(len_q), K)
+    elif prune == "parent":
+        kept = prune_per_parent(values, parents, K, per_parent)
+    else:
+        kept = prune_diverse(values, q, parents, K, diversity)
+    return [q[i] for i in kept]
 
 def get_formatted_proof(proof_history, law_history, num=0):
     if num > 1: print(f"----------FINAL PROOF #{num}----------")
@@ -47,12 +137,37 @@ def get_formatted_proof(proof_history, law_history, num=0):
         proof_steps.append(f"NOT TAUTOLOGY")
     formatted_proof = "Proof:\n" + "\n≡ ".join(proof_steps)
     print(formatted_proof)
+
+    unverified = unverified_steps(proof_history)
+    if unverified: print(f"WARNING: proof steps {unverified} are not equivalent to the input expression")
     return formatted_proof
 
-def check_proof(item, unique_proofs, q, done=False):
-    """ check if proof is done """
-    a, b, c = item
-    if len(a) == 1 or done or is_reduced(a):
+def is_equivalent(expr_a, expr_b):
+    """ truth table equivalence, False for expressions that don't parse or have too many variables """
+    try:
+        return equivalent(expr_a, expr_b)
+    except (SyntaxError, ValueError): # dag.ParseError is a SyntaxError
+        return False
+
+def unverified_steps(proof_history):
+    """ indices of the proof steps whose truth table differs from the first step """
+    return [i for i, step in enumerate(proof_history[1:], 1) if not is_equivalent(proof_history[0], step)]
+
+def equivalent_deductions(expr, expr_deductions):
+    """ drop deductions that are not equivalent to expr (e.g. llm hallucinations) """
+    kept = defaultdict(list)
+    for law, expressions in expr_deductions.items():
+        for expression in expressions:
+            if is_equivalent(expr, expression):
+                kept[law].append(expression)
+            elif verbose:
+                print(f"TRUTH TABLE: dropping {expression} ({law}), not equivalent to {expr}")
+    return kept
+
+def check_proof(item, unique_proofs, q, done=False, reduced=None):
+    """ check if proof is done, reduced can pass in an is_reduced result computed elsewhere """
+    a = item.expr
+    if len(a) == 1 or done or (is_reduced(a) if reduced is None else reduced):
         if item not in unique_proofs:
             print(f"FULLY REDUCED EXPR, PROOF DONE.")
             unique_proofs.append(item)
@@ -60,8 +175,8 @@ def check_proof(item, unique_proofs, q, done=False):
             # early stop for first proof found
             if early_stop:
                 print("EARLY STOPPING, FOUND FIRST PROOF...")
-                for i, (a, b, c) in enumerate(unique_proofs):
-                    formatted_proof = get_formatted_proof(b, c, num=i+1)
+                for i, proof in enumerate(unique_proofs):
+                    formatted_proof = get_formatted_proof(proof.expr_history, proof.law_history, num=i+1)
                     return q, formatted_proof
         else:
             print("REMOVING NON-UNIQUE PROOF...")
@@ -72,7 +187,7 @@ def llm_symbolic_deduce(expr_i, verbose=False, num_retries=3):
     attempt = 0
 
     while attempt < num_retries:
-        llm_res = llm(message=prompt)
+        llm_res = metered(llm, "deduce")(message=prompt)
         if verbose: print(f"Attempt {attempt+1}: llm_symbolic_deduce:", llm_res)
         try:
             json_str = llm_res.split('LLM DICT:')[1].strip()
@@ -84,31 +199,233 @@ def llm_symbolic_deduce(expr_i, verbose=False, num_retries=3):
             attempt += 1
     raise Exception("All attempts failed to parse JSON in llm_symbolic_deduce()")
 
+def transposition_key(expr):
+    """
+    Transposition table key of a state
+    exact:       the interned expression itself, so only identical expressions collide (default)
+    commutative: whitespace-free canonical form, shared by all commutative reorderings. Smaller
+                 tables, but laws only match one operand order (absorption, associativity), so
+                 dropping a Commutative Law child can leave a tautology without a reachable proof
+    expr can be a string or a parsed tree
+    """
+    tree = expr if isinstance(expr, Expr) else parse(expr)
+    return canonical(tree) if transposition == "commutative" else tree
+
+def add_state(item, new_q, visited, t):
+    """
+    Add a node to the next level unless the transposition table has already seen its state
+
+    visited maps canonical expr -> (depth first seen, index in new_q). A state repeated on the same
+    level is merged, keeping the shorter history. A state from an earlier level is dropped.
+    Returns True if the node was added.
+    """
+    if transposition == "off":
+        new_q.append(item)
+        return True
+
+    key = transposition_key(item.expr)
+    if key in visited:
+        depth, index = visited[key]
+        if depth == t and item.depth < new_q[index].depth:
+            new_q[index] = item
+        if verbose: print(f"TRANSPOSITION: dropping repeated state {item.expr}")
+        return False
+
+    visited[key] = (t, len(new_q))
+    if checkpoint: checkpoint.visit(key_string(key), t)
+    new_q.append(item)
+    return True
+
+def unseen_deductions(expr_deductions, visited):
+    """ drop candidates whose state is already in the transposition table, so the llm never picks them """
+    unseen = defaultdict(list)
+    for law, expressions in expr_deductions.items():
+        for expression in expressions:
+            if transposition_key(expression) not in visited:
+                unseen[law].append(expression)
+    return unseen
+
+def candidates(expr_i, visited, laws=None, rng=None):
+    """ lazy (law, tree) candidates of expr_i (symbolic.iter_rewrites) whose state hasn't been seen yet """
+    for law, new_tree in iter_rewrites(expr_i, laws, REDUCING_LAWS if priority == "reducing" else None, rng):
+        if transposition == "off" or transposition_key(new_tree) not in visited:
+            yield law, new_tree
+
+def top_deductions(expr_i, visited):
+    """ the first max_choices candidates of expr_i as law -> expressions, the rest are never computed """
+    expr_deductions = defaultdict(list)
+    for law, new_tree in itertools.islice(candidates(expr_i, visited), max_choices):
+        expr_deductions[law].append(to_source(new_tree))
+    return expr_deductions
+
+def select_candidates(expr_i, B, visited):
+    """
+    random / greedy choices of a node without deducing every candidate: random takes the first candidate
+    of a shuffled generator (random law, then random position), greedy the smallest rewrite, and only
+    the chosen trees are rendered
+
+    Output: up to B (new_expr, new_law) choices, empty if expr_i has no candidates
+    """
+    node_choices, used = [], set()
+    for _ in range(B):
+        if greedy and not unique and node_choices: # the shortest doesn't change
+            node_choices.append(node_choices[0])
+            continue
+        laws = [law for law, _ in LAWS if law not in used] if unique else None
+        if random_select:
+            choice = next(candidates(expr_i, visited, laws, rng=random), None)
+        else:
+            choice = min(candidates(expr_i, visited, laws), key=lambda candidate: candidate[1].size, default=None)
+        if choice is None: break
+        law, new_tree = choice
+        used.add(law)
+        node_choices.append((to_source(new_tree), law))
+    return node_choices
+
+def propose_level(level, B):
+    """
+    choose B children for every node on a level. The proposal calls of all nodes go to the llm together,
+    in one batch per level, or one batch per round with --unique since a chosen law is removed from the next prompt
+
+    level: list of (item, expr_deductions), expr_deductions is None for nodes without deductions
+    Output: list of (new_expr, new_law) choices per node, in the order they were made
+    """
+    choices = [[] for _ in level]
+    chosen_laws = [set() for _ in level] # laws left out of the next prompt with --unique
+    rounds, calls = (B, 1) if unique else (1, B)
+
+    for _ in range(rounds):
+        prompts = [] # (node index, llm_message, choice_dict)
+        for n, (item, expr_deductions) in enumerate(level):
+            if expr_deductions and any(law not in chosen_laws[n] for law in expr_deductions):
+                # output law and expression in a numbered list and create prompt
+                llm_message, choice_dict = create_propose_prompt(item.expr, expr_deductions, prompt_budget, compact_prompt, chosen_laws[n])
+                prompts += [(n, llm_message, choice_dict)] * calls
+        if not prompts: break
+
+        if random_select or greedy: responses = [None] * len(prompts) # selection doesn't use the llm
+        else: responses = llm_batch([llm_message for _, llm_message, _ in prompts], metered(llm, "propose"), concurrency)
+
+        for (n, llm_message, choice_dict), llm_res in zip(prompts, responses):
+            # TODO: make it with *respect to the probabilities* and have it print values
+            if random_select:
+                choice_number = random.choice(list(choice_dict)) # choice numbers can have gaps
+                new_expr, new_law = choice_dict[choice_number]
+            elif greedy:
+                choice_number, new_expr, new_law = get_greedy_choice(choice_dict)
+            else:
+                choice_number, new_expr, new_law = get_llm_choice(llm_res, choice_dict, llm_message, metered(llm, "retry"))
+
+            if unique:
+                chosen_laws[n].add(new_law)
+            choices[n].append((new_expr, new_law))
+
+    return choices
+
+def deduce(expr_i):
+    """ law -> expressions one step away from expr_i """
+    if pure_llm: return equivalent_deductions(expr_i, llm_symbolic_deduce(expr_i, verbose)) # pure llm symbolic deductions
+    if deduction_cache is not None: return deduction_cache.deduce(expr_i, verbose)
+    return symbolic_deduce(expr_i, verbose) # normal symbolic engine
+
+def deduce_level(exprs):
+    """ deductions of every node on a level, spread over the workers with the symbolic engine """
+    run["expansions"] += len(exprs)
+    if workers > 1 and not pure_llm: return deduce_many(exprs, workers, verbose)
+    return [deduce(expr_i) for expr_i in exprs]
+
+def best_first_search(q, K, T, B):
+    """
+    Best-first (A*) search: always expand the open node with the lowest f = g + h, where
+    g = proof length so far and h = heuristic cost of the expression (heuristic.py). No llm calls
+    unless --pure_llm generates the deductions.
+
+    T     = max proof length
+    B     = children kept per expansion (the B with the lowest f)
+    K * T = max number of expansions, the most nodes the level-wise search can expand
+
+    Stops at the first proof found
+    """
+    open_set = [] # heap of (f, insertion order, item)
+    order = itertools.count()
+    best_g = {} # transposition key -> shortest proof length that reached it
+
+    def state_key(item):
+        return transposition_key(item.expr) if transposition != "off" else item.expr
+
+    def push(items):
+        """ push the B lowest f items whose state wasn't already reached by a proof as short """
+        new = {}
+        for item in items:
+            key = state_key(item)
+            if best_g.get(key, float("inf")) > item.depth and (key not in new or item.depth < new[key].depth):
+                new[key] = item
+        if not new: return
+        keys, items = list(new), list(new.values())
+        f = heuristic_costs([item.expr for item in items]) + [item.depth for item in items]
+        for i in heapq.nsmallest(B, range(len(items)), key=lambda i: f[i]):
+            best_g[keys[i]] = items[i].depth
+            heapq.heappush(open_set, (f[i], next(order), items[i]))
+
+    push(q)
+    expansions = 0
+    while open_set and expansions < K * T:
+        f, _, item = heapq.heappop(open_set)
+        if best_g[state_key(item)] < item.depth: continue # reopened by a shorter path since it was pushed
+        expr_i = item.expr
+        if verbose: print(f"[EXPAND {expansions+1}/{K*T}] {f=:.2f} {expr_i=}")
+
+        if expr_i == "(1)" or is_reduced(expr_i):
+            print(f"FULLY REDUCED EXPR, PROOF DONE.\nEXPANSIONS: {expansions}")
+            run["proofs"].append(item)
+            return get_formatted_proof(item.expr_history, item.law_history)
+        if item.depth >= T:
+            continue
+
+        expansions += 1
+        run["expansions"], run["depth"] = expansions, max(run["depth"], item.depth + 1)
+        expr_deductions = deduce(expr_i)
+        if not expr_deductions:
+            can_simplify = simplify_state(item)
+            if can_simplify: push([can_simplify])
+            continue
+
+        children = []
+        for law, expressions in expr_deductions.items():
+            for new_expr in expressions:
+                child = item.child(new_expr, law)
+                children.append(simplify_state(child, verbose) or child)
+        push(children)
+
+    print(f"-------------------\nNo proof found after {expansions} expansions.")
+    return None
+
+def simplify_state(state, verbose=False):
+    """ the state after simplifying its expression, or None if it doesn't simplify """
+    simplified = simplify(expr=state.expr, item_history=("", [], []), verbose=verbose)
+    return state.extend(simplified[1], simplified[2]) if simplified else None
+
 def clean_expression(expr):
     expr = expr.strip()
     if expr[0] != "(" and expr[-1] != ")":
         expr = "(" + expr + ")"
     return expr
 
-def initialize_queue(expr, ckpt, ckpt_file, verbose):
-    """Initialize the BFS queue from checkpoint or scratch."""
-    if ckpt:
-        with open(ckpt_file, 'r') as file:
-            for line in file:
-                current_list = eval(line.strip())
-                prev_q = current_list
-            return prev_q
+def initialize_queue(expr, verbose):
+    """Initialize the BFS queue from scratch."""
+    # check and apply implication/biconditional
+    res = apply_bi_imp(expr, verbose) # returns (law, simplified_expr)
+    if res != (None, None):
+        return [ProofState(expr).child(res[1], res[0])] # BFS queue of ProofStates
     else:
-        # start new ckpt file
-        with open(ckpt_file, 'w'): 
-            pass
-        
-        # check and apply implication/biconditional
-        res = apply_bi_imp(expr, verbose) # returns (law, simplified_expr)
-        if res != (None, None):
-            return [((res[1]), [expr, res[1]], [res[0]])] # BFS queue [(expr, expr_history, law_history)]
-        else:
-            return [(expr, [expr], [])]                   # BFS queue [(expr, expr_history, law_history)]
+        return [ProofState(expr)]
+
+def key_string(key):
+    """ transposition key as it's stored in a checkpoint """
+    return key if isinstance(key, str) else to_source(key)
+
+def restore_key(key):
+    return parse(key) if transposition == "exact" else key
 
 # ---------------solver---------------
 
@@ -122,112 +439,181 @@ def proof_engine(expr, K, T, B):
     K    = size limit of level (for level-wise pruning)
 
     If you're using Chain of Thought (--cot): B=1 and K=1
+
+    The llm metrics of the search (metrics.py) are printed as json at the end and kept in run["metrics"]
     """
-    unique_proofs = [] # to store finished proofs in (expr, expr_history, law_history) format 
+    metrics.current = Metrics(model)
+    try:
+        return search_proof(expr, K, T, B)
+    finally:
+        run["metrics"] = metrics.current.summary()
+        print(f"LLM METRICS: {json.dumps(run['metrics'])}")
+
+def search_proof(expr, K, T, B):
+    """ proof_engine without the metrics """
+    unique_proofs = [] # to store finished proofs as ProofStates
+    run.clear()
+    run.update(proofs=unique_proofs, depth=0, expansions=0)
     expr = clean_expression(expr)
-    q = initialize_queue(expr, ckpt, ckpt_file, verbose) # create q from checkpoint or scratch
 
-    for t in range(T): # step limit (tree depth)
+    try:
+        kind = classify(expr)
+        print(f"TRUTH TABLE: {kind}")
+        if only_tautologies and kind != "tautology":
+            print("-------------------\nNot a tautology, no proof to search for.")
+            return None
+    except ValueError as e: # too many variables for a truth table
+        print(e)
+
+    restored = checkpoint.load() if ckpt and checkpoint else None
+    if restored: # resume after the last saved level
+        print(f"RESUMING FROM LEVEL {restored['level']} of {ckpt_file}")
+        start, q = restored["level"], restored["q"]
+        unique_proofs.extend(restored["proofs"])
+        run.update(restored["counters"])
+        visited = {restore_key(key): (depth, None) for key, depth in restored["visited"]} # transposition table
+    else:
+        start, q = 0, initialize_queue(expr, verbose) # create q from scratch
+        visited = {transposition_key(item.expr): (-1, None) for item in q} # transposition table
+        if checkpoint:
+            checkpoint.start()
+            for key in visited: checkpoint.visit(key_string(key), -1)
+    if search == "astar": return best_first_search(q, K, T, B)
+
+    for t in range(start, T): # step limit (tree depth)
         print(f"-------------------------------\n[TREE DEPTH]: {t+1}/{T}")
+        run["depth"] = t + 1
         new_q = [] # stores nodes for next level
 
-        for item in q: # go through each node on this level
-            expr_i, expr_history, law_history = item
-            
-            # generate list of deduction
-            if pure_llm: expr_deductions = llm_symbolic_deduce(expr_i, verbose) # pure llm symbolic deductions
-            else: expr_deductions = symbolic_deduce(expr_i, verbose) # normal symbolic engine
-            
-            if not expr_deductions:
-                can_simplify = simplify(expr=expr_i, item_history=item)
-
-                if can_simplify and is_reduced(can_simplify[0]):
+        level = [] # (item, expr_deductions) for each node on this level
+        if (random_select or greedy) and not pure_llm: # pull single candidates, no llm calls
+            run["expansions"] += len(q)
+            choices = [select_candidates(item.expr, B, visited) for item in q]
+            level = [(item, node_choices or None) for item, node_choices in zip(q, choices)]
+        else:
+            if max_choices and not pure_llm: # only compute the candidates the prompts show
+                run["expansions"] += len(q)
+                level = [(item, top_deductions(item.expr, visited) or None) for item in q]
+            else:
+                for item, expr_deductions in zip(q, deduce_level([item.expr for item in q])): # generate list of deduction
+                    if transposition != "off" and not pure_llm:
+                        expr_deductions = unseen_deductions(expr_deductions, visited)
+                    level.append((item, expr_deductions or None))
+
+            # generate B new thoughts per node, all llm calls of the level at once
+            choices = propose_level(level, B)
+
+        # simplify every new node and check if it's reduced, spread over the workers
+        settled = iter(settle_many([new_expr for node_choices in choices for new_expr, _ in node_choices], workers, verbose))
+
+        for (parent, expr_deductions), node_choices in zip(level, choices): # go through each node on this level
+            if expr_deductions is None:
+                can_simplify = simplify_state(parent)
+
+                if can_simplify and is_reduced(can_simplify.expr):
                     res = check_proof(can_simplify, unique_proofs, q, done=False)
                     if early_stop and res != (None, None):
                         return res
 
                 if can_simplify:
-                    new_q.append(can_simplify)
+                    add_state(can_simplify, new_q, visited, t)
                 else:
-                    res = check_proof(item, unique_proofs, q, done=False)
+                    res = check_proof(parent, unique_proofs, q, done=False)
                     if early_stop and res != (None, None):
                         return res
                 continue
 
-            # generate B new thoughts per node
-            for i in range(B):
-                llm_message, choice_dict = create_propose_prompt(expr_i, expr_deductions) # output law and expression in a numbered list and create prompt
-                llm_res = llm(message=llm_message) # send message to llm and collect its text response
-                if choice_dict:
-                    # TODO: make it with *respect to the probabilities* and have it print values
-                    if random_select:
-                        choice_number = str(random.randint(0, len(choice_dict) - 1))
-                        new_expr, new_law = choice_dict[choice_number]
-                    elif greedy:
-                        choice_number, new_expr, new_law = get_greedy_choice(choice_dict)  
-                    else:
-                        choice_number, new_expr, new_law = get_llm_choice(llm_res, choice_dict, llm_message, llm) 
-                    
-                    # update structures and add node to BFS queue
-                    if unique:
-                        del expr_deductions[new_law]
-                    expr_history_new = expr_history + [new_expr]
-                    law_history_new = law_history + [new_law]
-                    item = (new_expr, expr_history_new, law_history_new)
-
-                    # simplify if possible                    
-                    item = simplify(expr=new_expr, item_history=item, verbose=verbose) or item
-
-                    if verbose: 
-                        print(f"[NEW NODE (T={t+1},B=({i+1}/{B})]: new_expr={item[0]}, {new_law=}, {expr_history=}, {law_history=}")
-
-                    res = check_proof(item, unique_proofs, q)
+            for i, (new_expr, new_law) in enumerate(node_choices):
+                # add node to BFS queue
+                child = parent.child(new_expr, new_law)
 
-                    if early_stop and res != (None, None):
-                        return res
+                # simplify if possible
+                simplified, reduced = next(settled)
+                if simplified:
+                    child = child.extend(simplified[1], simplified[2])
+
+                if verbose: 
+                    print(f"[NEW NODE (T={t+1},B=({i+1}/{B})]: new_expr={child.expr}, {new_law=}, expr_history={parent.expr_history}, law_history={parent.law_history}")
 
-                    new_q.append(item) 
+                res = check_proof(child, unique_proofs, q, reduced=reduced)
+
+                if early_stop and res != (None, None):
+                    return res
+
+                add_state(child, new_q, visited, t)
         
         if not random_select:
             # evaluate and select top nodes
             values = evaluate_tree(new_q) # rates each node on scale of 1-10
-        q = prune_tree(values, new_q, K) # level-wise pruning
+        else:
+            values = [random.random() for _ in new_q] # random pruning
+        q = prune_tree(values, new_q, K, level_parents(new_q, q)) # level-wise pruning
         
-        # write to guide/ckpt.txt
-        print("writing q to file...")
-        with open(ckpt_file, 'a') as file:
-            file.write(f"{q}\n")
+        if checkpoint:
+            print(f"writing level to {ckpt_file}...")
+            table = [(key_string(key), depth) for key, (depth, _) in visited.items()] if (t + 1) % checkpoint.snapshot_every == 0 else None
+            checkpoint.save_level(t + 1, q, unique_proofs, table, {"depth": run["depth"], "expansions": run["expansions"]})
+
+        if metrics_log:
+            metrics.current.write_level(metrics_log, t + 1, expr=expr, frontier=len(q), expansions=run["expansions"])
+
+    if transposition != "off": print(f"TRANSPOSITION TABLE: {len(visited)} unique states")
 
     if unique_proofs: 
-        for i, (expr, expr_history, law_history) in enumerate(unique_proofs):
-            formatted_proof = get_formatted_proof(expr_history, law_history, num=i+1)
+        for i, proof in enumerate(unique_proofs):
+            formatted_proof = get_formatted_proof(proof.expr_history, proof.law_history, num=i+1)
     else: 
         print("-------------------\nNo unique proofs found.")
         formatted_proof = None
 
     return formatted_proof
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="Prompt engine CLI args")
-    parser.add_argument("--expr", type=str, default="(x and x) or (x and x)", help="The expression to evaluate")
+def add_engine_args(parser):
+    """ search and llm options shared by proof_engine.py and batch.py """
     parser.add_argument("--num_steps", type=int, default=5, help="Number of proof steps")
     parser.add_argument("--debug", action='store_true', help="Print debug statements")
     parser.add_argument("--verbose", action='store_true', help="Print out states at each step")
     parser.add_argument("--cot", action='store_true', help="Use Chain of Thought")
-    parser.add_argument("--model", type=str, default="gpt-4o-mini", help="Specify a model to use")
+    parser.add_argument("--model", type=str, default="gpt-4o-mini", help="Specify a model to use (mock, mock-random or mock-heuristic answer offline)")
     parser.add_argument("--T",  type=int, default=5, help="ToT tree depth")
     parser.add_argument("--B",  type=int, default=3, help="ToT branching factor")
     parser.add_argument("--K",  type=int, default=5, help="ToT max number of nodes per level")
     parser.add_argument("--early_stop", action='store_true', help="Return on first proof found")
     parser.add_argument("--pure_llm", action='store_true', help="Evaluate all expressions through llm instead of symbolic engine")
     parser.add_argument("--unique", action='store_true', help="Select unique steps at each node")
-    parser.add_argument("--ckpt", action='store_true', help="Resume from last q in guide/ckpt.txt")
+    parser.add_argument("--ckpt", action='store_true', help="Resume from the last level saved in guide/ckpt.jsonl")
+    parser.add_argument("--ckpt_every", type=int, default=5, help="Levels between full checkpoint snapshots")
     parser.add_argument("--random", action='store_true', help="Randomly select expression")
     parser.add_argument("--greedy", action='store_true', help="Greedy select shortest expression")
-
-    args = parser.parse_args()
-    
-    global T, B, K, early_stop, llm, pure_llm, unique, ckpt, ckpt_file, verbose, random_select, greedy
+    parser.add_argument("--max_choices", type=int, default=None, help="Only generate and show the first N candidates of a node in the proposal prompt")
+    parser.add_argument("--prompt_budget", type=int, default=None, help="Max estimated tokens of a proposal prompt, the least promising choices are dropped to fit")
+    parser.add_argument("--compact_prompt", action='store_true', help="List each law once above its choices and drop repeated expressions")
+    parser.add_argument("--priority", type=str, default="engine", choices=["engine", "reducing"], help="Candidate order: symbolic engine order or laws that shrink the expression first")
+    parser.add_argument("--prune", type=str, default="global", choices=["global", "parent", "diverse"], help="Level pruning: global top K, top children of each parent or a diverse beam")
+    parser.add_argument("--per_parent", type=int, default=None, help="Children kept per parent with --prune parent (default: K split evenly)")
+    parser.add_argument("--diversity", type=float, default=2.0, help="Penalty of near-duplicates and siblings with --prune diverse")
+    parser.add_argument("--search", type=str, default="bfs", choices=["bfs", "astar"], help="Level-wise tree of thoughts or best-first search on the heuristic")
+    parser.add_argument("--value", type=str, default="llm", choices=["llm", "heuristic", "blend"], help="How to value nodes before pruning")
+    parser.add_argument("--value_weight", type=float, default=0.5, help="Weight of the heuristic score with --value blend")
+    parser.add_argument("--only_tautologies", action='store_true', help="Skip the search when the truth table shows expr is not a tautology")
+    parser.add_argument("--cache", action='store_true', help="Cache llm responses in guide/llm_cache.sqlite")
+    parser.add_argument("--replay", action='store_true', help="Only answer from the llm cache, fail on prompts it hasn't seen")
+    parser.add_argument("--workers", type=int, default=1, help="Processes expanding each level with the symbolic engine")
+    parser.add_argument("--deduction_cache", type=int, default=50_000, help="Symbolic engine results kept in memory (LRU), 0 disables the cache")
+    parser.add_argument("--deduction_store", type=str, default=None, help="SQLite file sharing symbolic engine results between processes and runs")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max number of llm calls in flight at once")
+    parser.add_argument("--rate_limit", type=float, default=None, help="Max llm api requests per second (per model)")
+    parser.add_argument("--max_retries", type=int, default=8, help="Retries of a rate limited or failed llm api request")
+    parser.add_argument("--mock_latency", type=float, default=0.0, help="Seconds each mock model call sleeps")
+    parser.add_argument("--mock_jitter", type=float, default=0.0, help="Random +- fraction of --mock_latency per call")
+    parser.add_argument("--mock_seed", type=int, default=0, help="Seed of the mock-random model")
+    parser.add_argument("--metrics_log", type=str, default=None, help="Append the llm metrics of every level to this jsonl file")
+    parser.add_argument("--transposition", type=str, default="exact", choices=["commutative", "exact", "off"],
+                        help="Drop states already reached by another branch or level. 'exact' only drops identical expressions, 'commutative' also drops reorderings, which order-sensitive laws may need to find a proof")
+
+def configure(args):
+    """ set the engine globals from parsed args, returns the llm cache (or None) """
+    global T, B, K, early_stop, llm, pure_llm, unique, ckpt, ckpt_file, verbose, random_select, greedy, transposition, concurrency, only_tautologies, value_fn, value_weight, search, workers, checkpoint, deduction_cache, max_choices, priority, prompt_budget, compact_prompt, model, metrics_log, prune, per_parent, diversity
     T = args.T
     B = args.B
     K = args.K
@@ -235,21 +621,50 @@ if __name__ == '__main__':
     pure_llm = args.pure_llm
     unique = args.unique
     ckpt = args.ckpt
-    ckpt_file = "guide/ckpt.txt"
+    ckpt_file = getattr(args, "ckpt_file", "guide/ckpt.jsonl") # None disables checkpoints
+    checkpoint = Checkpoint(ckpt_file, snapshot_every=args.ckpt_every) if ckpt_file else None
     verbose = args.verbose 
     model = args.model
+    metrics_log = args.metrics_log
     random_select = args.random
     greedy = args.greedy
+    max_choices = args.max_choices
+    priority = args.priority
+    prompt_budget = args.prompt_budget
+    compact_prompt = args.compact_prompt
+    transposition = args.transposition
+    prune = args.prune
+    per_parent = args.per_parent
+    diversity = args.diversity
+    concurrency = args.concurrency
+    only_tautologies = args.only_tautologies
+    value_fn = args.value
+    value_weight = args.value_weight
+    search = args.search
+    workers = args.workers
+    deduction_cache = DeductionCache(args.deduction_cache, args.deduction_store) if args.deduction_cache > 0 else None
+    set_deduction_cache(deduction_cache)
 
     if args.cot: # chain of thought
         B = 1 # single thread of thought
         K = 1
     
-    llm = partial(llm_api_call, model=model) # initialize llm
+    set_client_options(rate=args.rate_limit, max_retries=args.max_retries, latency=args.mock_latency, jitter=args.mock_jitter, seed=args.mock_seed)
+    cache = LLMCache("guide/llm_cache.sqlite", replay=args.replay) if args.cache or args.replay else None
+    llm = partial(llm_api_call, model=model, cache=cache) # initialize llm
+    return cache
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prompt engine CLI args")
+    parser.add_argument("--expr", type=str, default="(x and x) or (x and x)", help="The expression to evaluate")
+    add_engine_args(parser)
+    args = parser.parse_args()
+    cache = configure(args)
+    model = args.model
 
     print(f"\nSOLVING: '{args.expr}'")
     print(f"LLM: {model}")
-    print(f"PARAMS: {T=}, {B=}, {K=}, {early_stop=}, {pure_llm=}, {unique=}, {ckpt=}")
+    print(f"PARAMS: {T=}, {B=}, {K=}, {early_stop=}, {pure_llm=}, {unique=}, {ckpt=}, {transposition=}, {concurrency=}, {value_fn=}, {search=}, {workers=}")
 
     if pure_llm: 
         print("ENGINE: pure llm **WARNING: Not using symbolic engine, proof may have hallucinations**")
@@ -260,10 +675,16 @@ if __name__ == '__main__':
     else:
         print("ENGINE: symbolic")
 
-    if args.cot: 
+    if search == "astar":
+        print("METHOD: best-first search")
+    elif args.cot: 
         print("METHOD: chain of thoughts")
     else: 
         print("METHOD: tree of thoughts")
 
     print("----------------------------")
-    proof_engine(expr=args.expr, T=T, B=B, K=K)
\ No newline at end of file
+    proof_engine(expr=args.expr, T=T, B=B, K=K)
+
+    if cache is not None:
+        print(f"LLM CACHE: {cache.stats()}")
+        cache.close()
\ No newline at end of file
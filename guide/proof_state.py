@@ -0,0 +1,79 @@
+"""
+PROOF STATES
+
+A search node is a ProofState: its expression, the state it was derived from and the law applied.
+Children share their ancestors instead of copying the expression and law histories, so a new node
+costs O(1) whatever its depth. The histories are rebuilt on demand (prompts, formatted proofs).
+
+    root = ProofState("(a or 0) and b")
+    step = root.child("(a and b)", "Simplification Law")
+    step.expr_history   # ['(a or 0) and b', '(a and b)']
+    step.law_history    # ['Simplification Law']
+
+States unpack like the (expr, expr_history, law_history) tuples used before, and two states are
+equal when their whole proofs are.
+"""
+
+class ProofState:
+    __slots__ = ("expr", "parent", "law", "depth")
+
+    def __init__(self, expr, parent=None, law=None):
+        self.expr = expr
+        self.parent = parent
+        self.law = law
+        self.depth = parent.depth + 1 if parent is not None else 0 # number of laws applied
+
+    def child(self, expr, law):
+        return ProofState(expr, self, law)
+
+    def extend(self, exprs, laws):
+        """ state after applying every (law, expr) step in turn """
+        state = self
+        for expr, law in zip(exprs, laws):
+            state = ProofState(expr, state, law)
+        return state
+
+    def path(self):
+        """ states from the root to this one """
+        states = []
+        state = self
+        while state is not None:
+            states.append(state)
+            state = state.parent
+        return states[::-1]
+
+    @property
+    def expr_history(self):
+        return [state.expr for state in self.path()]
+
+    @property
+    def law_history(self):
+        return [state.law for state in self.path()[1:]]
+
+    @classmethod
+    def from_history(cls, expr_history, law_history):
+        return cls(expr_history[0]).extend(expr_history[1:], law_history)
+
+    def __iter__(self):
+        return iter((self.expr, self.expr_history, self.law_history))
+
+    def __getitem__(self, i):
+        return tuple(self)[i]
+
+    def __len__(self):
+        return 3
+
+    def __eq__(self, other):
+        if not isinstance(other, ProofState): return NotImplemented
+        a, b = self, other
+        while a is not b:
+            if a is None or b is None or a.expr != b.expr or a.law != b.law or a.depth != b.depth:
+                return False
+            a, b = a.parent, b.parent
+        return True
+
+    def __hash__(self):
+        return hash((self.expr, self.law, self.depth))
+
+    def __repr__(self):
+        return f"ProofState({self.expr!r}, depth={self.depth})"
@@ -1,9 +1,9 @@
 """
 SYMBOLIC ENGINE
 
-parses the boolean logic which is provided as input into AST and uses pattern matching
-in python to identify which condition the current tree falls into. Once it identifies
-the condition, it manipulates the tree into the new logical condition and returns all 
+parses the boolean logic which is provided as input into an expression DAG (dag.py) and uses
+pattern matching in python to identify which condition the current tree falls into. Once it
+identifies the condition, it manipulates the tree into the new logical condition and returns all 
 unparsed trees.
 
 example expressions:
@@ -29,106 +29,81 @@ exp = "(a -> (f -> c)) -> d"
 # exp = "((b or not b and a) or not a)"
 """
 
-import ast
-import astor
-from copy import deepcopy
 from collections import defaultdict
-from utils import booleanTree, helpers
-from ast import BoolOp, Or, And, UnaryOp, Not, Name, Constant, walk, NodeTransformer, Gt, Compare
-
-class ReplaceVisitor(NodeTransformer):
-    def __init__(self, original_node, replacement_node):
-        self.original_node = original_node
-        self.replacement_node = replacement_node
-
-    def visit_UnaryOp(self, node):
-        if node == self.original_node:
-            return self.replacement_node
-        return self.generic_visit(node)
-    
-    def visit_BoolOp(self, node):
-        if node == self.original_node:
-            return self.replacement_node
-        return self.generic_visit(node)
-    
-    def visit_Compare(self, node):
-        if node == self.original_node:
-            return self.replacement_node
-        return self.generic_visit(node)
-
-    def visit_Constant(self, node):
-        if node == self.original_node:
-            return self.replacement_node
-        return self.generic_visit(node)
-    
-    def visit_Name(self, node):
-        if node == self.original_node:
-            return self.replacement_node
-        return self.generic_visit(node)
-    
+from dag import Expr, Var, Const, Not, And, Or, Imp, parse, to_source, walk, replace_site
+
+def as_expr(expr):
+    """ accept an expression string or an already parsed node """
+    return expr if isinstance(expr, Expr) else parse(expr)
+
+def simplification(node):
+    """ the simplification rule matching this node as (law, replacement), or None """
+    match node:
+        case Or([a, Const(0)]) | Or([Const(0), a]): # a or 0 = a | 0 or a = a
+            return ("Simplification Law", a)
+        case Or([a, Const(1)]) | Or([Const(1), a]): # a or 1 = 1 | 1 or a = 1
+            return ("Simplification Law", Const(1))
+        case And([a, Const(1)]) | And([Const(1), a]): # a and 1 = a |  1 and a = a
+            return ("Simplification Law", a)
+        case And([a, Const(0)]) | And([Const(0), a]): # a and 0 = 0 | 0 and a = 0
+            return ("Simplification Law", Const(0))
+        case Not(Const(0)): # not 0 = 1
+            return ("Simplification Law", Const(1))
+        case Not(Const(1)): # not 1 = 0
+            return ("Simplification Law", Const(0))
+        case Not(Not(a)): # not(not(a)) = a
+            return ("Simplification Law (Double Negation)", a)
+    return None
+
+def normalize(node):
+    """
+    Simplify a tree to its fixpoint in one traversal
+
+    Each node is rewritten until no rule applies to it, then its children are normalized (memoized, so
+    a shared or repeated subtree is only ever simplified once) and the node is checked again in case
+    a child collapsed into a constant.
+
+    Output: the (law, tree) steps, each tree being the whole subtree after that step; () when the tree
+            is already simplified (cached per node)
+    """
+    steps = node._normal
+    if steps is None:
+        steps = []
+        current = node
+        while True:
+            while (rule := simplification(current)) is not None:
+                law, current = rule
+                steps.append((law, current))
+            changed = False
+            for i, child in enumerate(current.children):
+                for law, new_child in normalize(child):
+                    current = current.with_child(i, new_child)
+                    steps.append((law, current))
+                    changed = True
+            if not changed: break
+        steps = tuple(steps)
+        object.__setattr__(node, "_normal", steps)
+    return steps
+
 def simplify(expr, item_history=None, verbose=False):
     """
     Simplify Boolean expressions 
 
+    Applies the Simplification and Double Negation laws until none match anywhere in the tree (see
+    normalize), and every rewrite is recorded as a proof step.
+
     Parameters:
     expr (str): Boolean expression to simplify.
     item_history (tuple, optional): Contains previous expressions and laws used.
     verbose (bool, optional): Print verbose debugging information.
     """
-    if expr[0] != "(" and expr[-1] != ")": expr = "(" + expr + ")"
-
     if type(expr) == str:
-        parseTree = ast.parse(expr, mode='eval')
+        if expr[0] != "(" and expr[-1] != ")": expr = "(" + expr + ")"
+        tree = parse(expr)
     else:
         raise Exception(f"Expr {expr} should be string")
-    
-    tree = parseTree
-    law_code_tuples = []
 
-    for node in walk(tree):
-        match node:
-            case BoolOp(op=Or(), values=[a, Constant(value=0)]) | BoolOp(op=Or(), values=[Constant(value=0), a]): # a or 0 = a | 0 or a = a
-                new_node = Name(id=a)
-                replaced_tree = ReplaceVisitor(node, new_node).visit(tree)
-                modified_code = astor.to_source(replaced_tree)
-                law_code_tuples.append(("Simplification Law", modified_code[:-1])) 
-
-            case BoolOp(op=Or(), values=[a, Constant(value=1)]) | BoolOp(op=Or(), values=[Constant(value=1), a]): # a or 1 = 1 | 1 or a = 1
-                new_node = Constant(value=1)
-                replaced_tree = ReplaceVisitor(node, new_node).visit(tree)
-                modified_code = astor.to_source(replaced_tree)
-                law_code_tuples.append(("Simplification Law", modified_code[:-1])) 
-
-            case BoolOp(op=And(), values=[a, Constant(value=1)]) | BoolOp(op=And(), values=[Constant(value=1), a]): # a and 1 = a |  1 and a = a
-                new_node = Name(id=a)
-                replaced_tree = ReplaceVisitor(node, new_node).visit(tree)
-                modified_code = astor.to_source(replaced_tree)
-                law_code_tuples.append(("Simplification Law", modified_code[:-1]))
-
-            case BoolOp(op=And(), values=[a, Constant(value=0)]) | BoolOp(op=And(), values=[Constant(value=0), a]): # a and 0 = 0 | 0 and a = 0
-                new_node = Constant(value=0)
-                replaced_tree = ReplaceVisitor(node, new_node).visit(tree)
-                modified_code = astor.to_source(replaced_tree)
-                law_code_tuples.append(("Simplification Law", modified_code[:-1])) 
-
-            case UnaryOp(op=Not(), operand=Constant(value=0)): # not 0 = 1
-                new_node = Constant(value=1)
-                replaced_tree = ReplaceVisitor(node, new_node).visit(tree)
-                modified_code = astor.to_source(replaced_tree)
-                law_code_tuples.append(("Simplification Law", modified_code[:-1])) 
-
-            case UnaryOp(op=Not(), operand=Constant(value=1)): # not 1 = 0
-                new_node = Constant(value=0)
-                replaced_tree = ReplaceVisitor(node, new_node).visit(tree)
-                modified_code = astor.to_source(replaced_tree)
-                law_code_tuples.append(("Simplification Law", modified_code[:-1])) 
-
-            case UnaryOp(op=Not(), operand=UnaryOp(op=Not(), operand=a)): # not(not(a)) = a
-                new_node = Name(id=a)
-                replaced_tree = ReplaceVisitor(node, new_node).visit(tree)
-                modified_code = astor.to_source(replaced_tree)
-                modified_code = astor.to_source(replaced_tree)
-                law_code_tuples.append(("Simplification Law (Double Negation)", modified_code[:-1]))
+    law_code_tuples = [(law, to_source(node)) for law, node in normalize(tree)]
 
     if verbose and law_code_tuples != []: print(f"[SIMPLIFICATION OUTPUT] {expr=}: {law_code_tuples}")
 
@@ -145,12 +120,7 @@ def simplify(expr, item_history=None, verbose=False):
         return None
     
 def apply_bi_imp(expr, verbose=False):
-    bTree = booleanTree(expr)
-    bTree.parse_tree()
-    parsed_code = bTree.parseTree
-    assert ast.dump(ast.parse(parsed_code), indent=4) == bTree.parse_tree()
-
-    simplified_expr = astor.to_source(parsed_code)[:-1]
+    simplified_expr = to_source(parse(expr))
     if simplified_expr != expr:
         if "<->" in expr:
             if verbose: print("SIMPLIFY: biconditional law applied")
@@ -158,33 +128,257 @@ def apply_bi_imp(expr, verbose=False):
     return (None, None)
 
 def is_reduced(expr):
-    """ check if expr is unreducable expression """
-    if expr[0] != "(" and expr[-1] != ")": expr = "(" + expr + ")"
+    """ check if expr (string or parsed tree) is unreducable expression """
+    if isinstance(expr, str) and expr[0] != "(" and expr[-1] != ")": expr = "(" + expr + ")"
+    tree = as_expr(expr)
 
-    bTree = booleanTree(expr)
-    bTree.parse_tree()
-    parsed_code = bTree.parseTree
+    if normalize(tree):
+        return False
 
     vartree = []
-    for node in walk(parsed_code):
+    for node, _, _ in walk(tree):
         match node:
-            case Name(id=a):
+            case Var(a):
                 vartree.append(a)
-            case Constant(value=value):
+            case Const(value):
                 vartree.append(str(value))
 
-    can_simplify = simplify(expr=expr, item_history=("", [], []))
     has_unique_vars = sorted(list(set(vartree))) == sorted(vartree)
-
-    if can_simplify:
-        return False
     
     # TODO: is this the right check?
-    if (len(vartree) == 1) or (not can_simplify and has_unique_vars and '0' not in vartree and '1' not in vartree):
+    if (len(vartree) == 1) or (has_unique_vars and '0' not in vartree and '1' not in vartree):
+        if isinstance(expr, Expr): expr = to_source(expr)
+        if expr[0] != "(" and expr[-1] != ")": expr = "(" + expr + ")"
         print(f"{expr=} cannot be reduced further...")
         return True
     return False
 
+# ----------RULE TABLE-----------
+# Each rule takes a node and returns its replacement node, or None when the law doesn't match.
+# Nodes are interned, so `a is b` is a full subtree equality check.
+
+def associative_or(node): # (a or b) or c = a or (b or c)
+    match node:
+        case Or([Or([a, b]), c]):
+            return Or(a, Or(b, c))
+
+def associative_and(node): # (a and b) and c = a and (b and c)
+    match node:
+        case And([And([a, b]), c]):
+            return And(a, And(b, c))
+
+def distributive_and(node): # a and (b or c) = (a and b) or (a and c)
+    match node:
+        case And([a, Or([b, c])]):
+            return Or(And(a, b), And(a, c))
+
+def distributive_or(node): # a or (b and c) = (a or b) and (a or c)
+    match node:
+        case Or([a, And([b, c])]):
+            return And(Or(a, b), Or(a, c))
+
+def distributive_rhs_and(node): # (a and b) or (a and c) = a and (b or c)
+    match node:
+        case Or([And([a, b]), And([a2, c])]) if a is a2:
+            return And(a, Or(b, c))
+
+def distributive_rhs_or(node): # (a or b) and (a or c) = a or (b and c)
+    match node:
+        case And([Or([a, b]), Or([a2, c])]) if a is a2:
+            return Or(a, And(b, c))
+
+def identity(node): # a or 0 = a | a and 1 = a
+    match node:
+        case Or([a, Const(0)]) | And([a, Const(1)]):
+            return a
+
+def negation_and(node): # not(a) and a = 0 | a and not(a) = 0
+    match node:
+        case And([Not(a), b]) | And([b, Not(a)]):
+            if a is b:
+                return Const(0)
+
+def negation_or(node): # not a or a = 1 | a or not a = 1
+    match node:
+        case Or([Not(b), a]) | Or([a, Not(b)]):
+            if a is b:
+                return Const(1)
+
+def idempotent_or(node): # a or a = a
+    match node:
+        case Or([first, second, *rest]) if first is second:
+            return Or(first, *rest) if rest else first
+
+def idempotent_and(node): # a and a = a
+    match node:
+        case And([first, second, *rest]) if first is second:
+            return And(first, *rest) if rest else first
+
+def absorption_or(node): # a or (a and b) = a
+    match node:
+        case Or([a, And([*objects])]) | Or([And([*objects]), a]):
+            if a is objects[0]:
+                return a
+
+def absorption_and(node): # a and (a or b) = a
+    match node:
+        case And([a, Or([*objects])]) | And([Or([*objects]), a]):
+            if a is objects[0]:
+                return a
+
+def demorgan_or(node): # not (a or b) = not a and not b
+    match node:
+        case Not(Or([a, b])):
+            return And(Not(a), Not(b))
+
+def demorgan_and(node): # not (a and b) = not a or not b
+    match node:
+        case Not(And([a, b])):
+            return Or(Not(a), Not(b))
+
+def demorgan_rhs_or(node): # not a and not b = not (a or b)
+    match node:
+        case And([Not(a), Not(b)]):
+            return Not(Or(a, b))
+
+def demorgan_rhs_and(node): # not a or not b = not (a and b)
+    match node:
+        case Or([Not(a), Not(b)]):
+            return Not(And(a, b))
+
+def implication(node): # a > b = not a or b
+    match node:
+        case Imp([a, b]):
+            return Or(Not(a), b)
+
+def implication_rhs(node): # not a or b = a > b
+    match node:
+        case Or([Not(a), b]):
+            return Imp(a, b)
+
+def commutative_or(node): # a or b = b or a
+    match node:
+        case Or([a, b]):
+            return Or(b, a)
+
+def commutative_and(node): # a and b = b and a
+    match node:
+        case And([a, b]):
+            return And(b, a)
+
+# (law, rule) pairs in the order their deductions are reported
+DEDUCTION_LAWS = [
+    ("Associative Law OR", associative_or),
+    ("Associative Law AND", associative_and),
+    ("Distributive Law AND", distributive_and),
+    ("Distributive Law OR", distributive_or),
+    ("Distributive Law RHS AND", distributive_rhs_and),
+    ("Distributive Law RHS OR", distributive_rhs_or),
+    ("Identity Law", identity),
+    ("Negation Law AND", negation_and),
+    ("Negation Law OR", negation_or),
+    ("Idempotent Law OR", idempotent_or),
+    ("Idempotent Law AND", idempotent_and),
+    ("Absorption Law 1", absorption_or),
+    ("Absorption Law 2", absorption_and),
+    ("DeMorgan Law 1", demorgan_or),
+    ("DeMorgan Law 2", demorgan_and),
+    ("DeMorgan Law RHS 1", demorgan_rhs_or),
+    ("DeMorgan Law RHS 2", demorgan_rhs_and),
+    ("Implication Law", implication),
+    ("Implication Law RHS", implication_rhs),
+]
+
+# only applied when the expression can still be reduced
+COMMUTATIVE_LAWS = [
+    ("Commutative Law OR", commutative_or),
+    ("Commutative Law AND", commutative_and),
+]
+
+LAWS = DEDUCTION_LAWS + COMMUTATIVE_LAWS
+
+# ----------RULE ENGINE-----------
+
+def local_rewrites(node):
+    """
+    Every (law, replacement) that applies at this node, in LAWS order
+
+    Only depends on the node itself, so it's computed once per interned node and cached on it.
+    """
+    rewrites = node._rewrites
+    if rewrites is None:
+        rewrites = ()
+        if node.children:
+            rewrites = tuple((law, new_node) for law, rule in LAWS if (new_node := rule(node)) is not None)
+        object.__setattr__(node, "_rewrites", rewrites)
+    return rewrites
+
+def match_laws(tree):
+    """
+    Walk the tree once (breadth first, same order as ast.walk) and apply every law at each position
+
+    Output: law -> rewritten trees, each with exactly one law applied at one position
+    """
+    matches = defaultdict(list)
+    sites = walk(tree)
+    for i, (node, _, _) in enumerate(sites):
+        for law, new_node in local_rewrites(node):
+            matches[law].append(replace_site(sites, i, new_node))
+    return matches
+
+# laws whose rewrite never grows the expression, tried first with priority=REDUCING_LAWS
+REDUCING_LAWS = [
+    "Identity Law", "Negation Law AND", "Negation Law OR", "Idempotent Law OR", "Idempotent Law AND",
+    "Absorption Law 1", "Absorption Law 2", "Distributive Law RHS AND", "Distributive Law RHS OR",
+    "DeMorgan Law RHS 1", "DeMorgan Law RHS 2",
+]
+
+def ordered_laws(laws=None, priority=None):
+    """ (law, rule) pairs to try: only `laws` if given, the `priority` laws first, then LAWS order """
+    allowed = [(law, rule) for law, rule in LAWS if laws is None or law in laws]
+    rank = {law: i for i, law in enumerate(priority or [])}
+    return sorted(allowed, key=lambda pair: rank.get(pair[0], len(rank))) # stable, so ties keep LAWS order
+
+def iter_rewrites(expr, laws=None, priority=None, rng=None):
+    """
+    Lazily yield (law, rewritten tree) candidates of symbolic_deduce, law by law
+
+    A rule is only tried on the tree when the caller asks for more candidates, so stopping early
+    never computes the remaining laws. Commutative laws are skipped when the expression can't be
+    reduced, as in symbolic_deduce.
+
+    laws:     only try these laws (default: all)
+    priority: laws tried first, in this order, the rest follow in LAWS order
+    rng:      random.Random shuffling the laws and sites instead
+    """
+    tree = as_expr(expr)
+    sites = walk(tree)
+    order = ordered_laws(laws, priority)
+    positions = [i for i, (node, _, _) in enumerate(sites) if node.children]
+    if rng is not None:
+        rng.shuffle(order)
+        rng.shuffle(positions)
+
+    commutative = dict(COMMUTATIVE_LAWS)
+    reducible = None
+    for law, rule in order:
+        if law in commutative:
+            if reducible is None: reducible = not is_reduced(tree)
+            if not reducible: continue
+        for i in positions:
+            if (new_node := rule(sites[i][0])) is not None:
+                yield law, replace_site(sites, i, new_node)
+
+def iter_deductions(expr, laws=None, priority=None, rng=None):
+    """
+    Lazily yield (law, expression) candidates, see iter_rewrites
+
+    Unfiltered and in the default order, these are symbolic_deduce's deductions in the same order:
+        for law, expression in iter_deductions("(a and b) or (a and b)"): ...
+    """
+    for law, new_tree in iter_rewrites(expr, laws, priority, rng):
+        yield law, to_source(new_tree)
+
 def symbolic_deduce(expr, verbose=False):
     """
     Creates logical expressions for each logical law 
@@ -196,265 +390,37 @@ def symbolic_deduce(expr, verbose=False):
     ...
     input  : (a and b) or (a and b)
     detail :
-    - Commutative Law: (a and b) or (a and b) = (a and b or a and b)
-    - Commutative Law: (a and b) or (a and b) = (b and a or a and b)
-    - Commutative Law: (a and b) or (a and b) = (b and a or b and a)
-    - Distributive Law 2: (a and b) or (a and b) = ((b and a or b) and (b and a or a))
-    output : defaultdict(<class 'list'>, {'Commutative Law': ['(a and b or a and b)', '(b and a or a and b)', '(b and a or b and a)'], 'Distributive Law': ['((b and a or b) and (b and a or a))']})
+    - Distributive Law OR: (a and b) or (a and b) = ((a and b or a) and (a and b or b))
+    - Distributive Law RHS AND: (a and b) or (a and b) = (a and (b or b))
+    - Idempotent Law OR: (a and b) or (a and b) = (a and b)
+    - Commutative Law OR: (a and b) or (a and b) = (a and b or a and b)
+    - Commutative Law AND: (a and b) or (a and b) = (b and a or a and b)
+    - Commutative Law AND: (a and b) or (a and b) = (a and b or b and a)
+    output : defaultdict(<class 'list'>, {'Distributive Law OR': ['((a and b or a) and (a and b or b))'], 'Distributive Law RHS AND': ['(a and (b or b))'], 'Idempotent Law OR': ['(a and b)'], 'Commutative Law OR': ['(a and b or a and b)'], 'Commutative Law AND': ['(b and a or a and b)', '(a and b or b and a)']})
     """
-    if expr[0] != "(" and expr[-1] != ")": expr = "(" + expr + ")"
-
-    # ----------CREATE AST-----------
-    bTree = booleanTree(expr)
-    t_util = helpers()
-    bTree.parse_tree()
-    parsed_code = bTree.parseTree
-    parsed_code_deepcopy = deepcopy(bTree.parseTree)
-    assert ast.dump(ast.parse(parsed_code), indent=4) == bTree.parse_tree()
-
-    new_expressions = defaultdict(list)
+    if isinstance(expr, str) and expr[0] != "(" and expr[-1] != ")": expr = "(" + expr + ")"
+    tree = as_expr(expr)
 
     if verbose: print("[SYMBOLIC ENGINE input] :", expr)
     if verbose: print("[SYMBOLIC ENGINE detail]:")
 
-    # Associative Law
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=Or(), values=[BoolOp(op=Or(), values=[a, b]), c]):
-                new_node = BoolOp(op=Or(), values=[a, BoolOp(op=Or(), values=[b, c])])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["Associative Law OR"].append(modified_code[:-1]) 
-                if verbose: print(f" - Associative Law: {expr} = {modified_code[:-1]}")
-
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=And(), values=[BoolOp(op=And(), values=[a, b]), c]):
-                new_node = BoolOp(op=And(), values=[a, BoolOp(op=And(), values=[b, c])])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["Associative Law AND"].append(modified_code[:-1])
-                if verbose: print(f" - Associative Law 2: {expr} = {modified_code[:-1]}")
-
-    # Distributive Law
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=And(), values=[a, BoolOp(op=Or(), values=[b, c])]):
-                new_node = BoolOp(op=Or(), values=[BoolOp(op=And(), values=[a, b]), BoolOp(op=And(), values=[a, c])])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["Distributive Law AND"].append(modified_code[:-1])
-                if verbose: print(f" - Distributive Law AND: {expr} = {modified_code[:-1]}")
-
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=Or(), values=[a, BoolOp(op=And(), values=[b, c])]):
-                new_node = BoolOp(op=And(), values=[BoolOp(op=Or(), values=[a, b]), BoolOp(op=Or(), values=[a, c])])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["Distributive Law OR"].append(modified_code[:-1])
-                if verbose: print(f" - Distributive Law OR: {expr} = {modified_code[:-1]}")
-
-    # Distributive Law RHS
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=Or(), values=[BoolOp(op=And(), values=[a, b]), BoolOp(op=And(), values=[a2, c])]):
-                new_node = BoolOp(op=And(), values=[a, BoolOp(op=Or(), values=[b, c])])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["Distributive Law RHS AND"].append(modified_code[:-1])
-                if verbose: print(f" - Distributive Law AND: {expr} = {modified_code[:-1]}")
-
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=And(), values=[BoolOp(op=Or(), values=[a, b]), BoolOp(op=Or(), values=[a2, c])]):
-                new_node = BoolOp(op=Or(), values=[a, BoolOp(op=And(), values=[b, c])])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["Distributive Law RHS OR"].append(modified_code[:-1])
-                if verbose: print(f" - Distributive Law OR: {expr} = {modified_code[:-1]}")
-
-    # Identity Law
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code):
-        match node:
-            case BoolOp(op=Or(), values=[a, Constant(value=0)]) | BoolOp(op=And(), values=[a, Constant(value=1)]):
-                new_node = Name(id=a)
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["Identity Law"].append(modified_code[:-1]) 
-                if verbose: print(f" - Identity Law: {expr} = {modified_code[:-1]}")
-    
-    # Negation Law: not(a) and a = 0 | a and not(a) = 0
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code):
-        match node:
-            case BoolOp(op=And(), values=[UnaryOp(op=Not(), operand=a), b]) | BoolOp(op=And(), values=[b, UnaryOp(op=Not(), operand=a)]):
-                if t_util.are_subtrees_equivalent(a, b):
-                    new_node = Constant(value=0)
-                    replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                    modified_code = astor.to_source(replaced_tree)
-                    new_expressions["Negation Law AND"].append(modified_code[:-1]) 
-                    if verbose: print(f" - Negation Law AND: {expr} = {modified_code[:-1]}")
-    
-    # Negation Law: not a or a = 1 | a or not a = 1
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code):
-        match node:
-            case BoolOp(op=Or(), values=[UnaryOp(op=Not(), operand=b), a]) | BoolOp(op=Or(), values=[a, UnaryOp(op=Not(), operand=b)]):
-                if t_util.are_subtrees_equivalent(a, b):
-                    new_node = Constant(value=1)
-                    replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                    modified_code = astor.to_source(replaced_tree)
-                    new_expressions["Negation Law OR"].append(modified_code[:-1]) 
-                    if verbose: print(f" - Negation Law OR: {expr} = {modified_code[:-1]}")
-
-    # Idempotent Law
-    parsed_code = deepcopy(parsed_code_deepcopy)  
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=Or(), values=[*objects]):
-                if t_util.are_subtrees_equivalent(objects[0], objects[1]):
-                    new_node = objects[0]
-                    replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                    modified_code = astor.to_source(replaced_tree)
-                    new_expressions["Idempotent Law OR"].append(modified_code[:-1])
-                    if verbose: print(f" - Idempotent Law OR: {expr} = {modified_code[:-1]}")
-
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=And(), values=[*objects]):
-                if t_util.are_subtrees_equivalent(objects[0], objects[1]):
-                    new_node = objects[0]
-                    replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                    modified_code = astor.to_source(replaced_tree)
-                    new_expressions["Idempotent Law AND"].append(modified_code[:-1])
-                    if verbose: print(f" - Idempotent Law AND: {expr} = {modified_code[:-1]}")
-
-    # Absorption Law
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code):
-        match node:
-            case BoolOp(op=Or(), values=[a, BoolOp(op=And(), values=[*objects])]) | BoolOp(op=Or(), values=[BoolOp(op=And(), values=[*objects]), a]):
-                if t_util.are_subtrees_equivalent(a, objects[0]): 
-                    new_node = Name(id=a)
-                    replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                    modified_code = astor.to_source(replaced_tree) 
-                    new_expressions["Absorption Law 1"].append(modified_code[:-1])
-                    if verbose: print(f" - Absorption Law 1: {expr} = {modified_code[:-1]}")
-
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=And(), values=[a, BoolOp(op=Or(), values=[*objects])]) | BoolOp(op=And(), values=[BoolOp(op=Or(), values=[*objects]), a]):
-                if t_util.are_subtrees_equivalent(a, objects[0]): 
-                    new_node = Name(id=a)
-                    replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                    modified_code = astor.to_source(replaced_tree)
-                    new_expressions["Absorption Law 2"].append(modified_code[:-1])
-                    if verbose: print(f" - Absorption Law 2: {expr} = {modified_code[:-1]}")
-
-    # DeMorgan's Law
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code):
-        match node:
-            case UnaryOp(op=Not(), operand=BoolOp(op=Or(), values=[a, b])):
-                new_node = BoolOp(op=And(), values=[UnaryOp(op=Not(), operand=a), UnaryOp(op=Not(), operand=b)])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["DeMorgan Law 1"].append(modified_code[:-1])
-                if verbose: print(f" - DeMorgan's Law 1: {expr} = {modified_code[:-1]}")
-
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case UnaryOp(op=Not(), operand=BoolOp(op=And(), values=[a, b])):
-                new_node = BoolOp(op=Or(), values=[UnaryOp(op=Not(), operand=a), UnaryOp(op=Not(), operand=b)])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["DeMorgan Law 2"].append(modified_code[:-1])
-                if verbose: print(f" - DeMorgan's Law 2: {expr} = {modified_code[:-1]}")
-
-    # DeMorgan's Law RHS
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code):
-        match node:
-            case BoolOp(op=And(), values=[UnaryOp(op=Not(), operand=a), UnaryOp(op=Not(), operand=b)]):
-                new_node = UnaryOp(op=Not(), operand=BoolOp(op=Or(), values=[a, b]))
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["DeMorgan Law RHS 1"].append(modified_code[:-1])
-                if verbose: print(f" - DeMorgan's Law RHS 1: {expr} = {modified_code[:-1]}")
-
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=Or(), values=[UnaryOp(op=Not(), operand=a), UnaryOp(op=Not(), operand=b)]):
-                new_node = UnaryOp(op=Not(), operand=BoolOp(op=And(), values=[a, b]))
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["DeMorgan Law RHS 2"].append(modified_code[:-1])
-                if verbose: print(f" - DeMorgan's Law RHS 2: {expr} = {modified_code[:-1]}")
-
-    # Implication Law
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case Compare(left=a, ops=[Gt()], comparators=[b]):
-                new_node = BoolOp(op=Or(), values=[UnaryOp(op=Not(), operand=a), b])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["Implication Law"].append(modified_code[:-1])
-                if verbose: print(f" - Implication Law: {expr} = {modified_code[:-1]}")
-
-    # Implication Law RHS
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=Or(), values=[UnaryOp(op=Not(), operand=a), b]):
-                new_node = Compare(left=a, ops=[Gt()], comparators=[b])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["Implication Law RHS"].append(modified_code[:-1])
-                if verbose: print(f" - Implication Law RHS: {expr} = {modified_code[:-1]}")
+    # ----------APPLIES EVERY LAW IN ONE WALK-----------
+    matches = match_laws(tree)
+    new_expressions = defaultdict(list)
+    for law, _ in DEDUCTION_LAWS:
+        new_expressions[law].extend(map(to_source, matches.get(law, [])))
 
     # check if expr is unreducable expression
-    can_simplify = simplify(expr=expr, item_history=("", [], []))
-
-    if is_reduced(expr) and not can_simplify:
-        return new_expressions
-
-    # ----------APPLIES LAWS ONTO AST ONE AT A TIME-----------
-
-    # Commutative Law
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code):
-        match node:
-            case BoolOp(op=Or(), values=[a, b]):
-                new_node = BoolOp(op=Or(), values=[b, a])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code) # replace node with new_node
-                modified_code = astor.to_source(replaced_tree)                    # re-evalaluate
-                new_expressions["Commutative Law OR"].append(modified_code[:-1])  # -1 to get rid of new line
-                if verbose: print(f" - Applying Commutative Law OR: {expr} = {modified_code[:-1]}") 
-            
-    parsed_code = deepcopy(parsed_code_deepcopy)
-    for node in walk(parsed_code): 
-        match node:
-            case BoolOp(op=And(), values=[a, b]):
-                new_node = BoolOp(op=And(), values=[b, a])
-                replaced_tree = ReplaceVisitor(node, new_node).visit(parsed_code)
-                modified_code = astor.to_source(replaced_tree)
-                new_expressions["Commutative Law AND"].append(modified_code[:-1])
-                if verbose: print(f" - Applying Commutative Law AND: {expr} = {modified_code[:-1]}")
-
-    if verbose: print("[SYMBOLIC ENGINE OUTPUT]:", new_expressions)
+    if not is_reduced(tree):
+        for law, _ in COMMUTATIVE_LAWS:
+            new_expressions[law].extend(map(to_source, matches.get(law, [])))
+
+    new_expressions = defaultdict(list, {law: expressions for law, expressions in new_expressions.items() if expressions})
+    if verbose:
+        for law, expressions in new_expressions.items():
+            for expression in expressions:
+                print(f" - {law}: {expr} = {expression}")
+        print("[SYMBOLIC ENGINE OUTPUT]:", new_expressions)
     return new_expressions
 
 if __name__ == '__main__':
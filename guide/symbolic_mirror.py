@@ -1,15 +1,244 @@
+"""
+SYMBOLIC MIRROR
+
+Grows an expression into a longer equivalent one by applying the laws backwards. Starting from 1
+every output is a tautology, and its expansion trace read backwards is a proof of it.
+
+python3 guide/symbolic_mirror.py --corpus 10000 --out corpus.jsonl --seed 0 --steps 5 15 --variables 3
+"""
+
+import sys
+import json
+import time
 import random
-import ast
-import astor
-from copy import deepcopy
-from utils import booleanTree, helpers
-from ast import BoolOp, Or, And, UnaryOp, Not, Name, Constant, walk, Gt, Compare
-from symbolic import ReplaceVisitor
+from functools import lru_cache
+from dag import Var, Const, Not, And, Or, Imp, parse, to_source, canonical, variables, node_at, replace_path, walk, replace_site
+from symbolic import LAWS, simplification
 
 def print_mirror(transformations):
     for expr, law in transformations:
         print(f"{expr:35} {law}")
 
+# ----------MIRROR LAWS-----------
+# Inverse rewrites that grow an expression while keeping it equivalent. Each rule takes a node and
+# returns its replacement, or None when the law doesn't match. Rules that introduce a variable take
+# it as `fresh` (any expression works, the corpus generator picks one of its variables).
+
+def associative_or(node): # a or (b or c) = (a or b) or c
+    match node:
+        case Or([a, Or([b, c])]):
+            return Or(Or(a, b), c)
+
+def associative_and(node): # a and (b and c) = (a and b) and c
+    match node:
+        case And([a, And([b, c])]):
+            return And(And(a, b), c)
+
+def distributive_and(node): # (a and b) or (a and c) = a and (b or c)
+    match node:
+        case Or([And([a, b]), And([x, c])]) if a is x:
+            return And(a, Or(b, c))
+
+def distributive_or(node): # (a or b) and (a or c) = a or (b and c)
+    match node:
+        case And([Or([a1, b]), Or([a2, c])]) if a1 is a2:
+            return Or(a1, And(b, c))
+
+def identity_1(node, fresh=Var('a')): # 1 = a or 1
+    match node:
+        case Const(1):
+            return Or(fresh, Const(1))
+
+def identity_2(node): # a = a and 1
+    match node:
+        case Var(a):
+            return And(Var(a), Const(1))
+
+def identity_3(node): # a = a or 0
+    match node:
+        case Var(a):
+            return Or(Var(a), Const(0))
+
+def negation_or(node, fresh=Var('a')): # 1 = a or not a
+    match node:
+        case Const(1):
+            return Or(Not(fresh), fresh)
+
+def idempotent_or(node): # a = a or a
+    match node:
+        case Var(a):
+            return Or(Var(a), Var(a))
+
+def idempotent_and(node): # a = a and a
+    match node:
+        case Var(a):
+            return And(Var(a), Var(a))
+
+def absorption_or(node, fresh=Var('b')): # a = a or (a and b)
+    match node:
+        case Var(a):
+            return Or(Var(a), And(Var(a), fresh))
+
+def absorption_and(node, fresh=Var('b')): # a = a and (a or b)
+    match node:
+        case Var(a):
+            return And(Var(a), Or(Var(a), fresh))
+
+def demorgan_1(node): # not a and not b = not (a or b)
+    match node:
+        case And([Not(a), Not(b)]):
+            return Not(Or(a, b))
+
+def demorgan_2(node): # not (a or b) = not a and not b
+    match node:
+        case Not(Or([a, b])):
+            return And(Not(a), Not(b))
+
+def demorgan_3(node): # not a or not b = not (a and b)
+    match node:
+        case Or([Not(a), Not(b)]):
+            return Not(And(a, b))
+
+def demorgan_4(node): # not (a and b) = not a or not b
+    match node:
+        case Not(And([a, b])):
+            return Or(Not(a), Not(b))
+
+def implication_1(node): # not a or b = a -> b
+    match node:
+        case Or([Not(a), b]):
+            return Imp(a, b)
+
+def implication_2(node): # a -> b = not a or b
+    match node:
+        case Imp([a, b]):
+            return Or(Not(a), b)
+
+def commutative_or(node): # a or b = b or a
+    match node:
+        case Or([a, b]):
+            return Or(b, a)
+
+def commutative_and(node): # a and b = b and a
+    match node:
+        case And([a, b]):
+            return And(b, a)
+
+MIRROR_LAWS = {
+    "Associative Law OR": associative_or,
+    "Associative Law AND": associative_and,
+    "Distributive Law AND": distributive_and,
+    "Distributive Law OR": distributive_or,
+    "Identity Law 1": identity_1,
+    "Identity Law 2": identity_2,
+    "Identity Law 3": identity_3,
+    "Negation Law OR": negation_or,
+    "Idempotent Law OR": idempotent_or,
+    "Idempotent Law AND": idempotent_and,
+    "Absorption Law OR": absorption_or,
+    "Absorption Law AND": absorption_and,
+    "DeMorgan Law 1": demorgan_1,
+    "DeMorgan Law 2": demorgan_2,
+    "DeMorgan Law 3": demorgan_3,
+    "DeMorgan Law 4": demorgan_4,
+    "Implication Law 1": implication_1,
+    "Implication Law 2": implication_2,
+    "Commutative Law OR": commutative_or,
+    "Commutative Law AND": commutative_and,
+}
+
+FRESH_LAWS = {"Identity Law 1", "Negation Law OR", "Absorption Law OR", "Absorption Law AND"}
+VARIABLES = "abcdefghijklmnopqrstuvwxyz"
+
+# ----------SITE INDEX-----------
+# Where every mirror law applies, kept up to date as the tree is rewritten so picking a law never
+# has to walk the tree or retry laws that match nowhere. A rewrite at `path` only changes the
+# rewritten subtree and the nodes on the path above it, so only those sites are re-indexed.
+
+# node type -> the laws whose pattern has it at the root, so the others are never tried
+LAWS_BY_TYPE = {
+    Or: ("Associative Law OR", "Distributive Law AND", "DeMorgan Law 3", "Implication Law 1", "Commutative Law OR"),
+    And: ("Associative Law AND", "Distributive Law OR", "DeMorgan Law 1", "Commutative Law AND"),
+    Not: ("DeMorgan Law 2", "DeMorgan Law 4"),
+    Imp: ("Implication Law 2",),
+    Var: ("Identity Law 2", "Identity Law 3", "Idempotent Law OR", "Idempotent Law AND", "Absorption Law OR", "Absorption Law AND"),
+    Const: ("Identity Law 1", "Negation Law OR"),
+}
+
+@lru_cache(maxsize=1 << 16)
+def mirror_laws(node):
+    """ names of the mirror laws that change this node (depends only on the interned node, so cached) """
+    return tuple(law for law in LAWS_BY_TYPE[type(node)] if (new_node := MIRROR_LAWS[law](node)) is not None and new_node is not node)
+
+class SiteIndex:
+    """ law -> paths (tuples of child indices) of the nodes of `tree` it applies to """
+    def __init__(self, tree):
+        self.tree = tree
+        self.sites = {}     # law -> list of paths, only laws with at least one site
+        self.positions = {} # (law, path) -> index in sites[law]
+        self.add_subtree(tree, ())
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, law, path):
+        paths = self.sites.setdefault(law, [])
+        self.positions[law, path] = len(paths)
+        paths.append(path)
+
+    def discard(self, law, path):
+        """ O(1): the last path of the law takes the removed one's place """
+        i = self.positions.pop((law, path), None)
+        if i is None: return
+        paths = self.sites[law]
+        last = paths.pop()
+        if i < len(paths):
+            paths[i] = last
+            self.positions[law, last] = i
+        if not paths: del self.sites[law]
+
+    def add_subtree(self, node, path):
+        stack = [(node, path)]
+        while stack:
+            node, path = stack.pop()
+            for law in mirror_laws(node): self.add(law, path)
+            stack.extend((child, path + (i,)) for i, child in enumerate(node.children))
+
+    def remove_subtree(self, node, path):
+        stack = [(node, path)]
+        while stack:
+            node, path = stack.pop()
+            for law in mirror_laws(node): self.discard(law, path)
+            stack.extend((child, path + (i,)) for i, child in enumerate(node.children))
+
+    def ancestors(self, path):
+        """ (node, path) of every node above `path`, root first """
+        node, nodes = self.tree, []
+        for depth, i in enumerate(path):
+            nodes.append((node, path[:depth]))
+            node = node.children[i]
+        return nodes
+
+    def rewrite(self, path, new_node):
+        """ replace the node at `path` and re-index the sites that changed """
+        for node, above in self.ancestors(path):
+            for law in mirror_laws(node): self.discard(law, above)
+        self.remove_subtree(node_at(self.tree, path), path)
+        self.tree = replace_path(self.tree, path, new_node)
+        self.add_subtree(new_node, path)
+        for node, above in self.ancestors(path):
+            for law in mirror_laws(node): self.add(law, above)
+
+    def sample(self, rng, weights=None):
+        """
+        random (law, path), or None if no law applies: the law is uniform among the laws that apply
+        (or weighted by weights[law], default 1), then the path is uniform among its sites
+        """
+        if not self.sites: return None
+        laws = list(self.sites)
+        law = rng.choices(laws, [weights.get(law, 1) for law in laws])[0] if weights else rng.choice(laws)
+        return law, rng.choice(self.sites[law])
+
 def symbolic_mirror(expr, iterations=5, verbose=False):
     """
     Generates a logical expression into a longer tautological expression
@@ -25,275 +254,133 @@ def symbolic_mirror(expr, iterations=5, verbose=False):
 
     if expr[0] != "(" and expr[-1] != ")": expr = "(" + expr + ")"
 
-    # ----------CREATE AST-----------
-    bTree = booleanTree(expr)
-    t_util = helpers()
-    bTree.parse_tree()
-    parsed_code = bTree.parseTree
-    parsed_code_deepcopy = deepcopy(bTree.parseTree)
-    assert ast.dump(ast.parse(parsed_code), indent=4) == bTree.parse_tree()
-
-    laws = [
-        "Associative Law OR",
-        "Associative Law AND",
-        "Distributive Law AND",
-        "Distributive Law OR",
-        "Identity Law 1",
-        "Identity Law 2",
-        "Identity Law 3",
-        "Negation Law OR",
-        "Idempotent Law OR",
-        "Idempotent Law AND",
-        "Absorption Law OR",
-        "Absorption Law AND",
-        "DeMorgan Law 1",
-        "DeMorgan Law 2",
-        "DeMorgan Law 3",
-        "DeMorgan Law 4",
-        "Implication Law 1",
-        "Implication Law 2",
-        "Commutative Law OR",
-        "Commutative Law AND"
-    ]
-
-    parsed_code = deepcopy(parsed_code_deepcopy)
-
-    i = 0
+    # ----------CREATE DAG-----------
+    index = SiteIndex(parse(expr))
+
     transformations = []
     print(expr)
-    while i < iterations:
-        law = random.choice(laws)
-        parsed_code = deepcopy(parsed_code)
-
-        if law == "Associative Law OR": # (a or b) or c = a or (b or c)
-            for node in walk(parsed_code):
-                match node:
-                    case BoolOp(op=Or(), values=[a, BoolOp(op=Or(), values=[b, c])]):
-                        new_node = BoolOp(op=Or(), values=[BoolOp(op=Or(), values=[a, b]), c])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Associative Law AND": # (a and b) and c = a and (b and c)
-            for node in walk(parsed_code): 
-                match node:
-                    case BoolOp(op=And(), values=[a, BoolOp(op=And(), values=[b, c])]):
-                        new_node = BoolOp(op=And(), values=[BoolOp(op=And(), values=[a, b]), c])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Distributive Law AND": # (a and b) or (a and c) = a and (b or c)
-            for node in walk(parsed_code): 
-                match node:
-                    case BoolOp(op=Or(), values=[BoolOp(op=And(), values=[a, b]), BoolOp(op=And(), values=[x, c])]):
-                        new_node = BoolOp(op=And(), values=[a, BoolOp(op=Or(), values=[b, c])])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Distributive Law OR": # (a or b) and (a or c) = a or (b and c)
-            for node in walk(parsed_code): 
-                match node:
-                    case BoolOp(op=And(), values=[BoolOp(op=Or(), values=[a1, b]), BoolOp(op=Or(), values=[a2, c])]):
-                        new_node = BoolOp(op=Or(), values=[a1, BoolOp(op=And(), values=[b, c])])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Identity Law 1": # a or 1 = 1
-            for node in walk(parsed_code):
-                match node:
-                    case Constant(value=1):
-                        new_node = BoolOp(op=Or(), values=[Name(id='a'), Constant(value=1)])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Identity Law 2": # a = a and 1
-            for node in walk(parsed_code):
-                match node:
-                    case Name(id=a):  # Changed 'a' to 'id'
-                        new_node = BoolOp(op=And(), values=[Name(id=a), Constant(value=1)])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Identity Law 3": # a = a or 0
-            for node in walk(parsed_code):
-                match node:
-                    case Name(id=a):
-                        new_node = BoolOp(op=Or(), values=[Name(id=a), Constant(value=0)])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Negation Law OR": # 1 = a or not a
-            for node in walk(parsed_code):
-                match node:
-                    case Constant(value=1):
-                        a = Name(id='a')
-                        new_node = BoolOp(op=Or(), values=[UnaryOp(op=Not(), operand=a), a])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Idempotent Law OR": # a = a or a
-            for node in walk(parsed_code): 
-                match node:
-                    case Name(id=a):
-                        new_node = BoolOp(op=Or(), values=[Name(id=a), Name(id=a)])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Idempotent Law AND": # a = a and a
-            for node in walk(parsed_code): 
-                match node:
-                    case Name(id=a):
-                        new_node = BoolOp(op=And(), values=[Name(id=a), Name(id=a)])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Absorption Law OR": # a = a or (a and b)
-            for node in walk(parsed_code):
-                match node:
-                    case Name(id=a):
-                        new_node = BoolOp(op=Or(), values=[Name(id=a), BoolOp(op=And(), values=[Name(id=a), Name(id='b')])])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Absorption Law AND": # a = a and (a or b)
-            for node in walk(parsed_code):
-                match node:
-                    case Name(id=a):
-                        new_node = BoolOp(op=And(), values=[Name(id=a), BoolOp(op=Or(), values=[Name(id=a), Name(id='b')])])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "DeMorgan Law 1": # not a and not b = not (a or b)
-            for node in walk(parsed_code):
-                match node:
-                    case BoolOp(op=And(), values=[UnaryOp(op=Not(), operand=a), UnaryOp(op=Not(), operand=b)]):
-                        new_node = UnaryOp(op=Not(), operand=BoolOp(op=Or(), values=[a, b]))
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-        
-        elif law == "DeMorgan Law 2": # not (a or b) = not a and not b
-            for node in walk(parsed_code):
-                match node:
-                    case UnaryOp(op=Not(), operand=BoolOp(op=Or(), values=[a, b])):
-                        new_node = BoolOp(op=And(), values=[UnaryOp(op=Not(), operand=a), UnaryOp(op=Not(), operand=b)])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "DeMorgan Law 3": # not a or not b = not (a and b)
-            for node in walk(parsed_code): 
-                match node:
-                    case BoolOp(op=Or(), values=[UnaryOp(op=Not(), operand=a), UnaryOp(op=Not(), operand=b)]):
-                        new_node = UnaryOp(op=Not(), operand=BoolOp(op=And(), values=[a, b]))
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-        
-        elif law == "DeMorgan Law 4": # not (a and b) = not a or not b
-            for node in walk(parsed_code): 
-                match node:
-                    case UnaryOp(op=Not(), operand=BoolOp(op=And(), values=[a, b])):
-                        new_node = BoolOp(op=Or(), values=[UnaryOp(op=Not(), operand=a), UnaryOp(op=Not(), operand=b)])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Implication Law 1": # not a or b = a -> b 
-            for node in walk(parsed_code): 
-                match node:
-                    case BoolOp(op=Or(), values=[UnaryOp(op=Not(), operand=a), b]):
-                        new_node = Compare(left=a, ops=[Gt()], comparators=[b])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Implication Law 2": # a -> b = not a or b
-            for node in walk(parsed_code): 
-                match node:
-                    case Compare(left=a, ops=[Gt()], comparators=[b]):
-                        new_node = BoolOp(op=Or(), values=[UnaryOp(op=Not(), operand=a), b])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Commutative Law OR": # a or b = b or a
-            for node in walk(parsed_code):
-                match node:
-                    case BoolOp(op=Or(), values=[a, b]):
-                        new_node = BoolOp(op=Or(), values=[b, a])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code) 
-                        modified_code = astor.to_source(parsed_code)                    
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
-
-        elif law == "Commutative Law AND": # a and b = b and a
-            for node in walk(parsed_code):
-                match node:
-                    case BoolOp(op=And(), values=[a, b]):
-                        new_node = BoolOp(op=And(), values=[b, a])
-                        parsed_code = ReplaceVisitor(node, new_node).visit(parsed_code)
-                        modified_code = astor.to_source(parsed_code)
-                        i += 1
-                        if verbose: transformations.append((modified_code[:-1], law))
-                        break
+    for _ in range(iterations):
+        if not index.sites: break # no law applies anywhere
+        law = random.choice(list(index.sites))
+
+        # rewrite the first matching position (breadth first)
+        path = min(index.sites[law], key=lambda path: (len(path), path))
+        index.rewrite(path, MIRROR_LAWS[law](node_at(index.tree, path)))
+        if verbose: transformations.append((to_source(index.tree), law))
 
     if verbose: print_mirror(transformations)
-    return astor.to_source(parsed_code).strip()
+    return to_source(index.tree)
+
+# ----------CORPUS-----------
+
+def mirror_expand(tree, steps, rng, names=("a", "b"), max_size=None, max_depth=None, weights=None):
+    """
+    Apply up to `steps` mirror laws at random sites (see SiteIndex.sample). Rewrites that would
+    exceed max_size / max_depth are skipped. Stops early when nothing applies.
+
+    Output: (expanded tree, trace [(tree, law)] of every step)
+    """
+    index = SiteIndex(tree)
+    trace = []
+    for _ in range(steps):
+        skipped = [] # too big for the limits, put back after this step
+        while (site := index.sample(rng, weights)) is not None:
+            law, path = site
+            rule = MIRROR_LAWS[law]
+            node = node_at(index.tree, path)
+            new_node = rule(node, Var(rng.choice(names))) if law in FRESH_LAWS else rule(node)
+            if (max_size and index.tree.size - node.size + new_node.size > max_size) or (max_depth and len(path) + new_node.depth > max_depth):
+                index.discard(law, path)
+                skipped.append(site)
+                continue
+            break
+        for law_path in skipped: index.add(*law_path)
+        if site is None: break
+        index.rewrite(path, new_node)
+        trace.append((index.tree, law))
+    return index.tree, trace
+
+def engine_law(before, after):
+    """ name of the engine law (symbolic.LAWS or a simplification rule) rewriting `before` into `after` at one position, or None """
+    sites = walk(before)
+    for i, (node, _, _) in enumerate(sites):
+        for law, rule in LAWS:
+            if (new_node := rule(node)) is not None and replace_site(sites, i, new_node) is after: return law
+        if (simplified := simplification(node)) is not None and replace_site(sites, i, simplified[1]) is after: return simplified[0]
+    return None
+
+def reference_proof(record):
+    """
+    the proof of a corpus record: its trace backwards, [(expr, law that leads to it)] ending at the seed
+    Laws are named as the engine names them (e.g. "Identity Law 1" read backwards is "Simplification
+    Law"), so reference proofs line up with engine proofs. The trace keeps the mirror's names.
+    """
+    trace = record["trace"]
+    steps = [expr for expr, _ in reversed(trace)]
+    mirror = [law for _, law in reversed(trace[1:])]
+    # every mirror law is undone by one engine rule, the mirror name is only a fallback
+    return [(steps[0], None)] + [(after, engine_law(parse(before), parse(after)) or law) for before, after, law in zip(steps, steps[1:], mirror)]
+
+def generate_corpus(n, seed=0, steps=(5, 10), max_size=None, max_depth=None, num_variables=2, seeds=("1",), max_attempts=None, weights=None):
+    """
+    Stream up to n distinct tautologies (distinct up to commutativity) as records:
+
+        {"id": "m0-17", "expr": ..., "seed": "1", "steps": 7, "size": 19, "depth": 6, "variables": 2,
+         "trace": [["1", null], ["a or 1", "Identity Law 1"], ...]}
+
+    steps:   (min, max) mirror steps per expression
+    seed:    rng seed, the same arguments always give the same corpus
+    weights: law -> relative probability of picking it among the laws that apply (default 1)
+    """
+    rng = random.Random(seed)
+    names = VARIABLES[:num_variables]
+    seen = set()
+    attempts = 0
+    max_attempts = max_attempts or 20 * n
+    while len(seen) < n and attempts < max_attempts:
+        attempts += 1
+        start = parse(rng.choice(seeds))
+        tree, trace = mirror_expand(start, rng.randint(*steps), rng, names, max_size, max_depth, weights)
+        key = canonical(tree)
+        if not trace or key in seen: continue
+        seen.add(key)
+        yield {
+            "id": f"m{seed}-{len(seen) - 1}",
+            "expr": to_source(tree),
+            "seed": to_source(start),
+            "steps": len(trace),
+            "size": tree.size,
+            "depth": tree.depth,
+            "variables": len(set(variables(tree))),
+            "trace": [[to_source(start), None]] + [[to_source(step), law] for step, law in trace],
+        }
 
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser(description="Symbolic mirror CLI args")
     parser.add_argument("--expr", type=str, help="The expression to evaluate")
+    parser.add_argument("--corpus", type=int, default=None, help="Generate this many distinct tautologies as jsonl instead")
+    parser.add_argument("--out", type=str, default=None, help="Corpus file (default: stdout)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus rng seed")
+    parser.add_argument("--steps", type=int, nargs=2, default=[5, 10], metavar=("MIN", "MAX"), help="Mirror steps per expression")
+    parser.add_argument("--max_size", type=int, default=None, help="Max nodes per expression")
+    parser.add_argument("--max_depth", type=int, default=None, help="Max depth per expression")
+    parser.add_argument("--variables", type=int, default=2, help="Number of distinct variables the laws introduce")
+    parser.add_argument("--weights", type=json.loads, default=None, help='Relative law probabilities as json, e.g. \'{"Commutative Law OR": 0.2}\' (default 1)')
     args = parser.parse_args()
+
+    if args.corpus:
+        file = open(args.out, "w") if args.out else sys.stdout
+        start = time.perf_counter()
+        count = 0
+        seeds = (args.expr.strip(),) if args.expr else ("1",)
+        for record in generate_corpus(args.corpus, args.seed, args.steps, args.max_size, args.max_depth, args.variables, seeds, weights=args.weights):
+            file.write(json.dumps(record) + "\n")
+            count += 1
+        elapsed = time.perf_counter() - start
+        print(f"CORPUS: {count} tautologies in {elapsed:.2f}s ({count / elapsed:,.0f}/s)", file=sys.stderr)
+        sys.exit()
+
     expr = args.expr if args.expr else "1"
     expr = expr.strip()
 
@@ -1,5 +1,38 @@
+import os
+import argparse
+import time
+import tempfile
+import threading
+import random
+import itertools
+import json
 import unittest
-from symbolic import is_reduced, simplify
+import unittest.mock
+import numpy as np
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from symbolic import is_reduced, simplify, normalize, symbolic_deduce, iter_deductions, REDUCING_LAWS, LAWS
+from dag import Var, Const, Not, And, Or, Imp, ParseError, parse, to_source, canonical, variables, node_at
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from llm import llm_batch, llm_api_call, set_client_options, register_backend, Client, TokenBucket, APIError, retry_after
+from cache import LLMCache, DeductionCache
+from truth_table import classify, equivalent, truth_table
+from proof_engine import unverified_steps, prune_per_parent, prune_diverse, level_parents, top_k
+from utils import get_greedy_choice, create_propose_prompt, approx_tokens, get_llm_choice
+from prompts import value_prompt, deduction_prompt
+from heuristic import heuristic_values, blend_values, features, literal_distance
+from parallel import deduce_many, settle_many, set_deduction_cache, init_worker as parallel_init_worker
+import proof_engine
+from batch import read_corpus, completed_ids, init_worker, prove, run_batch
+from checkpoint import Checkpoint
+from oracle import shortest_proof, efficiency, engine_steps, normal, neighbours, local_successors
+from symbolic_mirror import generate_corpus, reference_proof, symbolic_mirror, mirror_expand, SiteIndex, MIRROR_LAWS, FRESH_LAWS
+from metrics import Metrics, metered, report
+import metrics
+from proof_state import ProofState
+from benchmark import clear_caches, configure_engine, measure, compare
+import benchmark
+from mock_llm import MockLLM
 
 class TestIsReduced(unittest.TestCase):
     def test_is_reduced(self):
@@ -60,5 +93,777 @@ class TestSimplificationEngine(unittest.TestCase):
         res = ('a', ['a'], ['Simplification Law (Double Negation)'])
         self.assertEqual(a, res)
 
+    def test_simplify_fixpoint(self):
+        # the child collapses to 0, which makes the parent simplifiable again
+        a = simplify(expr="not 1 and (1 and a)", item_history=("", [], []))
+        res = ('(0)', ['(0 and (1 and a))', '(0 and a)', '(0)'], ['Simplification Law'] * 3)
+        self.assertEqual(a, res)
+
+        a = simplify(expr="b or not (0 or not a)", item_history=("", [], []))
+        res = ('(b or a)', ['(b or not not a)', '(b or a)'], ['Simplification Law', 'Simplification Law (Double Negation)'])
+        self.assertEqual(a, res)
+
+    def test_normalize_memo(self):
+        tree = parse("(a and 1) or (a and 1)")
+        steps = normalize(tree)
+        self.assertIs(normalize(tree), steps)
+        self.assertIs(steps[-1][1], parse("a or a"))
+        self.assertIs(normalize(parse("a and 1"))[-1][1], parse("a")) # shared subtree already normalized
+        self.assertEqual(normalize(parse("a or b")), ())
+        self.assertTrue(is_reduced(parse("a or b")))
+
+class TestSymbolicDeduce(unittest.TestCase):
+    def test_symbolic_deduce(self):
+        a = symbolic_deduce("(a or b) or c")
+        self.assertEqual(dict(a), {'Associative Law OR': ['(a or (b or c))']})
+
+        a = symbolic_deduce("(a and b) or (a and b)")
+        res = {
+            'Distributive Law OR': ['((a and b or a) and (a and b or b))'],
+            'Distributive Law RHS AND': ['(a and (b or b))'],
+            'Idempotent Law OR': ['(a and b)'],
+            'Commutative Law OR': ['(a and b or a and b)'],
+            'Commutative Law AND': ['(b and a or a and b)', '(a and b or b and a)'],
+        }
+        self.assertEqual(dict(a), res)
+        self.assertEqual(list(a), list(res))
+
+        a = symbolic_deduce("((a or b) and 1) or (c and 1)")
+        self.assertEqual(a['Identity Law'], ['((a or b) or c and 1)', '((a or b) and 1 or c)'])
+        self.assertEqual(a['Commutative Law OR'], ['(c and 1 or (a or b) and 1)', '((b or a) and 1 or c and 1)'])
+
+        a = symbolic_deduce("(a and b) or (c and d)")
+        self.assertNotIn('Distributive Law RHS AND', a)
+
+        a = symbolic_deduce("a or a or b")
+        self.assertEqual(a['Idempotent Law OR'], ['(a or b)'])
+
+    def test_symbolic_deduce_long_expr(self):
+        a = symbolic_deduce("not ((c or 1) > (a and not ((b or (not b)) and (a and (a or b)))))")
+        self.assertEqual(a['Negation Law OR'], ['(not (c or 1) > (a and not (1 and (a and (a or b)))))'])
+        self.assertEqual(a['Absorption Law 2'], ['(not (c or 1) > (a and not ((b or not b) and a)))'])
+        self.assertEqual(a['Commutative Law AND'], [
+            '(not (c or 1) > (not ((b or not b) and (a and (a or b))) and a))',
+            '(not (c or 1) > (a and not ((a and (a or b)) and (b or not b))))',
+            '(not (c or 1) > (a and not ((b or not b) and ((a or b) and a))))',
+        ])
+
+    def test_iter_deductions(self):
+        expr = "(a and b) or (a and b)"
+        streamed = defaultdict(list)
+        for law, expression in iter_deductions(expr):
+            streamed[law].append(expression)
+        self.assertEqual(list(streamed.items()), list(symbolic_deduce(expr).items()))
+
+        first = next(iter_deductions(expr, priority=REDUCING_LAWS))
+        self.assertEqual(first, ("Idempotent Law OR", "(a and b)"))
+        self.assertEqual(list(iter_deductions(expr, laws={"Commutative Law AND"})),
+                         [("Commutative Law AND", "(b and a or a and b)"), ("Commutative Law AND", "(a and b or b and a)")])
+        self.assertEqual(list(iter_deductions("a or b", laws={"Commutative Law OR"})), []) # reduced, no reorderings
+        self.assertEqual(sorted(iter_deductions(expr, rng=random.Random(0))), sorted(iter_deductions(expr)))
+
+    def test_select_candidates(self):
+        proof_engine.transposition, proof_engine.priority, proof_engine.unique = "commutative", "engine", False
+        proof_engine.random_select, proof_engine.greedy = False, True
+        self.assertEqual(proof_engine.select_candidates("(a and b) or (a and b)", 2, {}), [("(a and b)", "Idempotent Law OR")] * 2)
+        visited = {canonical(parse("a and b")): (0, None)}
+        self.assertEqual(proof_engine.select_candidates("(a and b) or (a and b)", 1, visited), [("(a and (b or b))", "Distributive Law RHS AND")])
+        self.assertEqual(get_greedy_choice({"0": ("(a or b or c)", "x"), "1": ("(a)", "y")}), ("1", "(a)", "y"))
+
+class TestTransposition(unittest.TestCase):
+    def setUp(self):
+        parser = argparse.ArgumentParser()
+        proof_engine.add_engine_args(parser)
+        self.args = parser.parse_args(["--model", "mock"])
+        self.args.ckpt_file = None
+        proof_engine.configure(self.args)
+
+    def add(self, exprs, visited, new_q, t):
+        return [proof_engine.add_state(ProofState("(a and b) or c").extend(path, ["law"] * len(path)), new_q, visited, t) for path in exprs]
+
+    def test_modes(self):
+        self.assertEqual(proof_engine.transposition, "exact") # the default
+        reorder = [["(b and a or c)"], ["(a and b or c)", "(c or a and b)"]]
+        for mode, added in [("exact", [True, True]), ("commutative", [True, False]), ("off", [True, True])]:
+            proof_engine.transposition = mode
+            visited, new_q = {}, []
+            self.assertEqual(self.add(reorder, visited, new_q, 1), added, mode)
+            self.assertEqual(len(new_q), sum(added))
+
+    def test_merge_and_drop(self):
+        visited, new_q = {}, []
+        self.assertEqual(self.add([["(c or a)", "(a or c)"], ["(a or c)"]], visited, new_q, 1), [True, False])
+        self.assertEqual(new_q[0].depth, 1) # same level: the shorter history is kept
+        self.assertEqual(self.add([["(a or c)"]], visited, [], 2), [False]) # seen on an earlier level
+        self.assertEqual(visited[parse("(a or c)")], (1, 0))
+
+    def test_default_finds_order_sensitive_proof(self):
+        # absorption only matches one operand order, the proof needs a Commutative Law step
+        self.args.search, self.args.T, self.args.K = "astar", 12, 50
+        proof_engine.configure(self.args)
+        with unittest.mock.patch("builtins.print"):
+            proof = proof_engine.proof_engine(expr="(a and b) -> (a or b)", T=12, B=proof_engine.B, K=50)
+        self.assertIsNotNone(proof)
+        self.assertEqual(proof_engine.run["proofs"][0].expr, "(1)")
+        proof_engine.transposition = "commutative"
+        with unittest.mock.patch("builtins.print"):
+            self.assertIsNone(proof_engine.proof_engine(expr="(a and b) -> (a or b)", T=12, B=proof_engine.B, K=50))
+
+class TestBestFirstSearch(unittest.TestCase):
+    """ A* on a made up graph: expressions are plain names, h and the deductions come from dicts """
+    def setUp(self):
+        proof_engine.transposition, proof_engine.verbose, proof_engine.pure_llm = "off", False, False
+        proof_engine.run.clear()
+        proof_engine.run.update(proofs=[], depth=0, expansions=0)
+        self.graph, self.h, self.goals, self.expanded = {}, defaultdict(float), set(), []
+        def deduce(expr):
+            self.expanded.append(expr)
+            return {"law": list(self.graph.get(expr, []))}
+        self.patches = [unittest.mock.patch.object(proof_engine, name, value) for name, value in [
+            ("deduce", deduce), ("is_reduced", lambda expr: expr in self.goals), ("simplify_state", lambda state, verbose=False: None),
+            ("heuristic_costs", lambda exprs: np.array([self.h[expr] for expr in exprs], dtype=float)),
+            ("unverified_steps", lambda history: []), ("print", lambda *args, **kwargs: None)]]
+        for patch in self.patches: patch.start()
+
+    def tearDown(self):
+        for patch in self.patches: patch.stop()
+
+    def search(self, K=10, T=10, B=3):
+        return proof_engine.best_first_search([ProofState("S")], K, T, B)
+
+    def test_f_order(self):
+        self.graph = {"S": ["A", "B"], "B": ["D"]}
+        self.h.update(A=5, B=1, D=4.5) # f: A 6, B 2, D 6.5, D has the lower h but is deeper
+        self.assertIsNone(self.search())
+        self.assertEqual(self.expanded, ["S", "B", "A", "D"])
+
+    def test_expansion_and_depth_caps(self):
+        self.graph = {name: [name + "0", name + "1"] for name in ["S", "S0", "S1", "S00", "S01", "S10", "S11"]}
+        self.search(K=2, T=3, B=2)
+        self.assertEqual(len(self.expanded), 6) # K * T expansions, the 7 nodes above depth 3 don't all fit
+        self.expanded.clear()
+        proof_engine.run.update(depth=0)
+        self.search(K=100, T=2, B=2)
+        self.assertEqual(len(self.expanded), 3) # depth 0 and 1 only
+        self.assertEqual(proof_engine.run["depth"], 2)
+
+    def test_first_proof(self):
+        self.graph, self.goals = {"S": ["G1", "X", "G2"]}, {"G1", "G2"}
+        self.h.update(G1=0, X=0.5, G2=1)
+        self.assertIn("G1", self.search())
+        self.assertEqual(self.expanded, ["S"])
+        self.assertEqual([proof.expr for proof in proof_engine.run["proofs"]], ["G1"])
+
+    def test_reopen_cheaper_path(self):
+        self.graph = {"S": ["A", "B"], "A": ["A2"], "A2": ["X"], "B": ["X"], "X": ["Y"]}
+        self.h.update(A=0, B=2, A2=0, X=0, Y=9)
+        self.search()
+        # X is first reached at depth 3 through A, B reopens it at depth 2 and the stale entry is skipped
+        self.assertEqual(self.expanded, ["S", "A", "A2", "B", "X", "Y"])
+
+class TestExpressionDag(unittest.TestCase):
+    def test_threaded_interning(self):
+        barrier = threading.Barrier(8)
+        def build(_):
+            barrier.wait()
+            return [Or(And(Var(f"t{i}"), Var("u")), Not(Var(f"t{i}"))) for i in range(200)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            trees = list(pool.map(build, range(8)))
+        for nodes in zip(*trees):
+            self.assertTrue(all(node is nodes[0] for node in nodes))
+
+    def test_interning(self):
+        a = parse("(a and b) or (a and b)")
+        self.assertIs(a, Or(And(Var("a"), Var("b")), And(Var("a"), Var("b"))))
+        self.assertIs(a.args[0], a.args[1])
+        self.assertIs(parse("not (a or b)"), Not(Or(Var("a"), Var("b"))))
+        self.assertEqual((a.size, a.depth), (7, 3))
+
+    def test_to_source(self):
+        for expr, res in [("a", "a"), ("1", "(1)"), ("a or b and c", "(a or b and c)"), ("(a or b) and c", "((a or b) and c)"),
+                          ("not (a > b)", "(not a > b)"), ("(a > b) > c", "((a > b) > c)"), ("not not a", "(not not a)"),
+                          ("(a <-> b)", "(a and b or not a and not b)")]:
+            self.assertEqual(to_source(parse(expr)), res)
+
+    def test_parser(self):
+        a, b, c = Var("a"), Var("b"), Var("c")
+        self.assertIs(parse("a and b and c"), And(a, b, c))
+        self.assertIs(parse("(a and b) and c"), And(And(a, b), c))
+        self.assertIs(parse("not a > b or c"), Or(Not(Imp(a, b)), c)) # python precedence
+        self.assertIs(parse("a -> b -> c"), Imp(a, Imp(b, c)))
+        self.assertIs(parse("a > not b"), Imp(a, Not(b)))
+        self.assertIs(parse("True and not False"), And(Const(1), Not(Const(0))))
+        bicond = parse("(a <-> b) and c")
+        self.assertIs(bicond, And(Or(And(a, b), And(Not(a), Not(b))), c))
+        self.assertTrue(equivalent(parse("((a <-> (b <-> c)) <-> c) <-> a"), "b"))
+
+    def test_parse_errors(self):
+        for expr, position in [("a and", 5), ("(a or b", 7), ("a or b)", 6), ("a $ b", 2), ("a or 2", 5), ("a b", 2)]:
+            with self.assertRaises(ParseError) as error:
+                parse(expr)
+            self.assertEqual(error.exception.position, position)
+        with self.assertRaisesRegex(SyntaxError, r"close the '\(' at position 0"):
+            parse("(a or b")
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            parse("a or b").args = ()
+
+    def test_canonical(self):
+        self.assertEqual(canonical(parse("(b or not a) and c")), canonical(parse("c and (not a or b)")))
+        self.assertEqual(canonical(parse("(b or not a) and c")), "&(c,|(b,~a))")
+        self.assertNotEqual(canonical(parse("a > b")), canonical(parse("b > a")))
+
+class TestLLMBatch(unittest.TestCase):
+    def test_order_and_limit(self):
+        in_flight, peak, lock = [0], [0], threading.Lock()
+        def stub(message):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.01 * (5 - int(message) % 5)) # later messages finish first
+            with lock: in_flight[0] -= 1
+            return f"LLM CHOICE: #{message}."
+
+        messages = [str(i) for i in range(12)]
+        self.assertEqual(llm_batch(messages, stub, concurrency=4), [f"LLM CHOICE: #{i}." for i in range(12)])
+        self.assertEqual(peak[0], 4)
+        self.assertEqual(llm_batch([], stub), [])
+
+    def test_async_llm(self):
+        async def stub(message):
+            return message.upper()
+        self.assertEqual(llm_batch(["a", "b"], stub, concurrency=1), ["A", "B"])
+
+class TestLLMCache(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "cache.sqlite")
+
+    def test_hits_and_eviction(self):
+        cache = LLMCache(self.path, max_entries=2)
+        self.assertIsNone(cache.get("m", "", "a"))
+        cache.put("m", "", "a", "A")
+        cache.put("m", "", "b", "B")
+        self.assertEqual(cache.get("m", "", "a"), "A") # a is now more recently used than b
+        self.assertIsNone(cache.get("m", "", "a", temperature=0.5))
+        cache.put("m", "", "c", "C")
+        self.assertIsNone(cache.get("m", "", "b"))
+        self.assertEqual((cache.get("m", "", "a"), cache.get("m", "", "c")), ("A", "C"))
+        self.assertEqual(cache.stats(), {"hits": 3, "misses": 3, "hit_rate": 0.5, "entries": 2})
+        cache.put("m", "", "c", "C2") # replaced, not a new entry
+        self.assertEqual((len(cache), cache.get("m", "", "a"), cache.get("m", "", "c")), (2, "A", "C2"))
+        cache.close()
+        self.assertEqual(len(LLMCache(self.path, max_entries=2)), 2) # counted again on open
+
+    def test_replay(self):
+        cache = LLMCache(self.path)
+        cache.put("gpt-4o-mini", "", "prompt", "first", sample=0)
+        cache.put("gpt-4o-mini", "", "prompt", "second", sample=1)
+        cache.close()
+
+        replay = LLMCache(self.path, replay=True)
+        self.assertEqual([llm_api_call("prompt", cache=replay) for _ in range(2)], ["first", "second"])
+        with self.assertRaises(LookupError):
+            llm_api_call("prompt", cache=replay)
+        replay.put("gpt-4o-mini", "", "other", "x")
+        self.assertEqual(len(replay), 2)
+
+    def test_batch_samples_by_position(self):
+        arrivals = itertools.count()
+        class Counting: # answers with the order the calls reach the backend
+            def complete(self, model, system, message, temperature=None):
+                return f"response {next(arrivals)}"
+        register_backend("counting", lambda provider, **options: Counting(), {"counting": "counting"})
+        entered = itertools.count()
+        def llm(message, cache):
+            time.sleep(0.02 * (4 - next(entered))) # the first calls in finish last
+            return llm_api_call(message, model="counting", cache=cache)
+
+        cache = LLMCache(self.path)
+        recorded = llm_batch(["prompt"] * 4, lambda message: llm(message, cache), concurrency=4)
+        self.assertEqual([cache.get("counting", "", "prompt", sample=i) for i in range(4)], recorded)
+        self.assertEqual(llm_api_call("prompt", model="counting", cache=cache), "response 4") # after the batch's samples
+        cache.close()
+
+        replay = LLMCache(self.path, replay=True)
+        entered = itertools.count()
+        self.assertEqual(llm_batch(["prompt"] * 4, lambda message: llm(message, replay), concurrency=4), recorded)
+
+class StubAPI(BaseHTTPRequestHandler):
+    """ anthropic messages api answering 429 to the first `server.throttle` requests, after `server.latency` seconds """
+    protocol_version = "HTTP/1.1" # keep-alive
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        server = self.server
+        server.requests.append((self.client_address[1], body))
+        time.sleep(server.latency)
+        if body["messages"][0]["content"] == "bad":
+            self.reply(400, {"error": "bad request"})
+        elif len(server.requests) <= server.throttle:
+            self.reply(429, {"error": "rate limited"}, {"retry-after": "0"})
+        else:
+            self.reply(200, {"content": [{"type": "text", "text": "LLM GRADE: 7 "}], "usage": {"input_tokens": 11, "output_tokens": 3}})
+
+    def reply(self, status, data, headers={}):
+        data = json.dumps(data).encode()
+        self.send_response(status)
+        for name, value in {"content-length": str(len(data)), **headers}.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class TestLLMClient(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPI)
+        self.server.requests, self.server.throttle, self.server.latency = [], 0, 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retry_rate_limits(self):
+        self.server.throttle = 3
+        client = Client("anthropic", self.url, "key", max_retries=3)
+        metrics.current = Metrics("claude-3-haiku")
+        res = metered(client.complete, "value")(message="x", model="claude-3-haiku-20240307", system="")
+        self.assertEqual(res, "LLM GRADE: 7")
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(len({port for port, _ in self.server.requests}), 1) # one keep-alive connection
+        value = metrics.current.summary()["sites"]["value"]
+        self.assertEqual((value["backoffs"], value["prompt_tokens"], value["completion_tokens"]), (3, 11, 3))
+
+        self.server.requests, self.server.throttle = [], 10
+        self.assertIsNone(client.complete("m", "", "x")) # gives up after max_retries
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_llm_api_call(self):
+        environ = {"ANTHROPIC_BASE_URL": self.url, "ANTHROPIC_API_KEY": "key"}
+        with unittest.mock.patch.dict(os.environ, environ):
+            set_client_options(max_retries=1)
+            self.assertEqual(llm_api_call("x", model="claude-3-haiku"), "LLM GRADE: 7")
+            self.assertEqual(self.server.requests[0][1]["model"], "claude-3-haiku-20240307")
+        set_client_options()
+
+    def test_no_retry_on_client_errors(self):
+        client = Client("anthropic", self.url, "key")
+        with self.assertRaises(APIError) as error:
+            client.complete("m", "", "bad")
+        self.assertEqual(error.exception.status, 400)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_backoff(self):
+        client = Client("anthropic", self.url, "key", base_delay=1, max_delay=8)
+        random.seed(0)
+        delays = [client.backoff(attempt, OSError()) for attempt in range(6)]
+        self.assertTrue(all(0 <= delay <= min(8, 2 ** attempt) for attempt, delay in enumerate(delays)))
+        self.assertEqual(client.backoff(0, APIError(429, "", retry_after=3)), 3)
+        self.assertEqual(client.backoff(0, APIError(429, "", retry_after=100)), 8)
+        self.assertEqual(retry_after({"retry-after": "2"}), 2)
+        self.assertEqual(retry_after({"retry-after-ms": "1500", "retry-after": "2"}), 1.5)
+        self.assertEqual(retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}), 0)
+        self.assertIsNone(retry_after({}))
+
+    def test_rate_limit(self):
+        self.server.latency = 0.01
+        client = Client("anthropic", self.url, "key", rate=50)
+        start = time.perf_counter()
+        self.assertEqual(llm_batch(["x"] * 60, lambda message: client.complete("m", "", message), concurrency=8), ["LLM GRADE: 7"] * 60)
+        self.assertGreater(time.perf_counter() - start, 0.15) # a burst of 50, then 10 more at 50/s
+        self.assertLessEqual(len({port for port, _ in self.server.requests}), 8)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=100, capacity=2)
+        waits = [bucket.acquire() for _ in range(4)]
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertTrue(0 < waits[3] <= 0.02)
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        metrics.current = Metrics("gpt-4o-mini")
+
+    def test_sites_and_usage(self):
+        def stub(message):
+            if message == "cached": report(cached=True)
+            elif message == "fail": raise TimeoutError
+            else: report(usage=(1000, 500), backoff=2)
+            return "LLM GRADE: 1"
+        metered(stub, "value")(message="prompt")
+        metered(stub, "propose")(message="cached")
+        with self.assertRaises(TimeoutError):
+            metered(stub, "retry")(message="fail")
+
+        summary = metrics.current.summary()
+        value, propose, retry = (summary["sites"][site] for site in ("value", "propose", "retry"))
+        self.assertEqual((value["calls"], value["prompt_tokens"], value["completion_tokens"], value["backoffs"], value["backoff_seconds"]), (1, 1000, 500, 1, 2))
+        self.assertAlmostEqual(value["cost"], (1000 * 0.15 + 500 * 0.60) / 1e6)
+        self.assertEqual((propose["cached"], propose["cost"], propose["prompt_tokens"]), (1, 0, approx_tokens("cached")))
+        self.assertEqual((retry["errors"], retry["cost"]), (1, 0))
+        self.assertEqual(summary["total"]["calls"], 3)
+        self.assertEqual(sum(summary["total"]["latency"]["histogram"].values()), 3)
+        report(cached=True) # outside a metered call: ignored
+
+    def test_level_deltas(self):
+        llm = metered(lambda message: "x", "propose")
+        llm(message="a")
+        llm(message="b")
+        self.assertEqual(metrics.current.level_record(1)["sites"]["propose"]["calls"], 2)
+        self.assertEqual(metrics.current.level_record(2)["sites"], {})
+        llm(message="c")
+        self.assertEqual(metrics.current.level_record(3)["sites"]["propose"]["calls"], 1)
+
+    def test_async_llm(self):
+        async def stub(message):
+            return message.upper()
+        self.assertEqual(llm_batch(["a", "b"], metered(stub, "value"), concurrency=2), ["A", "B"])
+        self.assertEqual(metrics.current.summary()["sites"]["value"]["calls"], 2)
+
+class TestMockLLM(unittest.TestCase):
+    def test_choices(self):
+        expr = "(a or (a and b)) -> a"
+        deductions = symbolic_deduce(expr)
+        for compact in (False, True):
+            message, choice_dict = create_propose_prompt(expr, deductions, compact=compact)
+            shortest = MockLLM().complete("shortest", "", message)
+            self.assertEqual(get_llm_choice(shortest, choice_dict, message, None), get_greedy_choice(choice_dict))
+            costs = heuristic_values([expression for expression, _ in choice_dict.values()])
+            self.assertEqual(MockLLM().complete("heuristic", "", message), f"LLM CHOICE: #{list(choice_dict)[int(costs.argmax())]}.")
+            randoms = {MockLLM(seed=seed).complete("random", "", message) for seed in range(20)}
+            self.assertGreater(len(randoms), 1)
+            self.assertTrue(all(get_llm_choice(res, choice_dict, message, None) for res in randoms))
+            self.assertEqual(MockLLM(seed=3).complete("random", "", message), MockLLM(seed=3).complete("random", "", message))
+            mock = MockLLM()
+            samples = {mock.complete("shortest", "", message) for _ in choice_dict}
+            self.assertEqual(samples, {f"LLM CHOICE: #{number}." for number in choice_dict}) # n-th sample, n-th shortest
+
+    def test_grades_and_deductions(self):
+        grade = lambda strategy, expr: MockLLM().complete(strategy, "", value_prompt.format(expr=expr, expr_history=[]))
+        self.assertEqual(grade("shortest", "(1)"), "LLM GRADE: 10")
+        self.assertEqual(grade("heuristic", "(a)"), "LLM GRADE: 10")
+        self.assertLess(int(grade("heuristic", "((a or b) and not (c or not d))").split()[-1]), 10)
+        res = MockLLM().complete("shortest", "", deduction_prompt.format(expr="(a or a)"))
+        self.assertEqual(json.loads(res.split("LLM DICT:")[1].replace("'", '"')), symbolic_deduce("(a or a)"))
+
+    def test_backend_registry(self):
+        set_client_options(latency=0.05, seed=1)
+        metrics.current = Metrics("mock")
+        llm = metered(lambda message: llm_api_call(message, model="mock-random"), "value")
+        message = value_prompt.format(expr="(a and b)", expr_history=[])
+        answers = llm_batch([message] * 4, llm, concurrency=4)
+        self.assertGreater(len(set(answers)), 1) # samples of the same prompt differ
+        summary = metrics.current.summary()
+        self.assertTrue(0.05 <= summary["llm_seconds"] < 4 * 0.05) # concurrent calls counted once
+        self.assertAlmostEqual(summary["seconds"], summary["llm_seconds"] + summary["engine_seconds"])
+        set_client_options(seed=1)
+        self.assertEqual(llm_batch([message] * 4, llm, concurrency=4), answers) # by position, not thread order
+        self.assertNotEqual(llm_batch([message] * 4, llm, concurrency=4), answers) # later samples
+        with self.assertRaises(ValueError):
+            llm_api_call("x", model="unknown")
+        set_client_options()
+
+class TestDeductionCache(unittest.TestCase):
+    def test_lru(self):
+        cache = DeductionCache(max_entries=2)
+        self.assertEqual(cache.deduce("a or a"), symbolic_deduce("a or a"))
+        self.assertEqual(cache.deduce("(a  or a)"), symbolic_deduce("a or a")) # same rendering
+        cache.deduce("a and a")
+        cache.deduce("a and b")
+        self.assertEqual(len(cache), 2)
+        cache.deduce("a or a") # evicted
+        self.assertEqual(cache.stats(), {"hits": 1, "shared_hits": 0, "misses": 4, "hit_rate": 0.2, "entries": 2})
+        with self.assertRaises(ParseError):
+            cache.deduce("")
+
+    def test_worker_starts_empty(self):
+        cache = DeductionCache()
+        cache.deduce("a or a")
+        parallel_init_worker(cache) # what a forked worker runs on its inherited copy
+        self.assertEqual((len(cache), cache.stats()["misses"]), (0, 0))
+        self.assertFalse(cache.lock.locked())
+
+    def test_shared_store(self):
+        path = os.path.join(tempfile.mkdtemp(), "deductions.sqlite")
+        exprs = ["a or a", "(a or b) and c", "not not a", "a and (b or c)"]
+        cache = DeductionCache(path=path)
+        set_deduction_cache(cache)
+        try:
+            self.assertEqual(deduce_many(exprs, workers=2), [dict(symbolic_deduce(expr)) for expr in exprs])
+            self.assertEqual(cache.stats()["misses"], 4)
+
+            other = DeductionCache(path=path) # another run reads what the workers stored
+            self.assertEqual(other.deduce("(a or b) and c"), symbolic_deduce("(a or b) and c"))
+            self.assertEqual(other.stats()["shared_hits"], 1)
+        finally:
+            set_deduction_cache(None)
+
+class TestTruthTable(unittest.TestCase):
+    def test_classify(self):
+        for expr, res in [("(P and (P > Q)) > Q", "tautology"), ("not ((c or 1) > (a and not ((b or (not b)) and (a and (a or b)))))", "tautology"),
+                          ("(a <-> b) or (a <-> not b)", "tautology"), ("(1)", "tautology"), ("a and not a", "contradiction"),
+                          ("(0)", "contradiction"), ("(x and x) or (x and x)", "satisfiable"), ("a > b > c", "satisfiable")]:
+            self.assertEqual(classify(expr), res, expr)
+
+    def test_many_variables(self):
+        names = [f"v{i}" for i in range(10)]
+        self.assertEqual(classify(" or ".join(names) + " or not (" + " or ".join(names) + ")"), "tautology")
+        self.assertEqual(classify(" and ".join(names)), "satisfiable")
+        self.assertEqual(int(truth_table(" and ".join(names), names).sum()), 1 << 63) # only the last assignment
+        with self.assertRaises(ValueError):
+            classify(" and ".join(f"v{i}" for i in range(25)))
+
+    def test_equivalent(self):
+        self.assertTrue(equivalent("not (a and b)", "not a or not b"))
+        self.assertTrue(equivalent("a or (a and b)", "a"))
+        self.assertFalse(equivalent("a > b", "b > a"))
+        self.assertEqual(unverified_steps(["(a or (a and b))", "(a)", "(b)", "(a and"]), [2, 3])
+
+class TestHeuristic(unittest.TestCase):
+    def test_features(self):
+        self.assertEqual(features(parse("(x and x) or (x and 1)")), (7, 3, 0, 2, 1, 3))
+        self.assertEqual(features(parse("not not a")), (3, 3, 2, 0, 0, 1))
+
+    def test_new_nodes_only(self):
+        literal_distance(parse("(x and y) or (x and not z)"))
+        misses = literal_distance.cache_info().misses
+        self.assertEqual(literal_distance(parse("not ((x and y) or (x and not z))")), 4)
+        self.assertEqual(literal_distance.cache_info().misses, misses + 1) # the children were already scored
+
+    def test_values(self):
+        values = heuristic_values(["(1)", "a", "not a", "(a or b)", "(x and x) or (x and x)", "not ((c or 1) > (a and not ((b or (not b)) and (a and (a or b)))))"])
+        self.assertEqual(list(values[:3]), [10, 10, 10])
+        self.assertTrue(all(values[i] > values[i + 1] for i in range(2, 5)))
+        self.assertTrue(all(1 <= value <= 10 for value in values))
+        self.assertEqual(list(blend_values([2, 4], [10, 6], 0.25)), [4.0, 4.5])
+
+class TestProposePrompt(unittest.TestCase):
+    deductions = {"Idempotent Law OR": ["(a and b)"], "Distributive Law OR": ["((a and b or a) and (a and b or b))"],
+                  "Absorption Law 1": ["(a and b)"], "Commutative Law AND": ["(b and a or a and b)", "(a and b or b and a)"]}
+
+    def test_default_prompt(self):
+        llm_message, choice_dict = create_propose_prompt("(a and b) or (a and b)", self.deductions)
+        self.assertTrue(llm_message.startswith("expr='(a and b) or (a and b)'\nchoices=\"#0. 'Idempotent Law OR', '(a and b)'\\n#1."))
+        self.assertEqual(list(choice_dict), ["0", "1", "2", "3", "4"])
+
+    def test_stable_numbers(self):
+        _, choice_dict = create_propose_prompt("(a and b) or (a and b)", self.deductions, compact=True, exclude={"Distributive Law OR"})
+        self.assertEqual(choice_dict, {"0": ("(a and b)", "Idempotent Law OR"), "3": ("(b and a or a and b)", "Commutative Law AND"),
+                                       "4": ("(a and b or b and a)", "Commutative Law AND")}) # #2 repeats #0
+        llm_message, _ = create_propose_prompt("(a and b) or (a and b)", self.deductions, compact=True)
+        self.assertIn("Commutative Law AND:\n#3. (b and a or a and b)\n#4. (a and b or b and a)\n", llm_message)
+
+    def test_budget(self):
+        full, _ = create_propose_prompt("(a and b) or (a and b)", self.deductions)
+        llm_message, choice_dict = create_propose_prompt("(a and b) or (a and b)", self.deductions, budget=approx_tokens(full) - 20)
+        self.assertLessEqual(approx_tokens(llm_message), approx_tokens(full) - 20)
+        self.assertNotIn("1", choice_dict) # the distributive expansion has the highest cost
+        self.assertIn("0", choice_dict)
+        _, choice_dict = create_propose_prompt("(a and b) or (a and b)", self.deductions, budget=1)
+        self.assertEqual(choice_dict, {"0": ("(a and b)", "Idempotent Law OR")}) # always at least one choice
+
+class TestParallel(unittest.TestCase):
+    def test_pool_matches_serial(self):
+        exprs = ["(x and x) or (x and x)", "not ((c or 1) > (a and not ((b or (not b)) and (a and (a or b)))))", "(a or 0) and not not b", "(a)"]
+        self.assertEqual(deduce_many(exprs, workers=2), [dict(symbolic_deduce(expr)) for expr in exprs])
+        self.assertEqual(settle_many(exprs, workers=2), settle_many(exprs, workers=1))
+        self.assertEqual(settle_many(["(a or 0) and not not b"], workers=1)[0],
+                         (("(a and b)", ["(a and not not b)", "(a and b)"], ["Simplification Law", "Simplification Law (Double Negation)"]), True))
+
+class TestBatch(unittest.TestCase):
+    def test_corpus_and_resume(self):
+        directory = tempfile.mkdtemp()
+        corpus, out = os.path.join(directory, "corpus.txt"), os.path.join(directory, "results.jsonl")
+        with open(corpus, "w") as file:
+            file.write("# tautologies\n19: (P and ( P > Q)) > Q\n\n1. not not a\n(a or 0)\n")
+        self.assertEqual(read_corpus(corpus), [("19", "(P and ( P > Q)) > Q"), ("1", "not not a"), ("5", "(a or 0)")])
+        with open(out, "w") as file:
+            file.write('{"id": "19"}\n{"id": "5", "error": "TimeoutError: api"}\n{"id": "7", "error": "ParseError: x"}\n{"id": "1"')
+        self.assertEqual(completed_ids(out), {"19", "7"}) # 5 failed and is proved again
+
+        parser = argparse.ArgumentParser()
+        proof_engine.add_engine_args(parser)
+        args = parser.parse_args(["--search", "astar", "--T", "8", "--K", "10"])
+        args.file, args.out, args.jobs, args.log_dir = corpus, os.path.join(directory, "retry.jsonl"), 1, None
+        with open(args.out, "w") as file:
+            file.write('{"id": "19"}\n{"id": "1"}\n{"id": "5", "error": "TimeoutError: api"}\n')
+        with unittest.mock.patch("builtins.print"):
+            run_batch(args)
+        with open(args.out) as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual([record["id"] for record in records], ["19", "1", "5", "5"])
+        self.assertIsNone(records[-1]["error"])
+        self.assertEqual(completed_ids(args.out), {"19", "1", "5"})
+
+    def test_prove_record(self):
+        parser = argparse.ArgumentParser()
+        proof_engine.add_engine_args(parser)
+        args = parser.parse_args(["--search", "astar", "--T", "8", "--K", "10"])
+        args.ckpt_file = None
+        init_worker(args)
+        record = prove("19", "(P and ( P > Q)) > Q")
+        self.assertTrue(record["proved"])
+        self.assertEqual(record["steps"][-1], "(1)")
+        self.assertEqual(len(record["steps"]), len(record["laws"]) + 1)
+        self.assertTrue(record["expansions"] > 0 and record["llm_calls"] == 0 and record["error"] is None)
+        self.assertEqual(record["cost"], 0)
+        self.assertIsNone(prove("23", "(P > 0) > not P")["error"])
+        self.assertTrue(prove("x", "(P > 0) >")["error"].startswith("ParseError"))
+
+class TestPruning(unittest.TestCase):
+    def test_global(self):
+        values = [3, 9, 5, 9, 1, 5]
+        self.assertEqual(top_k(values, range(6), 4), sorted(range(6), key=lambda i: values[i], reverse=True)[:4])
+        self.assertEqual(top_k(values, range(6), 4), [1, 3, 2, 5])
+
+    def test_per_parent(self):
+        values = [9, 8, 7, 6, 2, 1]
+        parents = [0, 0, 0, 0, 1, 2]
+        self.assertEqual(prune_per_parent(values, parents, 3), [0, 4, 5]) # one each
+        self.assertEqual(prune_per_parent(values, parents, 4), [0, 1, 4, 5]) # two each
+        self.assertEqual(prune_per_parent(values, parents, 4, k=1), [0, 1, 4, 5]) # topped up to K
+
+    def test_diverse(self):
+        root = ProofState("a or b")
+        q = [root.child("a or b", "x"), root.child("b or a", "y"), root.child("a", "z"), ProofState("c").child("c and c", "w")]
+        values = [9, 9, 5, 5]
+        parents = level_parents(q, [root, q[3].parent])
+        self.assertEqual(parents, [0, 0, 0, 1])
+        self.assertEqual(top_k(values, range(4), 2), [0, 1])
+        self.assertEqual(prune_diverse(values, q, parents, 2, diversity=5), [0, 3]) # commuted copy and sibling penalized
+        self.assertEqual(prune_diverse(values, q, parents, 3, diversity=5), [0, 3, 2])
+        self.assertEqual(prune_diverse(values, q, parents, 3, diversity=1), [0, 1, 3])
+        self.assertEqual(prune_diverse(values, q, parents, 2, diversity=0), [0, 1])
+
+class TestMirrorCorpus(unittest.TestCase):
+    def test_corpus(self):
+        corpus = list(generate_corpus(200, seed=3, steps=(3, 8), max_size=20, max_depth=6, num_variables=3))
+        self.assertEqual(corpus, list(generate_corpus(200, seed=3, steps=(3, 8), max_size=20, max_depth=6, num_variables=3)))
+        self.assertEqual(len({canonical(parse(record["expr"])) for record in corpus}), 200)
+        for record in corpus:
+            self.assertEqual(classify(record["expr"]), "tautology")
+            self.assertTrue(record["size"] <= 20 and record["depth"] <= 6 and record["variables"] <= 3)
+            self.assertTrue(set(variables(parse(record["expr"]))) <= set("abc"))
+            self.assertEqual(record["trace"][-1][0], record["expr"])
+            self.assertEqual(len(record["trace"]), record["steps"] + 1)
+            self.assertTrue(all(law in MIRROR_LAWS for _, law in record["trace"][1:]))
+
+    def test_reference_proof(self):
+        record = {"trace": [["(1)", None], ["(a or 1)", "Identity Law 1"], ["(a or (not b or b))", "Negation Law OR"]]}
+        self.assertEqual(reference_proof(record), [("(a or (not b or b))", None), ("(a or 1)", "Negation Law OR"), ("(1)", "Simplification Law")])
+        engine_laws = {law for law, _ in LAWS} | {"Simplification Law", "Simplification Law (Double Negation)"}
+        for record in generate_corpus(50, seed=3, steps=(5, 15), num_variables=3):
+            self.assertTrue(all(law in engine_laws for _, law in reference_proof(record)[1:]))
+
+    def test_site_index(self):
+        rng = random.Random(1)
+        index = SiteIndex(parse("1"))
+        for step in range(300):
+            law, path = index.sample(rng)
+            node = node_at(index.tree, path)
+            index.rewrite(path, MIRROR_LAWS[law](node, Var(rng.choice("abc"))) if law in FRESH_LAWS else MIRROR_LAWS[law](node))
+            if step % 30 == 0:
+                self.assertEqual(set(index.positions), set(SiteIndex(index.tree).positions)) # same as re-indexing from scratch
+
+    def test_no_applicable_law(self):
+        self.assertEqual(symbolic_mirror("0", iterations=100), "(0)")
+        self.assertEqual(mirror_expand(parse("1"), 10, random.Random(0), max_size=2), (parse("1"), []))
+
+    def test_weights(self):
+        _, trace = mirror_expand(parse("1"), 20, random.Random(0), weights=dict.fromkeys(MIRROR_LAWS, 0) | {"Identity Law 1": 1})
+        self.assertEqual({law for _, law in trace}, {"Identity Law 1"})
+
+    def test_batch_reads_jsonl(self):
+        path = os.path.join(tempfile.mkdtemp(), "corpus.jsonl")
+        with open(path, "w") as file:
+            file.writelines(json.dumps(record) + "\n" for record in generate_corpus(3))
+        self.assertEqual([expr_id for expr_id, _ in read_corpus(path)], ["m0-0", "m0-1", "m0-2"])
+
+class TestOracle(unittest.TestCase):
+    def test_shortest_proof(self):
+        for expr, length in [("(((not b) and (not a)) -> (not a))", 5), ("(a or (a and b)) -> a", 3), ("(P > 0) > not P", 4), ("1", 0)]:
+            result = shortest_proof(expr)
+            self.assertEqual((result["length"], result["exact"]), (length, True))
+            self.assertEqual(shortest_proof(expr, bidirectional=False)["length"], length)
+            proof = [normal(parse(step)) for step, _ in result["proof"]]
+            self.assertEqual(len(proof), length + 1)
+            self.assertIs(proof[-1], Const(1))
+            for before, after in zip(proof, proof[1:]): # every step is one engine rule
+                self.assertIn(after, neighbours(before, local_successors))
+
+    def test_commutative_states(self):
+        self.assertIs(normal(parse("(b or a) and c")), normal(parse("c and (a or b)")))
+        self.assertEqual(shortest_proof("(a or not a)")["length"], 1)
+        self.assertEqual(shortest_proof("(not a or a)")["length"], 1)
+
+    def test_caps(self):
+        result = shortest_proof("((P > Q) and (Q > R)) > (P > R)", max_states=2000)
+        self.assertTrue(result["capped"] and result["length"] is None and not result["exact"])
+        self.assertEqual(efficiency(10, 5), 0.5)
+        self.assertEqual(engine_steps(["Commutative Law AND", "Absorption Law 1", "Commutative Law OR", "Negation Law OR"]), 2)
+        self.assertIsNone(efficiency(0, None))
+
+class TestBenchmark(unittest.TestCase):
+    def test_cold_caches(self):
+        tree = parse("(a and 1) or b")
+        text = to_source(tree)
+        deductions = symbolic_deduce("(a and 1) or b")
+        clear_caches()
+        self.assertIsNone(tree._text)
+        self.assertEqual(symbolic_deduce("(a and 1) or b"), deductions)
+        self.assertEqual(to_source(tree), text)
+        configure_engine()
+        for _ in range(2):
+            clear_caches()
+            with unittest.mock.patch("builtins.print"):
+                benchmark.prove("(a or (a and b)) -> a")
+            self.assertEqual(proof_engine.deduction_cache.hits, 0) # nothing kept from the previous run
+            self.assertGreater(proof_engine.deduction_cache.misses, 0)
+
+    def test_measure_and_compare(self):
+        result = measure(to_source, [parse("a or b"), parse("not a")], seconds=0.01)
+        self.assertEqual(set(result), {"ops_per_sec", "us_per_op", "stddev_us", "rounds", "peak_kib", "retained_kib"})
+        self.assertGreaterEqual(result["rounds"], 3)
+        baseline = {"results": {"parse": {"us_per_op": 10.0}, "mirror": {"us_per_op": 10.0}}}
+        results = {"results": {"parse": {"us_per_op": 12.0}, "mirror": {"us_per_op": 13.0}, "new": {"us_per_op": 1.0}}}
+        with unittest.mock.patch("builtins.print"):
+            self.assertEqual(compare(results, baseline, tolerance=0.25), ["mirror"])
+
+class TestCheckpoint(unittest.TestCase):
+    def test_save_and_load(self):
+        path = os.path.join(tempfile.mkdtemp(), "ckpt.jsonl")
+        one = ProofState("(a or 0) and b").child("(a and b)", "Simplification Law")
+        two = one.child("(b and a)", "Commutative Law AND")
+        three = two.child("(a and b)", "Commutative Law AND")
+
+        checkpoint = Checkpoint(path, snapshot_every=2)
+        checkpoint.start()
+        checkpoint.visit("&(a,b)", 0)
+        checkpoint.save_level(1, [one], [], None, {"expansions": 1})
+        checkpoint.save_level(2, [two], [one], [("&(a,b)", 0)], {"expansions": 2})
+        checkpoint.visit("x", 2)
+        checkpoint.save_level(3, [three], [one], None, {"expansions": 3})
+        with open(path, "a") as file:
+            file.write('{"level": 4, "fron') # crash mid write
+
+        restored = Checkpoint(path).load()
+        self.assertEqual(restored, {"level": 3, "q": [three], "proofs": [one], "visited": [("&(a,b)", 0), ("x", 2)], "counters": {"expansions": 3}})
+        self.assertIs(restored["q"][0].parent.parent, restored["proofs"][0]) # ancestors are shared
+        self.assertGreater(Checkpoint(path).last_snapshot_offset(), 0)
+
+class TestProofState(unittest.TestCase):
+    def test_history(self):
+        root = ProofState("(a or 0) and not not b")
+        state = root.extend(["(a and not not b)", "(a and b)"], ["Simplification Law", "Simplification Law (Double Negation)"])
+        self.assertEqual(state.expr_history, ["(a or 0) and not not b", "(a and not not b)", "(a and b)"])
+        self.assertEqual(state.law_history, ["Simplification Law", "Simplification Law (Double Negation)"])
+        self.assertEqual((state.depth, state.parent.parent), (2, root))
+        self.assertEqual(tuple(state), ("(a and b)", state.expr_history, state.law_history))
+        self.assertEqual(state, ProofState.from_history(state.expr_history, state.law_history))
+        self.assertNotEqual(state, root.extend(["(a and not not b)", "(a and b)"], ["Simplification Law", "Other Law"]))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
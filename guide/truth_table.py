@@ -0,0 +1,131 @@
+"""
+TRUTH TABLE EVALUATOR
+
+Decides tautology / contradiction / satisfiable by evaluating an expression on all 2^n assignments at
+once. Every column of the truth table is a bitset packed into uint64 words (bit k of the table is
+assignment k), so each operator is one vectorized numpy bitwise op over 2^n / 64 words.
+
+An expression is compiled once into a straight-line program over its DAG, so shared subtrees are
+evaluated once.
+
+    a > b          implication, not a or b
+    a > b > c      chained like python comparisons: (a > b) and (b > c)
+"""
+
+import numpy as np
+from functools import lru_cache
+from dag import Var, Const, Not, And, Or, Imp, parse, variables
+
+MAX_VARS = 24 # 2^24 assignments = 2 MiB per column
+ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+# bit patterns of the first 6 variables inside one 64 bit word
+WORD_PATTERNS = [0xAAAAAAAAAAAAAAAA, 0xCCCCCCCCCCCCCCCC, 0xF0F0F0F0F0F0F0F0,
+                 0xFF00FF00FF00FF00, 0xFFFF0000FFFF0000, 0xFFFFFFFF00000000]
+
+def as_tree(expr):
+    return parse(expr) if isinstance(expr, str) else expr
+
+@lru_cache(maxsize=MAX_VARS + 1)
+def columns(n):
+    """
+    Packed truth table columns of n variables and the mask of valid bits
+    Output: (list of n uint64 arrays, mask array), each of max(1, 2^n / 64) words
+    """
+    if n > MAX_VARS:
+        raise ValueError(f"ERROR: truth table of {n} variables is too large, max is {MAX_VARS}")
+    words = 1 << max(n - 6, 0)
+    word_index = np.arange(words, dtype=np.uint64)
+    cols = []
+    for i in range(n):
+        if i < 6:
+            col = np.full(words, WORD_PATTERNS[i], dtype=np.uint64)
+        else:
+            col = np.where((word_index >> np.uint64(i - 6)) & np.uint64(1), ALL_ONES, np.uint64(0))
+        col.flags.writeable = False
+        cols.append(col)
+    mask = np.full(words, ALL_ONES if n >= 6 else (1 << (1 << n)) - 1, dtype=np.uint64)
+    return cols, mask
+
+@lru_cache(maxsize=4096)
+def compile_expr(tree):
+    """
+    Straight-line program of an expression: a list of (op, operands) where operands are variable
+    names, constants or indices of earlier instructions. The last instruction is the root.
+    """
+    program = []
+    index = {} # node -> instruction index, so shared subtrees are emitted once
+
+    def emit(node):
+        if node in index:
+            return index[node]
+        match node:
+            case Var(name):
+                instr = ("var", name)
+            case Const(value):
+                instr = ("const", value)
+            case Not(operand):
+                instr = ("not", emit(operand))
+            case And(args):
+                instr = ("and", tuple(map(emit, args)))
+            case Or(args):
+                instr = ("or", tuple(map(emit, args)))
+            case Imp(args):
+                instr = ("imp", tuple(map(emit, args)))
+        index[node] = len(program)
+        program.append(instr)
+        return index[node]
+
+    emit(tree)
+    return program
+
+def evaluate(tree, names):
+    """ packed truth table of `tree` over the variables `names` (in that order), with unused bits cleared """
+    cols, mask = columns(len(names))
+    env = dict(zip(names, cols))
+    values = []
+    for op, operands in compile_expr(tree):
+        match op:
+            case "var":
+                value = env[operands]
+            case "const":
+                value = mask if operands else np.zeros_like(mask)
+            case "not":
+                value = ~values[operands]
+            case "and":
+                value = np.bitwise_and.reduce([values[i] for i in operands])
+            case "or":
+                value = np.bitwise_or.reduce([values[i] for i in operands])
+            case "imp":
+                value = mask
+                for a, b in zip(operands, operands[1:]):
+                    value = value & (~values[a] | values[b])
+        values.append(value)
+    return values[-1] & mask
+
+def truth_table(expr, names=None):
+    """ packed truth table of an expression string or tree, over its sorted variables by default """
+    tree = as_tree(expr)
+    if names is None: names = sorted(set(variables(tree)))
+    return evaluate(tree, names)
+
+def classify(expr):
+    """ 'tautology', 'contradiction' or 'satisfiable' """
+    tree = as_tree(expr)
+    names = sorted(set(variables(tree)))
+    table = evaluate(tree, names)
+    if np.array_equal(table, columns(len(names))[1]):
+        return "tautology"
+    if not table.any():
+        return "contradiction"
+    return "satisfiable"
+
+def is_tautology(expr):
+    return classify(expr) == "tautology"
+
+def equivalent(expr_a, expr_b):
+    """ True if both expressions agree on every assignment of their variables """
+    a, b = as_tree(expr_a), as_tree(expr_b)
+    if a is b: return True
+    names = sorted(set(variables(a)) | set(variables(b)))
+    return np.array_equal(evaluate(a, names), evaluate(b, names))
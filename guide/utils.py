@@ -1,9 +1,10 @@
 import re
 import ast
-import regex
 from collections import deque
 from dataclasses import dataclass
 
+from dag import parse, to_source
+from heuristic import heuristic_costs
 from prompts import propose_prompt, propose_prompt_long
 
 @dataclass
@@ -29,33 +30,12 @@ class booleanTree:
 
     def __post_init__(self):
         """
-        Post init method using structural pattern matching to match bi-conditional and implication operations
-        Matches:
+        Parse the input logic (dag.parse) and render it back as a python expression for ast.parse
+        Desugars:
             p <-> q (bi-conditional): (p and q) or ((not p) and (not q))
-            p -> q  (implication)   : (not p) or q 
+            p -> q  (implication)   : p > q
         """
-        success = 0
-        groups = regex.search(r"(?<rec> \( (?: [^()]++ | (?&rec) )* \) )", str(self.tree), flags=regex.VERBOSE)
-        group_matches = groups.captures('rec')
-        for items in group_matches:
-            match items:
-                case str(x) if "<->" in x: 
-                    success = 1
-                    p, q = items[1:-1].split('<->', 1)
-                    p, q = p.strip(), q.strip()
-                    partial_step = "(" + p + " and " + q + ") or (not(" + p + ") and not(" + q + "))"
-                    self.tree = self.tree.replace(items, partial_step)
-                case _:
-                    pass
-        
-        if success == 1:
-            self.__post_init__()
-        else:
-            if "<->" in str(self.tree):
-                p, q = self.tree.split('<->', 1)
-                p, q = p.strip(), q.strip()
-                self.tree = "(" + p + " and " + q + ") or (not(" + p + ") and not(" + q + "))"
-            self.astTree = self.tree
+        self.astTree = to_source(parse(self.tree))
 
     def parse_tree(self, astTree=None) -> ast:
         """
@@ -97,52 +77,78 @@ class booleanTree:
                 modules_.append(node_name)
         return modules_
 
-class helpers:
+def approx_tokens(text):
+    """ token estimate of a prompt (4 characters per token) """
+    return (len(text) + 3) // 4
+
+def number_choices(expr_deductions, exclude=()):
     """
-    Helper class which contains all the important functions
+    (choice number, expression, law) of every deduction, skipping laws in `exclude`
+
+    Numbers are positions in the full law -> expressions listing, so a choice keeps its number when
+    other laws are excluded (--unique) or choices are pruned from the prompt.
     """
-    def are_subtrees_equivalent(self, node1, node2):
-        """
-        Recursively check if two subtrees are equivalent
-        """
-        if node1 is None and node2 is None:
-            return True
-        if node1 is None or node2 is None:
-            return False
-        
-        if type(node1) != type(node2):
-            return False
-        
-        if isinstance(node1, ast.AST):
-            for attr in node1._fields:
-                if not self.are_subtrees_equivalent(getattr(node1, attr), getattr(node2, attr)):
-                    return False
-        elif isinstance(node1, list):
-            if len(node1) != len(node2):
-                return False
-            for n1, n2 in zip(node1, node2):
-                if not self.are_subtrees_equivalent(n1, n2):
-                    return False
-        else:
-            if node1 != node2:
-                return False
-        return True
-    
-def create_propose_prompt(expr, expr_deductions):
-    """output law and expression in a numbered list and create prompt"""
-    choices_list = []
-    choice_dict = {} # Tracks the possible choices to choose from
-    counter = 0
-
-    for law, expressions in expr_deductions.items():
-        for expression in expressions:
-            choice = f"#{counter}. '{law}', '{expression}'\n"
-            choices_list.append(choice)
-            choice_dict[str(counter)] = (expression, law)
-            counter += 1
-
-    choices = "".join(choices_list)
-    llm_message = f"{expr=}\n{choices=}{propose_prompt}"
+    deductions = ((law, expression) for law, expressions in expr_deductions.items() for expression in expressions)
+    return [(str(i), expression, law) for i, (law, expression) in enumerate(deductions) if law not in exclude]
+
+def dedupe_choices(choices):
+    """ keep the first choice of each expression, the same result reached by another law adds nothing """
+    seen = set()
+    return [choice for choice in choices if not (choice[1] in seen or seen.add(choice[1]))]
+
+def format_choices(choices, compact=False):
+    """
+    numbered choice list of a propose prompt
+    compact: each law name once, above its choices, instead of repeating it in quotes on every line
+    """
+    if not compact:
+        return "".join(f"#{number}. '{law}', '{expression}'\n" for number, expression, law in choices)
+    lines, last_law = [], None
+    for number, expression, law in choices:
+        if law != last_law: lines.append(f"{law}:\n")
+        lines.append(f"#{number}. {expression}\n")
+        last_law = law
+    return "".join(lines)
+
+def format_propose_prompt(expr, choices, compact=False):
+    choices = format_choices(choices, compact)
+    if compact: return f"expr={expr}\nchoices:\n{choices}{propose_prompt}"
+    return f"{expr=}\n{choices=}{propose_prompt}"
+
+def fit_budget(expr, choices, budget, compact=False):
+    """
+    the lowest heuristic cost choices whose prompt fits in `budget` tokens (at least one), in listing order
+    """
+    if approx_tokens(format_propose_prompt(expr, choices, compact)) <= budget: return choices
+    costs = heuristic_costs([expression for _, expression, _ in choices])
+    ranked = sorted(range(len(choices)), key=lambda i: costs[i]) # stable, ties keep listing order
+    tokens = approx_tokens(format_propose_prompt(expr, [], compact))
+    kept, laws = set(), set()
+    for i in ranked:
+        number, expression, law = choices[i]
+        line = format_choices([choices[i]], compact and law not in laws)
+        if kept and tokens + approx_tokens(line) > budget: continue
+        tokens += approx_tokens(line)
+        kept.add(i)
+        laws.add(law)
+    return [choice for i, choice in enumerate(choices) if i in kept]
+
+def create_propose_prompt(expr, expr_deductions, budget=None, compact=False, exclude=()):
+    """
+    output law and expression in a numbered list and create prompt
+
+    budget:  max prompt tokens, the choices with the highest heuristic cost are dropped to fit
+    compact: shorter choice encoding (see format_choices)
+    exclude: laws left out of the prompt (already chosen with --unique)
+
+    With a budget or compact encoding an expression reached by several laws is listed once. Choice
+    numbers are stable (see number_choices) and choice_dict maps them back to (expression, law).
+    """
+    choices = number_choices(expr_deductions, exclude)
+    if budget or compact: choices = dedupe_choices(choices)
+    if budget: choices = fit_budget(expr, choices, budget, compact)
+    choice_dict = {number: (expression, law) for number, expression, law in choices} # Tracks the possible choices to choose from
+    llm_message = format_propose_prompt(expr, choices, compact)
 
     # TODO: experiment with other prompts
     # llm_message = propose_prompt_long.format(expr=expr, choices=choices)
@@ -196,7 +202,7 @@ def get_greedy_choice(choice_dict):
     shortest = float("inf")
     choice_number, new_expr, new_law = "", "", ""
     for key, (expr, law) in choice_dict.items():
-        cur_len = len(choice_dict)
+        cur_len = len(expr)
         if cur_len < shortest:
             shortest = cur_len
             choice_number, new_expr, new_law = key, expr, law